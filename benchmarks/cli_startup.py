@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Measures the startup time of the command-line tool.
+
+Each measurement is a fresh interpreter, as when the tool is run from a
+launcher: the time to import kaomojitool.__main__, and the time of a whole
+`dbstatus` round trip on the bundled emoticons.tsv. It also checks that the
+modules only some commands need are not imported at startup; the exit status
+is 1 if any of them is, or if a timing exceeds --max-ms.
+
+    $ python benchmarks/cli_startup.py --repeat 10 --max-ms 150
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported by the commands needing them only
+LAZY_MODULES = ("lxml", "requests", "sqlite3", "toml", "concurrent.futures",
+                "kaomojitool.backup", "kaomojitool.changeset",
+                "kaomojitool.client", "kaomojitool.diff",
+                "kaomojitool.scrape", "kaomojitool.server",
+                "kaomojitool.shards", "kaomojitool.sqlite",
+                "kaomojitool.stats", "kaomojitool.timings",
+                "kaomojitool.writequeue", "cProfile", "importlib.metadata")
+
+CHECK_IMPORTS = """
+import sys
+import kaomojitool.__main__
+print(",".join(name for name in {modules!r} if name in sys.modules))
+"""
+
+
+def environment() -> dict:
+    env = dict(os.environ)
+    env.setdefault("PYTHONPATH", os.path.join(REPO_DIR, "src"))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # time cached bytecode
+
+    return env
+
+
+def best_of(repeat: int, command: list[str], cwd: str) -> float:
+    timings = list()
+    env = environment()
+
+    subprocess.run(command, cwd=cwd, env=env, check=True,  # warm up caches
+                   stdout=subprocess.DEVNULL)
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def eager_imports() -> list[str]:
+    output = subprocess.run(
+        [sys.executable, "-c", CHECK_IMPORTS.format(modules=LAZY_MODULES)],
+        env=environment(), check=True, capture_output=True, text=True).stdout
+
+    return [name for name in output.strip().split(",") if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database",
+                        default=os.path.join(REPO_DIR, "emoticons.tsv"))
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="fail if a timing is slower than this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_filename = os.path.join(temp_dir, "config.toml")
+        open(config_filename, "w").close()
+
+        timings = {
+            "python": best_of(args.repeat, [sys.executable, "-c", "pass"],
+                              cwd=temp_dir),
+            "import": best_of(args.repeat,
+                              [sys.executable, "-c",
+                               "import kaomojitool.__main__"], cwd=temp_dir),
+            "dbstatus": best_of(args.repeat,
+                                [sys.executable, "-m", "kaomojitool",
+                                 "dbstatus", "-c", config_filename,
+                                 "-f", os.path.abspath(args.database)],
+                                cwd=temp_dir),
+        }
+
+    failed = False
+
+    for name, timing in timings.items():
+        print("{}: {:.1f}ms".format(name, timing * 1000))
+
+        if args.max_ms is not None and timing * 1000 > args.max_ms:
+            failed = True
+
+    eager = eager_imports()
+
+    if eager:
+        print("imported at startup:", ", ".join(eager))
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
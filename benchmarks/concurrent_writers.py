@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Stress tests concurrent writers: checks that no edit is lost.
+
+--workers processes each run --edits `kwadd` and `kwrm` commands, one after
+the other, on random kaomojis of a synthetic database shared by all of them.
+Every worker adds keywords of its own, and removes some of the ones it added,
+so the keywords each worker should have left on each kaomoji are known. When
+all are done, the database is loaded and compared to that: the exit status is
+1 if any edit was lost, or an edit nobody made shows up.
+
+With --group-commit the commands queue their edits and the lock holder writes
+a batch of them at once; compare the throughput of both:
+
+    $ python benchmarks/concurrent_writers.py --workers 8 --edits 20
+    $ python benchmarks/concurrent_writers.py --workers 8 --edits 20 \\
+          --group-commit
+
+Point PYTHONPATH to another checkout's src/ to stress test it.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "PYTHONPATH" not in os.environ:
+    sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from kaomojitool.kaomoji import KaomojiDB  # noqa: E402
+
+from synthetic_database import write_synthetic_database  # noqa: E402
+
+REMOVE_RATE = 0.3  # of the edits, the ones removing a keyword added before
+
+
+def environment() -> dict:
+    env = dict(os.environ)
+    env.setdefault("PYTHONPATH", os.path.join(REPO_DIR, "src"))
+
+    return env
+
+
+def run_worker(worker: int, filename: str, config_filename: str,
+               codes: list[str], edits: int, seed: int,
+               group_commit: bool) -> dict[str, list[str]]:
+    """Runs the edits of a worker, each a command of its own.
+
+    Returns:
+        the keywords the worker should have left on each kaomoji.
+    """
+
+    rng = random.Random(seed * 1000 + worker)
+    expected = dict()
+    arguments = ["-f", filename, "-c", config_filename]
+
+    if group_commit:
+        arguments.append("--group-commit")
+
+    for edit in range(edits):
+        added = [(code, keyword) for code, keywords in expected.items()
+                 for keyword in keywords]
+
+        if added and rng.random() < REMOVE_RATE:
+            code, keyword = rng.choice(added)
+            command = "kwrm"
+            expected[code].remove(keyword)
+        else:
+            code = rng.choice(codes)
+            keyword = "worker{}edit{}".format(worker, edit)
+            command = "kwadd"
+            expected.setdefault(code, list()).append(keyword)
+
+        subprocess.run([sys.executable, "-m", "kaomojitool", command,
+                        *arguments, "--kaomoji=" + code, "-w", keyword],
+                       env=environment(), check=True,
+                       stdout=subprocess.DEVNULL)
+
+    return expected
+
+
+def check(filename: str, expected: list[dict[str, list[str]]]) -> list[str]:
+    """The differences between the database and the expected keywords."""
+
+    database = KaomojiDB(filename=filename)
+    errors = list()
+
+    for worker, worker_expected in enumerate(expected):
+        prefix = "worker{}edit".format(worker)
+        found = {code: sorted(keyword for keyword in kaomoji.keywords
+                              if keyword.startswith(prefix))
+                 for code, kaomoji in database.kaomojis.items()}
+
+        for code in set(found) | set(worker_expected):
+            if found.get(code, []) != sorted(worker_expected.get(code, [])):
+                errors.append("worker {}, {}: expected {}, found {}".format(
+                    worker, code, sorted(worker_expected.get(code, [])),
+                    found.get(code, [])))
+
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--edits", type=int, default=10,
+                        help="the commands each worker runs")
+    parser.add_argument("--lines", type=int, default=1000)
+    parser.add_argument("--kaomojis", type=int, default=20,
+                        help="the kaomojis edited, so workers collide")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--group-commit", action="store_true")
+    parser.add_argument("--journal", action="store_true",
+                        help="with use_journal in the config")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        filename = os.path.join(work_dir, "concurrent.tsv")
+        config_filename = os.path.join(work_dir, "config.toml")
+        write_synthetic_database(filename, args.lines, seed=args.seed)
+
+        with open(config_filename, "w", encoding="utf-8") as config_file:
+            config_file.write("database_filename = {}\n".format(
+                json.dumps(filename)))
+            config_file.write("use_journal = {}\n".format(
+                json.dumps(args.journal)))
+
+        codes = random.Random(args.seed).sample(
+            list(KaomojiDB(filename=filename).kaomojis), k=args.kaomojis)
+
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(run_worker, worker, filename,
+                                       config_filename, codes, args.edits,
+                                       args.seed, args.group_commit)
+                       for worker in range(args.workers)]
+            expected = [future.result() for future in futures]
+
+        seconds = time.perf_counter() - start
+        errors = check(filename, expected)
+
+    edits = args.workers * args.edits
+
+    for error in errors:
+        print(error, file=sys.stderr)
+
+    print("{} edits by {} workers in {:.2f}s, {:.1f} edits/s; {}".format(
+        edits, args.workers, seconds, edits / seconds,
+        "{} lost or unexpected".format(len(errors)) if errors
+        else "none lost"))
+
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
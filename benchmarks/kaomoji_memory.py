@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Measures the resident bytes per entry of a loaded KaomojiDB.
+
+The bundled emoticons.tsv is scaled up by writing it `--scale` times to a
+temporary file, with a copy number appended to each code so every line stays
+a distinct entry. The memory traced while loading it is divided by the
+number of entries.
+
+Point PYTHONPATH to another checkout's src/ to measure it for comparison:
+
+    $ python benchmarks/kaomoji_memory.py --scale 1000
+    $ PYTHONPATH=/tmp/old/src python benchmarks/kaomoji_memory.py --scale 1000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "PYTHONPATH" not in os.environ:
+    sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from kaomojitool.kaomoji import KaomojiDB  # noqa: E402
+
+
+def write_scaled_database(source: str, scale: int, destination: str) -> None:
+    with open(source, "r", encoding="utf-8") as source_file:
+        lines = [line.rstrip("\n").split("\t", maxsplit=1)
+                 for line in source_file if line.strip()]
+
+    with open(destination, "w", encoding="utf-8") as destination_file:
+        for copy in range(scale):
+            for code, *keywords in lines:
+                destination_file.write("{code}~{copy}\t{keywords}\n".format(
+                    code=code, copy=copy, keywords="".join(keywords)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database",
+                        default=os.path.join(REPO_DIR, "emoticons.tsv"))
+    parser.add_argument("--scale", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        scaled_filename = os.path.join(temp_dir, "scaled.tsv")
+        write_scaled_database(args.database, args.scale, scaled_filename)
+
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+
+        database = KaomojiDB(filename=scaled_filename)
+
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    entries = len(database.kaomojis)
+
+    print("entries:", entries)
+    print("total bytes:", after - before)
+    print("bytes per entry: {:.1f}".format((after - before) / entries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Times substring and fuzzy keyword queries of the trigram index.
+
+A KeywordIndex of --keywords made up keywords (see synthetic_database.py),
+each on an entry of its own, is built, then these are timed:
+
+    build            the trigram index, on the first search after a load
+    substring        keywords containing a sampled keyword's middle part
+    fuzzy            keywords within --distance edits of a sampled keyword
+                     with a typo
+    scan             the same fuzzy queries comparing every keyword, as
+                     without the index; over --scan-samples queries only
+    edit             adding and removing a keyword, which updates the index
+
+    $ python benchmarks/keyword_search.py --keywords 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "PYTHONPATH" not in os.environ:
+    sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from kaomojitool.index import KeywordIndex  # noqa: E402
+from kaomojitool.index import rank_fuzzy_matches  # noqa: E402
+
+from synthetic_database import made_up_keywords  # noqa: E402
+
+
+def with_typo(keyword: str, rng: random.Random) -> str:
+    """The keyword with a character replaced, deleted or inserted."""
+
+    position = rng.randrange(len(keyword))
+    character = rng.choice("aeiouknst")
+
+    return rng.choice((
+        keyword[:position] + character + keyword[position + 1:],
+        keyword[:position] + keyword[position + 1:],
+        keyword[:position] + character + keyword[position:]))
+
+
+def per_query(queries: list[str], search) -> tuple[float, int]:
+    """The mean seconds of a search, and the total number of matches."""
+
+    matches = 0
+    start = time.perf_counter()
+
+    for query in queries:
+        matches += len(search(query))
+
+    return (time.perf_counter() - start) / len(queries), matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keywords", type=int, default=1000000)
+    parser.add_argument("--distance", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--scan-samples", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    keywords = made_up_keywords(args.keywords, set(), rng)
+    index = KeywordIndex()
+
+    for entry_id, keyword in enumerate(keywords):
+        index.add(entry_id, (keyword,))
+
+    start = time.perf_counter()
+    index.trigram_index()
+    build_time = time.perf_counter() - start
+
+    sampled = rng.sample(keywords, args.samples)
+    substrings = [keyword[1:-1] for keyword in sampled]
+    typos = [with_typo(keyword, rng) for keyword in sampled]
+
+    substring_time, substring_matches = per_query(
+        substrings, lambda query: index.keywords_containing(
+            query, limit=args.limit))
+    fuzzy_time, fuzzy_matches = per_query(
+        typos, lambda query: index.keywords_near(
+            query, max_distance=args.distance, limit=args.limit))
+    scan_time, _ = per_query(
+        typos[:args.scan_samples], lambda query: rank_fuzzy_matches(
+            query, ((keyword, 1) for keyword in keywords),
+            max_distance=args.distance, limit=args.limit))
+
+    start = time.perf_counter()
+
+    for entry_id, keyword in enumerate(typos, start=len(keywords)):
+        index.add(entry_id, (keyword,))
+        index.remove(entry_id, (keyword,))
+
+    edit_time = (time.perf_counter() - start) / len(typos)
+
+    print("keywords: {}, trigrams: {}".format(
+        len(keywords), len(index.trigram_index().postings)))
+    print("build: {:.2f}s".format(build_time))
+    print("substring: {:.2f}ms, {:.1f} matches".format(
+        substring_time * 1000, substring_matches / len(substrings)))
+    print("fuzzy: {:.2f}ms, {:.1f} matches".format(
+        fuzzy_time * 1000, fuzzy_matches / len(typos)))
+    print("scan: {:.2f}ms, {:.0f}x the fuzzy query".format(
+        scan_time * 1000, scan_time / fuzzy_time))
+    print("edit: {:.3f}ms".format(edit_time * 1000))
+
+
+if __name__ == "__main__":
+    main()
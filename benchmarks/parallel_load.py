@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Times loading a db file sequentially and with a pool of parsing workers.
+
+The db file is a scaled copy of emoticons.tsv (see kaomoji_memory.py). Each
+parallel load is checked to give the same entries, in the same order, as the
+sequential one.
+
+    $ python benchmarks/parallel_load.py --scale 400 --workers 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "PYTHONPATH" not in os.environ:
+    sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from kaomojitool.kaomoji import KaomojiDB  # noqa: E402
+
+from kaomoji_memory import write_scaled_database  # noqa: E402
+from snapshot_load import best_of  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database",
+                        default=os.path.join(REPO_DIR, "emoticons.tsv"))
+    parser.add_argument("--scale", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({2, 4, os.cpu_count() or 1} - {1}))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, "scaled.tsv")
+        write_scaled_database(args.database, args.scale, filename)
+
+        database = KaomojiDB(filename=filename)
+        expected = [(kaomoji.code, kaomoji.keywords)
+                    for kaomoji in database.kaomojis.values()]
+        del database
+
+        print("cpus: {}, entries: {}, size: {:.1f}MB".format(
+            os.cpu_count(), len(expected), os.path.getsize(filename) / 1e6))
+
+        sequential_time = best_of(args.repeat,
+                                  lambda: KaomojiDB(filename=filename))
+        print("sequential: {:.2f}s".format(sequential_time))
+
+        for workers in args.workers:
+            database = KaomojiDB(filename=filename, workers=workers)
+
+            if [(kaomoji.code, kaomoji.keywords)
+                    for kaomoji in database.kaomojis.values()] != expected:
+                sys.exit("workers: {}: entries differ".format(workers))
+
+            del database
+
+            parallel_time = best_of(
+                args.repeat, lambda: KaomojiDB(filename=filename,
+                                               workers=workers))
+            print("workers: {}, {:.2f}s, speedup: {:.2f}x".format(
+                workers, parallel_time, sequential_time / parallel_time))
+
+
+if __name__ == "__main__":
+    main()
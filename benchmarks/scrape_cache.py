@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Times re-scraping a local site with the HTTP cache.
+
+Uses the local server of scrape_concurrency.py. The site is scraped once to
+fill an empty cache, then again: with ETags, the pages come back as 304 Not
+Modified; with --no-validators, the server sends them whole, but they are not
+parsed again as their content is the same.
+
+    $ python benchmarks/scrape_cache.py --pages 100 --per-page 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "PYTHONPATH" not in os.environ:
+    sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from kaomojitool.httpcache import HTTPCache  # noqa: E402
+
+from scrape_concurrency import scrape  # noqa: E402
+from scrape_concurrency import start_server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--per-page", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--no-validators", dest="validators",
+                        action="store_false")
+    args = parser.parse_args()
+
+    process, base_url = start_server(args.latency, args.per_page,
+                                     validators=args.validators)
+    urls = ["{}/page/{}".format(base_url, page) for page in range(args.pages)]
+
+    try:
+        elapsed, _, _ = scrape(urls, args.workers, None)
+        print("no cache: {:.2f}s".format(elapsed))
+
+        with tempfile.TemporaryDirectory() as directory:
+            for run in ("cold cache", "warm cache"):
+                with HTTPCache(directory=directory) as cache:
+                    elapsed, kaomojis, errors = scrape(urls, args.workers,
+                                                       None, cache=cache)
+
+                print("{}: {:.2f}s, kaomojis: {}, errors: {}".format(
+                    run, elapsed, kaomojis, errors))
+    finally:
+        process.terminate()
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Times scraping many pages serially and concurrently from a local server.
+
+The local HTTP server stands in for a kaomoji site: each of its --pages pages
+answers after --latency seconds, with --per-page kaomojis in <span> elements
+and an ETag, and with --flaky, the first request of every page fails with a 503 so the
+retries are exercised too.
+
+    $ python benchmarks/scrape_concurrency.py --pages 200 --workers 16
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "PYTHONPATH" not in os.environ:
+    sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from kaomojitool.scrape import Scraper  # noqa: E402
+from kaomojitool.scrape import XPathExtractor  # noqa: E402
+
+EXTRACTOR = XPathExtractor(kaomoji_xpath="//span[@class='kaomoji']")
+
+
+def make_handler(latency: float, per_page: int, flaky: bool,
+                 validators: bool = True):
+    failed = set()
+    lock = threading.Lock()
+
+    class PageHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, for connection reuse
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+
+            with lock:
+                fail = flaky and self.path not in failed
+                failed.add(self.path)
+
+            if fail:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            body = "<html><body>{}</body></html>".format("".join(
+                "<span class='kaomoji'>(^_^){}{}</span>".format(self.path, n)
+                for n in range(per_page))).encode("utf-8")
+            etag = '"{}"'.format(zlib.crc32(body))
+
+            if validators and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            if validators:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return PageHandler
+
+
+def serve(port_queue, *handler_args) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(*handler_args))
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_server(latency: float, per_page: int, flaky: bool = False,
+                 validators: bool = True):
+    """Starts the local server in its own process, so it doesn't compete
+        with the scraper for the GIL.
+
+    Returns:
+        the server process and the base URL of the site.
+    """
+
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=serve, args=(port_queue, latency, per_page, flaky, validators),
+        daemon=True)
+    process.start()
+
+    return process, "http://127.0.0.1:{}".format(port_queue.get())
+
+
+def scrape(urls: list[str], workers: int, rate_limit,
+           cache=None) -> tuple[float, int, int]:
+    kaomojis = errors = 0
+    start = time.perf_counter()
+
+    with Scraper(workers=workers, rate_limit=rate_limit,
+                 cache=cache) as scraper:
+        for url, page, error in scraper.iter_fetch(urls):
+            if error:
+                errors += 1
+            else:
+                kaomojis += len(scraper.extract(page, EXTRACTOR))
+
+    return time.perf_counter() - start, kaomojis, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--per-page", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--flaky", action="store_true")
+    args = parser.parse_args()
+
+    for workers in (1, args.workers):
+        # a fresh server, so --flaky fails the first requests again
+        process, base_url = start_server(args.latency, args.per_page,
+                                         flaky=args.flaky)
+        urls = ["{}/page/{}".format(base_url, page)
+                for page in range(args.pages)]
+
+        try:
+            elapsed, kaomojis, errors = scrape(urls, workers, args.rate_limit)
+        finally:
+            process.terminate()
+            process.join()
+
+        print("workers: {}, {:.2f}s, {:.1f} pages/s, kaomojis: {},"
+              " errors: {}".format(workers, elapsed, args.pages / elapsed,
+                                   kaomojis, errors))
+
+
+if __name__ == "__main__":
+    main()
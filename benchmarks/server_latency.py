@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Compares a query answered by a `serve` server against loading the db.
+
+A server is started on a scaled copy of emoticons.tsv (see kaomoji_memory.py)
+and the same prefix query is timed through a KaomojiClient, and by loading a
+KaomojiDB and querying it, as a command without a server does.
+
+    $ python benchmarks/server_latency.py --scale 10 --query wink
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "PYTHONPATH" not in os.environ:
+    sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from kaomojitool.client import KaomojiClient  # noqa: E402
+from kaomojitool.kaomoji import KaomojiDB  # noqa: E402
+from kaomojitool.server import KaomojiServer  # noqa: E402
+
+from kaomoji_memory import write_scaled_database  # noqa: E402
+from snapshot_load import best_of  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database",
+                        default=os.path.join(REPO_DIR, "emoticons.tsv"))
+    parser.add_argument("--scale", type=int, default=10)
+    parser.add_argument("--query", default="wink")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, "scaled.tsv")
+        socket_filename = filename + ".sock"
+        write_scaled_database(args.database, args.scale, filename)
+
+        load_time = best_of(
+            args.repeat, lambda: KaomojiDB(filename=filename).query(args.query))
+
+        server = KaomojiServer(database=KaomojiDB(filename=filename),
+                               socket_filename=socket_filename)
+        thread = threading.Thread(target=server.serve_forever,
+                                  kwargs={"poll_interval": 0.05})
+        thread.start()
+
+        try:
+            connect_time = best_of(
+                args.repeat, lambda: KaomojiClient.connect(
+                    socket_filename).query(args.query))
+
+            client = KaomojiClient.connect(socket_filename)
+            matches = len(client.query(args.query))
+            request_time = best_of(args.repeat,
+                                   lambda: client.query(args.query))
+            client.close()
+        finally:
+            server.shutdown()
+            thread.join()
+            server.server_close()
+
+    print("matches:", matches)
+    print("load and query: {:.2f}ms".format(load_time * 1000))
+    print("server, new connection: {:.2f}ms".format(connect_time * 1000))
+    print("server, open connection: {:.2f}ms".format(request_time * 1000))
+    print("speedup: {:.0f}x".format(load_time / connect_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Compares a cold parse of a db file against loading its snapshot.
+
+    $ python benchmarks/snapshot_load.py --scale 100
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "PYTHONPATH" not in os.environ:
+    sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from kaomojitool.kaomoji import KaomojiDB  # noqa: E402
+
+from kaomoji_memory import write_scaled_database  # noqa: E402
+
+
+def best_of(repeat: int, function) -> float:
+    timings = list()
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database",
+                        default=os.path.join(REPO_DIR, "emoticons.tsv"))
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, "scaled.tsv")
+        write_scaled_database(args.database, args.scale, filename)
+
+        parse_time = best_of(args.repeat, lambda: KaomojiDB(filename=filename))
+
+        KaomojiDB(filename=filename, use_snapshot=True)  # writes the snapshot
+        snapshot_time = best_of(
+            args.repeat, lambda: KaomojiDB(filename=filename,
+                                           use_snapshot=True))
+
+        entries = len(KaomojiDB(filename=filename).kaomojis)
+
+    print("entries:", entries)
+    print("cold parse: {:.3f}s".format(parse_time))
+    print("snapshot load: {:.3f}s".format(snapshot_time))
+    print("speedup: {:.1f}x".format(parse_time / snapshot_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""Runs the benchmark suite on synthetic databases, with JSON results.
+
+For each --lines size a synthetic database is generated (see
+synthetic_database.py) and these cases are timed, each the best of --repeat
+runs:
+
+    load_file        parse the db file into a KaomojiDB
+    load_snapshot    load it from its snapshot sidecar
+    query            prefix queries of sampled keyword prefixes
+    query_all        AND queries of sampled keyword pairs
+    hash_index       build the hash index on first lookup
+    get_by_hash      look up sampled kaomojis by hash
+    compare          diff against a copy with some entries changed
+    write            write the whole database to a new file
+    cli_<command>    a fresh `python -m kaomojitool <command>` process
+
+The results are written as JSON to --output: the environment under
+"metadata", and a record per case and size under "results", with the time,
+the throughput and, for the loads and the CLI, the memory used. Give the
+results of another version as --baseline to print the speedups.
+
+    $ python benchmarks/suite.py --lines 1000 100000 -o new.json
+
+Point PYTHONPATH to another checkout's src/ to benchmark it, leaving out the
+cases it has no API for:
+
+    $ PYTHONPATH=/tmp/old/src python benchmarks/suite.py -o old.json
+    $ python benchmarks/suite.py -o new.json --baseline old.json
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if "PYTHONPATH" not in os.environ:
+    sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from kaomojitool.kaomoji import KaomojiDB  # noqa: E402
+
+from snapshot_load import best_of  # noqa: E402
+from synthetic_database import DISTRIBUTIONS  # noqa: E402
+from synthetic_database import DatabaseStatistics  # noqa: E402
+from synthetic_database import write_synthetic_database  # noqa: E402
+
+SAMPLES = 1000  # queries and lookups of each case
+CHANGED_EVERY = 10  # one in so many entries differ in the compared copy
+
+CLI_COMMANDS = {
+    "dbstatus": ["dbstatus"],
+    "query": ["query", "-q", "ha"],
+    "add": ["add", "-k", "(^_^)~bench", "-w", "benchmark"],
+    "export": ["export", "-o", "{work_dir}/export.tsv"],
+}
+
+
+class Case:
+    """A database of a size under benchmark, and what the cases share."""
+
+    def __init__(self, filename: str, lines: int, repeat: int, seed: int):
+        self.filename = filename
+        self.lines = lines
+        self.repeat = repeat
+        self.work_dir = os.path.dirname(filename)
+        self.rng = random.Random(seed)
+        self.database = KaomojiDB(filename=filename)
+        self.entries = len(self.database.kaomojis)
+
+    def result(self, case: str, seconds: float, operations: int,
+               unit: str, **metrics) -> dict:
+        return dict(case=case, lines=self.lines, entries=self.entries,
+                    seconds=seconds, operations=operations,
+                    throughput=operations / seconds,
+                    unit=unit, **metrics)
+
+
+def traced_bytes(function) -> int:
+    """The memory still allocated by `function` when it returns, with the
+        result kept alive.
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = function()  # noqa: F841
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return after - before
+
+
+def bench_load_file(case: Case) -> dict:
+    seconds = best_of(case.repeat, lambda: KaomojiDB(filename=case.filename))
+    memory = traced_bytes(lambda: KaomojiDB(filename=case.filename))
+
+    return case.result("load_file", seconds, case.entries, "entries/s",
+                       bytes_per_entry=memory / case.entries)
+
+
+def bench_load_snapshot(case: Case) -> dict:
+    KaomojiDB(filename=case.filename, use_snapshot=True)  # writes it
+    seconds = best_of(case.repeat, lambda: KaomojiDB(filename=case.filename,
+                                                     use_snapshot=True))
+    memory = traced_bytes(lambda: KaomojiDB(filename=case.filename,
+                                            use_snapshot=True))
+
+    return case.result("load_snapshot", seconds, case.entries, "entries/s",
+                       bytes_per_entry=memory / case.entries)
+
+
+def bench_query(case: Case) -> dict:
+    keywords = case.database.keyword_index.sorted_keywords()
+    prefixes = [keyword[:case.rng.randint(1, len(keyword))]
+                for keyword in case.rng.choices(keywords, k=SAMPLES)]
+    matches = sum(len(case.database.query(prefix)) for prefix in prefixes)
+
+    seconds = best_of(case.repeat, lambda: [case.database.query(prefix)
+                                            for prefix in prefixes])
+
+    return case.result("query", seconds, len(prefixes), "queries/s",
+                       matches=matches)
+
+
+def bench_query_all(case: Case) -> dict:
+    keywords = case.database.keyword_index.sorted_keywords()
+    pairs = [case.rng.sample(keywords, k=2) for _ in range(SAMPLES)]
+    matches = sum(len(case.database.query_all(pair)) for pair in pairs)
+
+    seconds = best_of(case.repeat, lambda: [case.database.query_all(pair)
+                                            for pair in pairs])
+
+    return case.result("query_all", seconds, len(pairs), "queries/s",
+                       matches=matches)
+
+
+def bench_hash_index(case: Case) -> dict:
+    def build():
+        case.database._hash_index = None
+        return case.database.hash_index
+
+    seconds = best_of(case.repeat, build)
+
+    return case.result("hash_index", seconds, case.entries, "entries/s")
+
+
+def bench_get_by_hash(case: Case) -> dict:
+    kaomojis = list(case.database.kaomojis.values())
+    hashes = [kaomoji.hash for kaomoji in case.rng.choices(kaomojis,
+                                                          k=SAMPLES)]
+    case.database.hash_index  # built by bench_hash_index
+
+    seconds = best_of(case.repeat, lambda: [
+        case.database.get_kaomoji_by_hash(the_hash) for the_hash in hashes])
+
+    return case.result("get_by_hash", seconds, len(hashes), "lookups/s")
+
+
+def bench_compare(case: Case) -> dict:
+    other_filename = os.path.join(case.work_dir, "other.tsv")
+
+    with open(case.filename, "r", encoding="utf-8") as db_file,\
+            open(other_filename, "w", encoding="utf-8") as other_file:
+        for number, line in enumerate(db_file):
+            if number % CHANGED_EVERY == 0:
+                line = line.rstrip("\n") + ", changed\n"
+
+            other_file.write(line)
+
+    other = KaomojiDB(filename=other_filename)
+    differences = len(case.database.compare(other, diff_type="difference"))
+
+    seconds = best_of(case.repeat, lambda: case.database.compare(
+        other, diff_type="difference"))
+
+    return case.result("compare", seconds, case.entries, "entries/s",
+                       differences=differences)
+
+
+def bench_write(case: Case) -> dict:
+    filename = os.path.join(case.work_dir, "written.tsv")
+
+    seconds = best_of(case.repeat,
+                      lambda: case.database.write(filename=filename))
+
+    return case.result("write", seconds, case.entries, "entries/s")
+
+
+def run_cli(arguments: list[str], cwd: str) -> tuple[float, int]:
+    """Runs the tool in a new process.
+
+    Returns:
+        the wall time, and the peak resident memory in bytes.
+    """
+
+    env = dict(os.environ)
+    env.setdefault("PYTHONPATH", os.path.join(REPO_DIR, "src"))
+
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "kaomojitool",
+                                *arguments], cwd=cwd, env=env,
+                               stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)  # its own resource usage
+    seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)  # reaped already
+
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, arguments)
+
+    # kilobytes on Linux, bytes on macOS
+    peak_memory = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    return seconds, peak_memory
+
+
+def bench_cli(case: Case, command: str) -> dict:
+    filename = os.path.join(case.work_dir, "cli.tsv")
+    config_filename = os.path.join(case.work_dir, "config.toml")
+
+    with open(config_filename, "w", encoding="utf-8") as config_file:
+        config_file.write("database_filename = {}\n".format(
+            json.dumps(filename)))
+
+    arguments = [argument.format(work_dir=case.work_dir)
+                 for argument in CLI_COMMANDS[command]]
+    arguments += ["-f", filename, "-c", config_filename]
+    timings = list()
+
+    for _ in range(case.repeat):
+        # a fresh copy each time, as `add` edits it
+        with open(case.filename, "rb") as db_file,\
+                open(filename, "wb") as cli_file:
+            cli_file.write(db_file.read())
+
+        timings.append(run_cli(arguments, cwd=case.work_dir))
+
+    seconds, peak_memory = min(timings)
+
+    return case.result("cli_" + command, seconds, 1, "runs/s",
+                       peak_rss_bytes=peak_memory)
+
+
+BENCHMARKS = {
+    "load_file": bench_load_file,
+    "load_snapshot": bench_load_snapshot,
+    "query": bench_query,
+    "query_all": bench_query_all,
+    "hash_index": bench_hash_index,
+    "get_by_hash": bench_get_by_hash,
+    "compare": bench_compare,
+    "write": bench_write,
+    **{"cli_" + command: lambda case, command=command: bench_cli(case, command)
+       for command in CLI_COMMANDS},
+}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(args) -> dict:
+    return dict(revision=git_revision(),
+                date=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                python=platform.python_version(),
+                implementation=platform.python_implementation(),
+                platform=platform.platform(),
+                cpus=os.cpu_count(),
+                seed=args.seed,
+                repeat=args.repeat,
+                distribution=args.distribution,
+                vocabulary=args.vocabulary)
+
+
+def print_result(result: dict, baseline: dict) -> None:
+    line = "{case:<16} {lines:>9} lines {seconds:>9.4f}s"\
+           " {throughput:>12.1f} {unit}".format(**result)
+
+    old = baseline.get((result["case"], result["lines"]))
+
+    if old:
+        line += "  {:.2f}x".format(old["seconds"] / result["seconds"])
+
+    print(line, file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+",
+                        default=[1000, 100000])
+    parser.add_argument("--cases", nargs="+", choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS,
+                        default="empirical")
+    parser.add_argument("--vocabulary", type=int, default=None)
+    parser.add_argument("-o", "--output", default=None,
+                        help="the JSON results file; stdout by default")
+    parser.add_argument("--baseline", default=None,
+                        help="the JSON results of another run to compare to")
+    args = parser.parse_args()
+
+    baseline = dict()
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = {(result["case"], result["lines"]): result
+                        for result in json.load(baseline_file)["results"]}
+
+    statistics = DatabaseStatistics(os.path.join(REPO_DIR, "emoticons.tsv"))
+    results = list()
+
+    for lines in args.lines:
+        with tempfile.TemporaryDirectory() as work_dir:
+            filename = os.path.join(work_dir, "synthetic.tsv")
+            write_synthetic_database(filename, lines, statistics=statistics,
+                                     seed=args.seed,
+                                     distribution=args.distribution,
+                                     vocabulary=args.vocabulary)
+
+            case = Case(filename=filename, lines=lines, repeat=args.repeat,
+                        seed=args.seed)
+
+            for name in args.cases:
+                result = BENCHMARKS[name](case)
+                print_result(result, baseline)
+                results.append(result)
+
+    report = json.dumps(dict(metadata=metadata(args), results=results),
+                        indent=2)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Writes a synthetic kaomoji database of any size, like emoticons.tsv.
+
+The statistics of a real database are sampled: the code lengths, the
+characters of the codes, the number of keywords per entry and the keyword
+frequencies. Each code ends with "~" and a unique suffix, so every line is a
+distinct entry. With --vocabulary, made up keywords are added after the real
+ones; --distribution sets how often each keyword is picked:
+
+    empirical  the real frequencies, continued as a Zipf tail for the made
+               up keywords.
+    zipf       1 / rank ** --zipf-exponent, by rank of real frequency.
+    uniform    every keyword alike.
+
+    $ python benchmarks/synthetic_database.py --lines 1000000 -o big.tsv
+    $ python benchmarks/synthetic_database.py --lines 10000 -o flat.tsv \\
+          --vocabulary 5000 --distribution uniform --mean-keywords 3
+"""
+
+import argparse
+import math
+import os
+import random
+from collections import Counter
+from itertools import accumulate
+from typing import Union
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DISTRIBUTIONS = ("empirical", "zipf", "uniform")
+
+CODE_SUFFIX_SEPARATOR = "~"
+SUFFIX_DIGITS = 32  # the most frequent code characters make up the suffixes
+
+SYLLABLES = [consonant + vowel for consonant in "bdfghklmnprstvwyz"
+             for vowel in "aeiou"]
+
+CHUNK_LINES = 10000  # lines generated and written at a time
+
+
+class DatabaseStatistics:
+    """What is sampled from a real database.
+
+    Attributes:
+        code_lengths (Counter): number of codes of each length.
+        characters (Counter): occurrences of each code character.
+        keyword_counts (Counter): number of entries with each number of
+            keywords.
+        keywords (Counter): number of entries having each keyword.
+    """
+
+    def __init__(self, filename: str):
+        self.code_lengths = Counter()
+        self.characters = Counter()
+        self.keyword_counts = Counter()
+        self.keywords = Counter()
+
+        with open(filename, "r", encoding="utf-8") as db_file:
+            for line in db_file:
+                if not line.strip():
+                    continue
+
+                code, _, keywords_str = line.strip().partition("\t")
+                keywords = {keyword.strip()
+                            for keyword in keywords_str.split(",")
+                            if keyword.strip()}
+
+                self.code_lengths[len(code)] += 1
+                self.characters.update(code)
+                self.keyword_counts[len(keywords)] += 1
+                self.keywords.update(keywords)
+
+        # a code can't end in a space, it would be stripped
+        for character in (" ", "\t"):
+            self.characters.pop(character, None)
+
+
+def made_up_keywords(number: int, taken: set, rng: random.Random) -> list[str]:
+    """Pronounceable keywords, not in `taken`."""
+
+    keywords = dict()
+
+    while len(keywords) < number:
+        keyword = "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+
+        if keyword not in taken:
+            keywords[keyword] = None
+
+    return list(keywords)
+
+
+def keyword_weights(statistics: DatabaseStatistics, vocabulary: int,
+                    distribution: str, zipf_exponent: float,
+                    rng: random.Random) -> tuple[list[str], list[float]]:
+    """The keywords to pick from, most frequent first, and their weights."""
+
+    real_keywords = [keyword for keyword, _
+                     in statistics.keywords.most_common(vocabulary)]
+    keywords = real_keywords + made_up_keywords(
+        vocabulary - len(real_keywords), set(real_keywords), rng)
+
+    if distribution == "uniform":
+        weights = [1.0] * len(keywords)
+
+    elif distribution == "zipf":
+        weights = [1 / rank ** zipf_exponent
+                   for rank in range(1, len(keywords) + 1)]
+
+    elif distribution == "empirical":
+        weights = [float(statistics.keywords[keyword])
+                   for keyword in real_keywords]
+        last_rank = len(weights)
+        last_weight = weights[-1]
+        weights.extend(last_weight * (last_rank / rank) ** zipf_exponent
+                       for rank in range(last_rank + 1, len(keywords) + 1))
+
+    else:
+        raise ValueError("distribution is not one of {}".format(DISTRIBUTIONS))
+
+    return keywords, weights
+
+
+def poisson(mean: float, rng: random.Random) -> int:
+    """A Poisson variate, by Knuth's method; fine for small means."""
+
+    limit = math.exp(-mean)
+    count = 0
+    product = rng.random()
+
+    while product > limit:
+        count += 1
+        product *= rng.random()
+
+    return count
+
+
+def to_suffix(number: int, digits: str) -> str:
+    suffix = list()
+
+    while True:
+        number, digit = divmod(number, len(digits))
+        suffix.append(digits[digit])
+
+        if not number:
+            return "".join(reversed(suffix))
+
+
+def write_synthetic_database(destination: str, lines: int,
+                             statistics: Union[DatabaseStatistics, None] = None,
+                             seed: int = 0,
+                             distribution: str = "empirical",
+                             vocabulary: Union[int, None] = None,
+                             zipf_exponent: float = 1.0,
+                             mean_keywords: Union[float, None] = None) -> None:
+    """Writes `lines` synthetic entries to `destination`; the same arguments
+        always give the same file.
+
+    Args:
+        statistics (DatabaseStatistics): what to sample; defaults to the
+            ones of the bundled emoticons.tsv.
+        seed (int): the seed of the random generator.
+        distribution (str): one of DISTRIBUTIONS.
+        vocabulary (int): number of distinct keywords; defaults to the
+            number of keywords in `statistics`.
+        zipf_exponent (float): the exponent of the "zipf" distribution and
+            of the made up tail of the "empirical" one.
+        mean_keywords (float): mean number of keywords per entry, at least
+            1; defaults to the real numbers of keywords per entry.
+    """
+
+    if statistics is None:
+        statistics = DatabaseStatistics(os.path.join(REPO_DIR, "emoticons.tsv"))
+
+    rng = random.Random(seed)
+
+    keywords, weights = keyword_weights(
+        statistics=statistics,
+        vocabulary=vocabulary or len(statistics.keywords),
+        distribution=distribution, zipf_exponent=zipf_exponent, rng=rng)
+    keyword_cum_weights = list(accumulate(weights))
+
+    characters = list(statistics.characters)
+    character_cum_weights = list(accumulate(statistics.characters.values()))
+    digits = "".join(character for character, _
+                     in statistics.characters.most_common()
+                     if character != CODE_SUFFIX_SEPARATOR)[:SUFFIX_DIGITS]
+
+    code_lengths = list(statistics.code_lengths)
+    code_length_cum_weights = list(accumulate(statistics.code_lengths.values()))
+    keyword_counts = list(statistics.keyword_counts)
+    keyword_count_cum_weights =\
+        list(accumulate(statistics.keyword_counts.values()))
+
+    with open(destination, "w", encoding="utf-8") as db_file:
+        for chunk_start in range(0, lines, CHUNK_LINES):
+            chunk_lines = min(CHUNK_LINES, lines - chunk_start)
+
+            lengths = rng.choices(code_lengths, cum_weights=code_length_cum_weights,
+                                  k=chunk_lines)
+            code_characters = "".join(rng.choices(
+                characters, cum_weights=character_cum_weights, k=sum(lengths)))
+
+            if mean_keywords is None:
+                counts = rng.choices(keyword_counts,
+                                     cum_weights=keyword_count_cum_weights,
+                                     k=chunk_lines)
+            else:
+                counts = [1 + poisson(max(mean_keywords - 1, 0), rng)
+                          for _ in range(chunk_lines)]
+
+            chunk_keywords = rng.choices(keywords,
+                                         cum_weights=keyword_cum_weights,
+                                         k=sum(counts))
+
+            entries = list()
+            code_position = keyword_position = 0
+
+            for line, (length, count) in enumerate(zip(lengths, counts),
+                                                   start=chunk_start):
+                body = code_characters[code_position:code_position + length]
+                code_position += length
+                entry_keywords = dict.fromkeys(
+                    chunk_keywords[keyword_position:keyword_position + count])
+                keyword_position += count
+
+                entries.append("{body}{separator}{suffix}\t{keywords}\n".format(
+                    body=body.lstrip(), separator=CODE_SUFFIX_SEPARATOR,
+                    suffix=to_suffix(line, digits),
+                    keywords=", ".join(entry_keywords)))
+
+            db_file.writelines(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source",
+                        default=os.path.join(REPO_DIR, "emoticons.tsv"),
+                        help="the database the statistics are taken from")
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS,
+                        default="empirical")
+    parser.add_argument("--vocabulary", type=int, default=None)
+    parser.add_argument("--zipf-exponent", type=float, default=1.0)
+    parser.add_argument("--mean-keywords", type=float, default=None)
+    args = parser.parse_args()
+
+    write_synthetic_database(destination=args.output, lines=args.lines,
+                             statistics=DatabaseStatistics(args.source),
+                             seed=args.seed, distribution=args.distribution,
+                             vocabulary=args.vocabulary,
+                             zipf_exponent=args.zipf_exponent,
+                             mean_keywords=args.mean_keywords)
+
+    print("lines: {}, size: {:.1f}MB".format(
+        args.lines, os.path.getsize(args.output) / (1 << 20)))
+
+
+if __name__ == "__main__":
+    main()
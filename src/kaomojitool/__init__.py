@@ -1,16 +1,23 @@
 import sys
 
-if sys.version_info[:2] >= (3, 8):
-    # TODO: Import directly (no need for conditional) when `python_requires = >= 3.8`
-    from importlib.metadata import PackageNotFoundError, version  # pragma: no cover
-else:
-    from importlib_metadata import PackageNotFoundError, version  # pragma: no cover
 
-try:
-    # Change here if project is renamed and does not equal the package name
-    dist_name = "kaomoji-database-edit-tool"
-    __version__ = version(dist_name)
-except PackageNotFoundError:  # pragma: no cover
-    __version__ = "unknown"
-finally:
-    del version, PackageNotFoundError
+def __getattr__(name):
+    # __version__ is looked up on demand: importlib.metadata is slow to
+    # import, and the command-line tool never needs it
+    if name != "__version__":
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name))
+
+    if sys.version_info[:2] >= (3, 8):
+        # TODO: Import directly (no need for conditional) when
+        # `python_requires = >= 3.8`
+        from importlib.metadata import PackageNotFoundError, version  # pragma: no cover
+    else:
+        from importlib_metadata import PackageNotFoundError, version  # pragma: no cover
+
+    try:
+        # Change here if project is renamed and does not equal the package name
+        dist_name = "kaomoji-database-edit-tool"
+        return version(dist_name)
+    except PackageNotFoundError:  # pragma: no cover
+        return "unknown"
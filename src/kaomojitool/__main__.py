@@ -1,33 +1,61 @@
 #!/usr/bin/env python3
 
 import os
-import random
-import time
-
-from lxml import html
-import requests
+from contextlib import nullcontext
+from typing import Callable, Union
 
 import click
-import toml
 
 # from kaomojitool.kaomoji import KaomojiDBKaomojiExists
 # from kaomojitool.kaomoji import KaomojiDBKaomojiDoesntExist
+from .index import edit_distance
 from .kaomoji import Kaomoji
 from .kaomoji import KaomojiDB
+from .kaomoji import DEFAULT_PARTITIONS
 
 from .kaomoji import KaomojiDBKaomojiExists
 from .kaomoji import KaomojiDBKaomojiDoesntExist
 
+# the backends, the backup store, diff and scrape are imported by the
+# commands using them, so each command pays only for its own imports; see
+# benchmarks/cli_startup.py
 class KaomojiToolNoDatabase(Exception):
     description="Kaomoji edit tool couldn't open database"
     def __init__(self, *args, **kwargs):
         super().__init__(self.description, *args, **kwargs)
 
+class KaomojiToolServerRunning(Exception):
+    description="A kaomoji server is serving the database; stop it first"
+    def __init__(self, *args, **kwargs):
+        super().__init__(self.description, *args, **kwargs)
+
 DEFAULT_CONFIG = {
     'database_filename': './emoticons.tsv',
+    'database_backend': 'tsv',  # or 'sqlite', for KaomojiSQLiteDB
+    'use_snapshot': False,  # keep a parsed <database_filename>.snapshot
+    'use_journal': False,  # append edits to <database_filename>.journal
+    'load_workers': 1,  # processes parsing big database files, in shards
+    'backup_directory': None,  # defaults to <database_filename>.backups
+    'backup_keep_last': None,  # prune all but the newest N backups
+    'backup_max_age_days': None,  # prune backups older than this
+    'socket_filename': None,  # defaults to <database_filename>.sock
+    'flush_interval': 5.0,  # seconds 'serve' waits to write edits
+    'scrape_workers': 8,  # pages 'scrape' fetches at the same time
+    'scrape_timeout': 10.0,  # seconds to connect, and for each read
+    'scrape_retries': 3,  # times a failed request is retried
+    'scrape_rate_limit': None,  # requests per second to each host
+    'scrape_cache': True,  # cache the pages and the texts extracted
+    'scrape_cache_directory': None,  # defaults to $XDG_CACHE_HOME/kaomojitool
+    'scrape_cache_size_mb': 256,  # least recently used pages are evicted
 }
 
 USER_CONFIG_FILENAME = os.path.expanduser("~/.kaomojitool")
+
+STDIN_CHUNK_SIZE = 1 << 16  # bytes of lines read from STDIN at a time
+SCRAPE_BATCH_SIZE = 1000  # scraped entries added to the database at a time
+SOCKET_SUFFIX = ".sock"
+TIMINGS_META_KEY = "kaomojitool.timings"  # the Timings of the command
+HISTOGRAM_WIDTH = 40  # characters of the longest bar of a histogram
 USER_CONFIG: dict
 
 # CONFIG = DEFAULT_CONFIG  # initialize it with defaults
@@ -44,35 +72,201 @@ USER_CONFIG: dict
 
 class KaomojiTool:
 
-    def __init__(self, cli_database_filename, cli_config_filename, *args, **kwargs):
+    def __init__(self, cli_database_filename, cli_config_filename,
+                 load_database=True, use_server=False, lock_database=False,
+                 create_database=False, *args, **kwargs):
+
+        # set by the --timings, --timings-json and --profile options
+        context = click.get_current_context(silent=True)
+        self.timings = context.meta.get(TIMINGS_META_KEY) if context else None
+
+        with self.phase("config"):
+            self.config = self._update_config(
+                cli_config_filename=cli_config_filename,
+                cli_database_filename=cli_database_filename)
+
+        # commands able to send their requests to a running 'serve' server
+        # get a client instead of loading the database
+        with self.phase("connect"):
+            self.client = self._connect_server() if use_server else None
+
+        self.lock = None
+        # a missing SQLite database is created instead of refused
+        self.create_database = create_database
+
+        # streaming commands read the file themselves via KaomojiDB.iter_file;
+        # it's for TSV files only, so other backends are always opened
+        if self.client or\
+                (not load_database and self.config['database_backend'] == 'tsv'):
+            self.database = None
+        else:
+            # editing commands hold the lock from loading to writing
+            if lock_database:
+                self.acquire_lock()
+
+            self.open_database()
+
+    def phase(self, name):
+        """Times the block as a phase of the command, with --timings."""
+
+        if self.timings is None:
+            return nullcontext()
+
+        return self.timings.phase(name)
+
+    @property
+    def database_filename(self):
+        """The database file name; the command-line one has priority."""
 
+        return self.config.get('cli_database_filename') or\
+            self.config['database_filename']
 
-        self.config = self._update_config(cli_config_filename=cli_config_filename,
-                                          cli_database_filename=cli_database_filename)
+    def open_database(self):
+        """Opens the database; for commands that were given
+        load_database=False and need it after all.
+        """
+
+        with self.phase("load"):
+            self.database = self._open_database()
+
+        return self.database
+
+    def acquire_lock(self):
+        """Holds the lock of the TSV database file until the command ends,
+        so concurrent commands don't drop each other's edits; SQLite
+        databases lock themselves.
+
+        A 'serve' server holds the lock while it runs, so this raises
+        instead of waiting for it to stop.
+        """
 
-        self.database = self._open_database()
+        if self.lock or self.config['database_backend'] != 'tsv':
+            return
 
+        self.refuse_server()
+
+        from .lock import DatabaseLock
+
+        with self.phase("lock"):
+            self.lock = DatabaseLock(self.database_filename)
+            self.lock.acquire()
+
+        context = click.get_current_context(silent=True)
+
+        if context:
+            context.call_on_close(self.lock.release)
+
+    def group_commit(self, records):
+        """Writes journal records to the TSV database file in a batch with
+        the ones of concurrent commands; see writequeue.group_commit.
+        """
+
+        from .writequeue import group_commit
+
+        def open_database():
+            # like the other edits, the file is backed up before writing
+            self.backup_database()
+            return self.open_database()
+
+        with self.phase("commit"):
+            return group_commit(filename=self.database_filename,
+                                records=records, open_database=open_database)
 
     def _open_database(self):
 
-        print(self.config)
-        database_filename = self.config['database_filename']
+        database_filename = self.database_filename
+
+        if self.config['database_backend'] == 'sqlite':
+            # connecting would create an empty database in its place
+            if not os.path.isfile(database_filename) and\
+                    not self.create_database:
+                raise KaomojiToolNoDatabase
+
+            from .sqlite import KaomojiSQLiteDB
+
+            return KaomojiSQLiteDB(filename=database_filename)
+
         # HERE: also check if it is valid
         if os.path.isfile(database_filename):
-            return KaomojiDB(filename=database_filename)
+            return KaomojiDB(filename=database_filename,
+                             use_snapshot=self.config['use_snapshot'],
+                             use_journal=self.config['use_journal'],
+                             workers=self.config['load_workers'],
+                             timings=self.timings)
         else:
             raise KaomojiToolNoDatabase
 
         return None
 
+    @property
+    def socket_filename(self):
+        """The Unix socket of the 'serve' server of the database."""
+
+        return self.config['socket_filename'] or\
+            self.database_filename + SOCKET_SUFFIX
+
+    def _connect_server(self):
+
+        if not os.path.exists(self.socket_filename):  # skip importing client
+            return None
+
+        from .client import KaomojiClient
+
+        return KaomojiClient.connect(socket_filename=self.socket_filename)
+
+    def refuse_server(self):
+        """Raises if a server is serving the database: the edits of commands
+        not talking to it would be overwritten when it writes its own.
+        """
+
+        client = self._connect_server()
+
+        if client:
+            client.close()
+            raise KaomojiToolServerRunning(self.socket_filename)
+
+    def backup_store(self):
+
+        from .backup import BackupStore
+
+        return BackupStore(filename=self.database_filename,
+                           directory=self.config['backup_directory'],
+                           sqlite=self.config['database_backend'] == 'sqlite')
+
     def backup_database(self):
+        """Backs up the database file as it is on disk, then prunes the
+        backups according to the retention config.
+        """
+
+        with self.phase("backup"):
+            store = self.backup_store()
+            backup = store.backup()
+
+            if backup:
+                self.prune_backups(store=store)
+
+        return backup
+
+    def prune_backups(self, store=None, keep_last=None, max_age_days=None):
+
+        store = store or self.backup_store()
+        keep_last = keep_last if keep_last is not None else\
+            self.config['backup_keep_last']
+        max_age_days = max_age_days if max_age_days is not None else\
+            self.config['backup_max_age_days']
 
-        database = self.database
-        timestamp = time.time()
-        backup_filename = "{filename}.{timestamp}.bkp".\
-            format(filename=database.filename, timestamp=timestamp)
-        backup = KaomojiDB(filename=database.filename)
-        backup.write(filename=backup_filename)
+        if keep_last is None and max_age_days is None:
+            return list()
+
+        # from the config; the option is checked by click
+        if keep_last is not None and keep_last < 1:
+            raise click.ClickException(
+                "backup_keep_last is {}; it must be at least 1".format(
+                    keep_last))
+
+        max_age = max_age_days * 86400 if max_age_days is not None else None
+
+        return store.prune(keep_last=keep_last, max_age=max_age)
 
     def _update_config(self, cli_database_filename,
                        cli_config_filename, config=DEFAULT_CONFIG,
@@ -83,7 +277,7 @@ class KaomojiTool:
         3. default config.
         """
 
-        self.config = DEFAULT_CONFIG
+        self.config = dict(DEFAULT_CONFIG)
         self.user_config = dict()
 
         if os.path.isfile(USER_CONFIG_FILENAME):
@@ -105,6 +299,8 @@ class KaomojiTool:
     def _read_config_file(self, config_filename):
 
         if os.path.isfile(config_filename):
+            import toml
+
             self.user_config = toml.load(config_filename)
 
         return self.user_config
@@ -163,7 +359,80 @@ diff_type_option = click.option(
     #prompt="Keywords, comma-separated",
     type=click.Choice(["additional", "difference", "exclusive",
                        "intersection"], case_sensitive=False),
-    help="Comma-separated list of keywords to change.")
+    help="Type of difference to show.")
+
+stream_option = click.option(
+    "-s", "--stream", "stream",
+    is_flag=True,
+    default=False,
+    help="Read the database line by line instead of loading it in memory;"\
+         " duplicated entries are not merged.")
+
+partitions_option = click.option(
+    "-p", "--partitions", "partitions",
+    default=DEFAULT_PARTITIONS,
+    type=click.IntRange(min=1),
+    help="With --stream, number of hash partitions to split the databases"\
+         " into; each one is compared in memory.")
+
+sorted_option = click.option(
+    "--sorted", "sorted_input",
+    is_flag=True,
+    default=False,
+    help="With --stream, both databases are sorted by kaomoji; compare them"\
+         " with a merge join instead of partitioning.")
+
+base_database_filename_option = click.option(
+    "-b", "--base", "base_database_filename",
+    required=True,
+    type=str,
+    help="Kaomoji database file both databases were edited from.")
+
+merged_database_filename_option = click.option(
+    "-o", "--other-database", "other_database_filename",
+    required=True,
+    type=str,
+    help="Kaomoji database file to merge into the default.")
+
+conflicts_filename_option = click.option(
+    "--conflicts", "conflicts_filename",
+    default=None,
+    type=str,
+    help="File to write the merge conflicts to, as JSON lines; they are"\
+         " written to stderr by default.")
+
+group_commit_option = click.option(
+    "-g", "--group-commit", "group_commit",
+    is_flag=True,
+    default=False,
+    help="Queue the edit, to be written in a batch with the ones of"\
+         " concurrent commands by whichever holds the database lock.")
+
+changeset_option = click.option(
+    "-C", "--changeset", "changeset",
+    is_flag=True,
+    default=False,
+    help="Print the changes turning the database into the other one, as a"\
+         " changeset for the apply command, instead of the difference.")
+
+changeset_filename_option = click.option(
+    "-i", "--input", "changeset_file",
+    required=True,
+    type=click.File("r", encoding="utf-8"),
+    help="Changeset file, as printed by diff --changeset; - reads STDIN.")
+
+top_keywords_option = click.option(
+    "-n", "--top", "top_keywords",
+    default=10,
+    type=click.IntRange(min=0),
+    help="Number of most frequent keywords to show.")
+
+refresh_stats_option = click.option(
+    "--refresh", "refresh_stats",
+    is_flag=True,
+    default=False,
+    help="Gather the statistics again, even if they are cached for the"\
+         " current database file.")
 
 query_string_option = click.option(
     "-q", "--query", "query_string",
@@ -171,23 +440,139 @@ query_string_option = click.option(
     type=str,
     help="String to query keywords.")
 
-url_to_scrape_option = click.option(
-    "-u", "--url", "url_to_scrape",
+all_keywords_option = click.option(
+    "-a", "--all", "all_keywords",
+    default=None,
+    type=str,
+    help="Comma-separated list of keywords the kaomojis must all have,"\
+         " matched whole; with --query, some keyword must also start with"\
+         " it.")
+
+substring_option = click.option(
+    "--substring", "substring",
+    is_flag=True,
+    default=False,
+    help="Match --query anywhere in the keywords instead of at their start,"\
+         " eg. 'ppy' for 'happy'.")
+
+fuzzy_option = click.option(
+    "-d", "--fuzzy", "max_distance",
+    default=None,
+    type=click.IntRange(min=0),
+    help="Match keywords at most this many typos (inserted, deleted or"\
+         " replaced characters) away from --query, eg. 1 for 'hapy'.")
+
+search_limit_option = click.option(
+    "--limit", "search_limit",
+    default=10,
+    type=click.IntRange(min=1),
+    help="Number of best matching keywords of --substring and --fuzzy whose"\
+         " kaomojis are shown; with --stream every match is shown, unranked.")
+
+input_filename_option = click.option(
+    "-i", "--input", "input_filename",
+    required=True,
+    type=click.Path(exists=True, file_okay=True, dir_okay=False),
+    help="TSV database file to import.")
+
+export_filename_option = click.option(
+    "-o", "--output", "output_filename",
+    required=True,
+    type=str,
+    help="TSV database file to export to.")
+
+backup_id_option = click.option(
+    "-i", "--id", "backup_id",
+    required=True,
+    type=str,
+    help="ID of the backup, as shown by 'backups list'.")
+
+output_filename_option = click.option(
+    "-o", "--output", "output_filename",
     default=None,
     type=str,
-    help="URL to scrape from"
+    help="File to restore to; defaults to the database file.")
+
+keep_last_option = click.option(
+    "-n", "--keep-last", "keep_last",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Keep only the newest N backups.")
+
+max_age_days_option = click.option(
+    "-d", "--max-age-days", "max_age_days",
+    default=None,
+    type=float,
+    help="Remove backups older than this many days.")
+
+flush_interval_option = click.option(
+    "-i", "--flush-interval", "flush_interval",
+    default=None,
+    type=click.FloatRange(min=0),
+    help="Seconds to wait before writing the edits received.")
+
+urls_to_scrape_option = click.option(
+    "-u", "--url", "urls_to_scrape",
+    default=None,
+    multiple=True,
+    type=str,
+    help="URL or local HTML file to scrape from; can be given many times."
+)
+url_file_option = click.option(
+    "-U", "--url-file", "url_file",
+    default=None,
+    type=click.File("r", encoding="utf-8"),
+    help="File with URLs or local HTML files to scrape from, one per line;"\
+         " use - for STDIN."
+)
+workers_option = click.option(
+    "-j", "--workers", "workers",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Number of pages to fetch at the same time."
+)
+rate_limit_option = click.option(
+    "-r", "--rate-limit", "rate_limit",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Maximum requests per second to each host."
+)
+timeout_option = click.option(
+    "-t", "--timeout", "timeout",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Seconds to wait to connect, and for each read."
+)
+into_db_option = click.option(
+    "--into-db", "into_db",
+    is_flag=True,
+    default=False,
+    help="Add the kaomojis scraped to the database instead of printing them."
+)
+cache_option = click.option(
+    "--cache/--no-cache", "use_cache",
+    default=None,
+    help="Cache the pages, and request them again only if they changed."
+)
+retries_option = click.option(
+    "--retries", "retries",
+    default=None,
+    type=click.IntRange(min=0),
+    help="Times a failed request is retried."
 )
 kaomoji_xpath_string_option = click.option(
     "-x", "--kaomoji-xpath-string", "kaomoji_xpath_string",
     default = None,
+    required=True,
     type = str,
-    help = "XPath of the kaomoji element"
+    help = "XPath of the kaomoji element; relative to the container one, if"\
+           " given"
 )
 keywords_xpath_string_option = click.option(
     "-X", "--keywords-xpath-string", "keywords_xpath_string",
     default=None,
     type=str,
-    help="XPath of the keyword element"
+    help="XPath of the keyword elements, relative to the container one"
 )
 container_xpath_string_option = click.option(
     "-C", "--container-xpath-string", "container_xpath_string",
@@ -197,15 +582,90 @@ container_xpath_string_option = click.option(
          " respective kayword(s)"
 )
 
+timings_option = click.option(
+    "--timings", "print_timings",
+    is_flag=True,
+    default=False,
+    help="Print the wall time, CPU time and memory of each phase of the"\
+         " command to STDERR: the change of resident memory during the phase,"\
+         " and the peak of the process so far; run with PYTHONTRACEMALLOC=1"\
+         " for the peak Python memory of each phase as well.")
+
+timings_json_option = click.option(
+    "--timings-json", "timings_json_filename",
+    default=None,
+    type=click.Path(dir_okay=False, writable=True, allow_dash=True),
+    help="Write the timings of each phase of the command as JSON to this"\
+         " file; use - for STDOUT.")
+
+profile_option = click.option(
+    "--profile", "profile_filename",
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help="Profile the command with cProfile, and dump the stats to this"\
+         " file; read it with `python -m pstats`.")
+
 @click.group()
-def cli():
+@timings_option
+@timings_json_option
+@profile_option
+@click.pass_context
+def cli(context, print_timings, timings_json_filename, profile_filename):
     """Toolchain to edit kaomoji database files.
 
     Contribute at:
 
     https://github.com/iacchus/kaomoji-database-edit-tool/
     """
-    pass
+
+    if print_timings or timings_json_filename:
+        from .timings import Timings
+
+        timings = context.meta[TIMINGS_META_KEY] = Timings()
+
+        def report_timings():
+            if print_timings:
+                click.echo(timings.report(), err=True)
+
+            if timings_json_filename:
+                with click.open_file(timings_json_filename, "w") as json_file:
+                    json_file.write(timings.to_json() + "\n")
+
+        context.call_on_close(report_timings)
+
+    if profile_filename:
+        import cProfile
+
+        profile = cProfile.Profile()
+
+        def dump_profile():
+            profile.disable()
+            profile.dump_stats(profile_filename)
+            click.echo("Profile written to {}".format(profile_filename),
+                       err=True)
+
+        # registered last, so it is called first, before the report
+        context.call_on_close(dump_profile)
+        profile.enable()
+
+def commit_records(kaomojitool, operation, kaomojis):
+    """Group commits a journal record of `operation` for each of `kaomojis`,
+    for the commands given --group-commit.
+    """
+
+    from .journal import format_record
+
+    applied = kaomojitool.group_commit(
+        [format_record(operation, kaomoji.code, kaomoji.keywords)
+         for kaomoji in kaomojis])
+
+    if applied:
+        print("Wrote db {} with {} queued edits".format(
+            kaomojitool.database_filename, applied))
+    else:
+        print("Queued edits written by another command to db",
+              kaomojitool.database_filename)
+
 
 ###############################################################################
 # add                                                                         #
@@ -215,44 +675,51 @@ def cli():
 @kaomoji_code_option
 @keywords_option
 @config_filename_option
-def add(database_filename, kaomoji_code, keywords, config_filename):
+@group_commit_option
+def add(database_filename, kaomoji_code, keywords, config_filename,
+        group_commit):
     """Adds the selected kaomoji to the selected database"""
 
     kaomojitool = KaomojiTool(cli_database_filename=database_filename,
-                              cli_config_filename=config_filename)
-
-    print("Backing up the database '{}'...".\
-          format(kaomojitool.database.filename))
-    kaomojitool.backup_database()
-
-    kaomoji_add_list: list = list()
-
-    if kaomoji_code:
-        new_kaomoji = Kaomoji(code=kaomoji_code, keywords=keywords)
-        kaomoji_add_list.append(new_kaomoji)
-    else:  # read from stdin
+                              cli_config_filename=config_filename,
+                              use_server=True,
+                              load_database=not group_commit,
+                              lock_database=True)
+
+    if kaomojitool.database is not None:
+        print("Backing up the database '{}'...".\
+              format(kaomojitool.database.filename))
+        kaomojitool.backup_database()
+
+    if kaomoji_code and kaomoji_code != "-":
+        kaomojis = [Kaomoji(code=kaomoji_code, keywords=keywords)]
+    else:  # read from stdin, a chunk of lines at a time
         stdin = click.get_text_stream('stdin')
+        kaomojis = (Kaomoji(line_entry=line)
+                    for chunk in iter(lambda: stdin.readlines(STDIN_CHUNK_SIZE),
+                                      [])
+                    for line in chunk if line.strip())
 
-        for line in stdin.readlines():
-            new_kaomoji = Kaomoji(line_entry=line)
-            kaomoji_add_list.append(new_kaomoji)
+    # given --group-commit
+    if not kaomojitool.client and kaomojitool.database is None:
+        from .journal import JOURNAL_KEYWORDS_ADD
 
-    for kaomoji in kaomoji_add_list:
+        commit_records(kaomojitool, JOURNAL_KEYWORDS_ADD, kaomojis)
+        return
 
-        db_kaomoji = kaomojitool.database.get_kaomoji(kaomoji)  # reference or None
+    with kaomojitool.phase("mutate"):
+        report = (kaomojitool.client or kaomojitool.database).ingest(kaomojis)
 
-        if db_kaomoji and kaomoji.keywords:
-            print("Kaomoji already exists! Updating keywords..")
-            db_kaomoji.add_keywords(keywords)
-        elif not db_kaomoji:
-            print("New kaomoji! Adding...")
-            db_kaomoji = kaomojitool.database.add_kaomoji(kaomoji)  # returns reference
+    print("added: {added}, updated: {updated}, unchanged: {unchanged}"
+          .format(**report))
 
-        print("kaomoji:", db_kaomoji.code)
-        print("keywords:", db_kaomoji.keywords)
+    if kaomojitool.client:
+        print("Sent to the server on", kaomojitool.socket_filename)
+        return
 
     print("Writing db", kaomojitool.database.filename)
-    kaomojitool.database.write()
+    with kaomojitool.phase("write"):
+        kaomojitool.database.write()
 
 
 ###############################################################################
@@ -271,29 +738,33 @@ def edit(database_filename, kaomoji_code, keywords_add, keywords_remove,
     """
 
     kaomojitool = KaomojiTool(cli_database_filename=database_filename,
-                              cli_config_filename=config_filename)
+                              cli_config_filename=config_filename,
+                              lock_database=True)
+    kaomojitool.refuse_server()
 
     keywords_to_add = ",".join(keywords_add)  # adding will have preemptiness
     keywords_to_remove = ",".join(keywords_remove)
 
     print("Keywords to remove:", keywords_to_remove)
 
-    edit_kaomoji = kaomojitool.database.get_kaomoji(by_entity=kaomoji_code)
+    # before any edit: the SQLite backend commits them as they are made
+    print("Backing up the database...")
+    kaomojitool.backup_database()
 
-    if not edit_kaomoji:
-        print("New kaomoji! Adding it do database...")
-        kaomoji_to_add = Kaomoji(code=kaomoji_code)
-        edit_kaomoji = kaomojitool.database.add_kaomoji(kaomoji_to_add)
-    else:
-        print("Kaomoji already exists! Editing keywords int it...")
+    with kaomojitool.phase("mutate"):
+        edit_kaomoji = kaomojitool.database.get_kaomoji(by_entity=kaomoji_code)
 
-    if keywords_to_remove:
-        edit_kaomoji.remove_keywords(keywords=keywords_to_remove)
-    if keywords_to_add:
-        edit_kaomoji.add_keywords(keywords=keywords_to_add)
+        if not edit_kaomoji:
+            print("New kaomoji! Adding it do database...")
+            kaomoji_to_add = Kaomoji(code=kaomoji_code)
+            edit_kaomoji = kaomojitool.database.add_kaomoji(kaomoji_to_add)
+        else:
+            print("Kaomoji already exists! Editing keywords int it...")
 
-    print("Backing up the database...")
-    kaomojitool.backup_database(db=kaomojitool.database)
+        if keywords_to_remove:
+            edit_kaomoji.remove_keywords(keywords=keywords_to_remove)
+        if keywords_to_add:
+            edit_kaomoji.add_keywords(keywords=keywords_to_add)
 
     print("Editing...")
     print("kaomoji:", edit_kaomoji.code)
@@ -301,7 +772,8 @@ def edit(database_filename, kaomoji_code, keywords_add, keywords_remove,
     kaomojitool.database.update_kaomoji(edit_kaomoji)
 
     print("Writing db", kaomojitool.database.filename)
-    kaomojitool.database.write()
+    with kaomojitool.phase("write"):
+        kaomojitool.database.write()
 
 
 ###############################################################################
@@ -315,24 +787,28 @@ def rm(database_filename, kaomoji_code, config_filename):
     """Removes the selected kaomoji from the selected database"""
 
     kaomojitool = KaomojiTool(cli_database_filename=database_filename,
-                              cli_config_filename=config_filename)
+                              cli_config_filename=config_filename,
+                              lock_database=True)
+    kaomojitool.refuse_server()
 
     if kaomoji_code:
         kaomoji_to_remove = Kaomoji(code=kaomoji_code)
 
     if kaomojitool.database.kaomoji_exists(kaomoji_to_remove):
         print("Backing up the database...")
-        kaomojitool.backup_database(db=kaomojitool.database)
+        kaomojitool.backup_database()
 
         print("Removing...")
         print("kaomoji:", kaomoji_to_remove.code)
         print("keywords:", kaomoji_to_remove.keywords)
-        kaomojitool.database.remove_kaomoji(kaomoji_to_remove)
+        with kaomojitool.phase("mutate"):
+            kaomojitool.database.remove_kaomoji(kaomoji_to_remove)
     else:
         raise kaomojitool.databaseKaomojiDoesntExist
 
     print("Writing db", kaomojitool.database.filename)
-    kaomojitool.database.write()
+    with kaomojitool.phase("write"):
+        kaomojitool.database.write()
 
 
 ###############################################################################
@@ -343,25 +819,46 @@ def rm(database_filename, kaomoji_code, config_filename):
 @kaomoji_code_option
 @config_filename_option
 @keywords_option
-def kwadd(database_filename, kaomoji_code, keywords, config_filename):
+@group_commit_option
+def kwadd(database_filename, kaomoji_code, keywords, config_filename,
+          group_commit):
     """Add keywords to the selected kaomoji."""
 
     kaomojitool = KaomojiTool(cli_database_filename=database_filename,
-                              cli_config_filename=config_filename)
+                              cli_config_filename=config_filename,
+                              use_server=True,
+                              load_database=not group_commit,
+                              lock_database=True)
+
+    if kaomojitool.client:
+        edit_kaomoji = kaomojitool.client.add_keywords(code=kaomoji_code,
+                                             keywords=keywords)
+        print("kaomoji:", edit_kaomoji.code)
+        print("keywords:", edit_kaomoji.keywords)
+        return
+
+    if kaomojitool.database is None:  # group commit
+        from .journal import JOURNAL_KEYWORDS_ADD
+
+        commit_records(kaomojitool, JOURNAL_KEYWORDS_ADD,
+                       [Kaomoji(code=kaomoji_code, keywords=keywords)])
+        return
+
+    # before any edit: the SQLite backend commits them as they are made
+    print("Backing up the database...")
+    kaomojitool.backup_database()
 
-    if not kaomojitool.database.get_kaomoji(by_entity=kaomoji_code):
-        print("New kaomoji! Adding it do database...")
-        new_kaomoji = Kaomoji(code=kaomoji_code, keywords=keywords)
-        kaomojitool.database.add_kaomoji(kaomoji=new_kaomoji)
-    else:
-        print("Kaomoji already exists! Removing keywords from it...")
+    with kaomojitool.phase("mutate"):
+        if not kaomojitool.database.get_kaomoji(by_entity=kaomoji_code):
+            print("New kaomoji! Adding it do database...")
+            new_kaomoji = Kaomoji(code=kaomoji_code, keywords=keywords)
+            kaomojitool.database.add_kaomoji(kaomoji=new_kaomoji)
+        else:
+            print("Kaomoji already exists! Removing keywords from it...")
 
-    #edit_kaomoji = kaomojitool.database.get_kaomoji_by_code(code=kaomoji_code)
-    edit_kaomoji = kaomojitool.database.get_kaomoji(by_entity=kaomoji_code)
-    edit_kaomoji.add_keywords(keywords=keywords)
-
-    print("Backing up the database...")
-    kaomojitool.backup_database(db=kaomojitool.database)
+        #edit_kaomoji = kaomojitool.database.get_kaomoji_by_code(code=kaomoji_code)
+        edit_kaomoji = kaomojitool.database.get_kaomoji(by_entity=kaomoji_code)
+        edit_kaomoji.add_keywords(keywords=keywords)
 
     print("Removing keywords...")
     print("kaomoji:", edit_kaomoji.code)
@@ -369,7 +866,8 @@ def kwadd(database_filename, kaomoji_code, keywords, config_filename):
     kaomojitool.database.update_kaomoji(edit_kaomoji)
 
     print("Writing db", kaomojitool.database.filename)
-    kaomojitool.database.write()
+    with kaomojitool.phase("write"):
+        kaomojitool.database.write()
 
 
 ###############################################################################
@@ -380,32 +878,205 @@ def kwadd(database_filename, kaomoji_code, keywords, config_filename):
 @kaomoji_code_option
 @config_filename_option
 @keywords_option
-def kwrm(database_filename, kaomoji_code, keywords, config_filename):
+@group_commit_option
+def kwrm(database_filename, kaomoji_code, keywords, config_filename,
+         group_commit):
     """Remove keywords to the selected kaomoji."""
 
     kaomojitool = KaomojiTool(cli_database_filename=database_filename,
-                              cli_config_filename=config_filename)
-
-    if not kaomojitool.database.get_kaomoji(by_entity=kaomoji_code):
-        print("New kaomoji! Adding it do database...")
-        new_kaomoji = Kaomoji(code=kaomoji_code, keywords=keywords)
-        kaomojitool.database.add_kaomoji(kaomoji=new_kaomoji)
-    else:
-        print("Kaomoji already exists! Adding keywords to it...")
-
-    edit_kaomoji = kaomojitool.database.get_kaomoji(by_entity=kaomoji_code)
-    edit_kaomoji.remove_keywords(keywords=keywords)
-
+                              cli_config_filename=config_filename,
+                              use_server=True,
+                              load_database=not group_commit,
+                              lock_database=True)
+
+    if kaomojitool.client:
+        edit_kaomoji = kaomojitool.client.remove_keywords(code=kaomoji_code,
+                                             keywords=keywords)
+        print("kaomoji:", edit_kaomoji.code)
+        print("keywords:", edit_kaomoji.keywords)
+        return
+
+    if kaomojitool.database is None:  # group commit
+        from .journal import JOURNAL_KEYWORDS_REMOVE
+
+        commit_records(kaomojitool, JOURNAL_KEYWORDS_REMOVE,
+                       [Kaomoji(code=kaomoji_code, keywords=keywords)])
+        return
+
+    # before any edit: the SQLite backend commits them as they are made
     print("Backing up the database...")
     kaomojitool.backup_database()
 
+    with kaomojitool.phase("mutate"):
+        if not kaomojitool.database.get_kaomoji(by_entity=kaomoji_code):
+            print("New kaomoji! Adding it do database...")
+            new_kaomoji = Kaomoji(code=kaomoji_code, keywords=keywords)
+            kaomojitool.database.add_kaomoji(kaomoji=new_kaomoji)
+        else:
+            print("Kaomoji already exists! Adding keywords to it...")
+
+        edit_kaomoji = kaomojitool.database.get_kaomoji(by_entity=kaomoji_code)
+        edit_kaomoji.remove_keywords(keywords=keywords)
+
     print("Removing keywords...")
     print("kaomoji:", edit_kaomoji.code)
     print("keywords:", edit_kaomoji.keywords)
     kaomojitool.database.update_kaomoji(edit_kaomoji)
 
     print("Writing db", kaomojitool.database.filename)
-    kaomojitool.database.write()
+    with kaomojitool.phase("write"):
+        kaomojitool.database.write()
+
+
+###############################################################################
+# compact                                                                     #
+###############################################################################
+@cli.command()
+@database_filename_option
+@config_filename_option
+def compact(database_filename, config_filename):
+    """Folds the journaled edits into the database file."""
+
+    kaomojitool = KaomojiTool(cli_database_filename=database_filename,
+                              cli_config_filename=config_filename,
+                              lock_database=True)
+    kaomojitool.refuse_server()
+
+    print("Compacting db", kaomojitool.database.filename)
+    with kaomojitool.phase("write"):
+        kaomojitool.database.compact()
+
+
+###############################################################################
+# import                                                                      #
+###############################################################################
+@cli.command("import")
+@database_filename_option
+@config_filename_option
+@input_filename_option
+def import_(database_filename, config_filename, input_filename):
+    """Imports a TSV database file; its entries replace the ones with the
+    same kaomoji. A SQLite database is created if it doesn't exist.
+    """
+
+    kaomojitool = KaomojiTool(cli_database_filename=database_filename,
+                              cli_config_filename=config_filename,
+                              lock_database=True, create_database=True)
+    kaomojitool.refuse_server()
+
+    print("Backing up the database...")
+    kaomojitool.backup_database()
+
+    database = kaomojitool.database
+
+    with kaomojitool.phase("mutate"):
+        if isinstance(database, KaomojiDB):
+            report = dict(imported=0)
+
+            for kaomoji in KaomojiDB.iter_file(filename=input_filename):
+                database.add_kaomoji(kaomoji)
+                report["imported"] += 1
+        else:
+            report = database.import_tsv(filename=input_filename)
+
+    print("imported: {imported}".format(**report))
+
+    print("Writing db", database.filename)
+    with kaomojitool.phase("write"):
+        database.write()
+
+
+###############################################################################
+# export                                                                      #
+###############################################################################
+@cli.command()
+@database_filename_option
+@config_filename_option
+@export_filename_option
+def export(database_filename, config_filename, output_filename):
+    """Exports the database as a TSV database file."""
+
+    kaomojitool = KaomojiTool(cli_database_filename=database_filename,
+                              cli_config_filename=config_filename)
+
+    print("Exporting db", kaomojitool.database.filename, "to", output_filename)
+    with kaomojitool.phase("write"):
+        kaomojitool.database.write(filename=output_filename)
+
+
+###############################################################################
+# backups                                                                     #
+###############################################################################
+@cli.group()
+def backups():
+    """Lists, prunes and restores the database backups."""
+    pass
+
+
+@backups.command("list")
+@database_filename_option
+@config_filename_option
+def backups_list(database_filename, config_filename):
+    """Lists the backups of the database, oldest first."""
+
+    import time
+
+    kaomojitool = KaomojiTool(cli_database_filename=database_filename,
+                              cli_config_filename=config_filename,
+                              load_database=False)
+
+    for backup in kaomojitool.backup_store().backups():
+        print(backup.backup_id,
+              time.strftime("%Y-%m-%d %H:%M:%S",
+                            time.localtime(backup.timestamp)),
+              backup.size, backup.database_digest[:12], sep="\t")
+
+
+@backups.command("prune")
+@database_filename_option
+@config_filename_option
+@keep_last_option
+@max_age_days_option
+def backups_prune(database_filename, config_filename, keep_last,
+                  max_age_days):
+    """Removes the backups out of the retention policy."""
+
+    kaomojitool = KaomojiTool(cli_database_filename=database_filename,
+                              cli_config_filename=config_filename,
+                              load_database=False)
+
+    kaomojitool.acquire_lock()  # the manifest is rewritten
+
+    removed = kaomojitool.prune_backups(keep_last=keep_last,
+                                        max_age_days=max_age_days)
+
+    print("Removed {} backups.".format(len(removed)))
+
+
+@backups.command("restore")
+@database_filename_option
+@config_filename_option
+@backup_id_option
+@output_filename_option
+def backups_restore(database_filename, config_filename, backup_id,
+                    output_filename):
+    """Restores a backup; the current database is backed up first."""
+
+    kaomojitool = KaomojiTool(cli_database_filename=database_filename,
+                              cli_config_filename=config_filename,
+                              load_database=False)
+    kaomojitool.refuse_server()
+
+    store = kaomojitool.backup_store()
+
+    if not output_filename:
+        kaomojitool.acquire_lock()
+
+        print("Backing up the database...")
+        store.backup()
+
+    backup = store.restore(backup_id=backup_id, destination=output_filename)
+    print("Restored backup", backup.backup_id)
 
 
 ###############################################################################
@@ -416,25 +1087,222 @@ def kwrm(database_filename, kaomoji_code, keywords, config_filename):
 @other_database_filename_option
 @diff_type_option
 @config_filename_option
+@stream_option
+@partitions_option
+@sorted_option
+@changeset_option
 def diff(database_filename, other_database_filename, diff_type,
-         config_filename):
-    """Compare two databases and logs the difference between them."""
+         config_filename, stream, partitions, sorted_input, changeset):
+    """Compare two databases and print the difference between them as
+    database lines.
+
+    With --changeset, the changes turning the database into the other one are
+    printed instead, one per line keyed by the kaomoji hash, for the apply
+    command.
+
+    With --stream, the database files are read as they are on disk, without
+    replaying their journals.
+    """
 
     kaomojitool = KaomojiTool(cli_database_filename=database_filename,
-                              cli_config_filename=config_filename)
+                              cli_config_filename=config_filename,
+                              load_database=not stream)
 
     kaomojitool_other =\
         KaomojiTool(cli_database_filename=other_database_filename,
-                    cli_config_filename=config_filename)
+                    cli_config_filename=config_filename,
+                    load_database=not stream)
+
+    if changeset:
+        from .changeset import CHANGESET_HEADER
+
+        print(CHANGESET_HEADER, end="")
+
+    if kaomojitool.database is None or kaomojitool_other.database is None:
+        from .diff import KaomojiDBNotSorted
+        from .diff import iter_changes_partitioned
+        from .diff import iter_changes_sorted
+        from .diff import iter_compare_partitioned
+        from .diff import iter_compare_sorted
+
+        filenames = dict(filename=kaomojitool.database_filename,
+                         other_filename=kaomojitool_other.database_filename)
+
+        if changeset and sorted_input:
+            lines = iter_changes_sorted(**filenames)
+        elif changeset:
+            lines = iter_changes_partitioned(**filenames,
+                                             partitions=partitions)
+        elif sorted_input:
+            lines = (diff_kaomoji.to_line_entry() for diff_kaomoji
+                     in iter_compare_sorted(**filenames, diff_type=diff_type))
+        else:
+            lines = (diff_kaomoji.to_line_entry() for diff_kaomoji
+                     in iter_compare_partitioned(**filenames,
+                                                 diff_type=diff_type,
+                                                 partitions=partitions))
+
+        try:
+            for line in lines:
+                print(line, end="")
+        except KaomojiDBNotSorted as error:
+            raise click.ClickException(
+                "{}: {}; compare it without --sorted".format(
+                    error.args[1], error.description))
+        return
+
+    with kaomojitool.phase("compare"):
+        if changeset:
+            from .changeset import iter_changes
+
+            lines = list(iter_changes(
+                kaomojis=kaomojitool.database.kaomojis,
+                other_kaomojis=kaomojitool_other.database.kaomojis))
+        else:
+            lines = [diff_kaomoji.to_line_entry() for diff_kaomoji
+                     in kaomojitool.database.compare(
+                         other=kaomojitool_other.database,
+                         diff_type=diff_type).values()]
+
+    for line in lines:
+        print(line, end="")
+
+
+###############################################################################
+# apply                                                                       #
+###############################################################################
+@cli.command()
+@database_filename_option
+@config_filename_option
+@changeset_filename_option
+def apply(database_filename, config_filename, changeset_file):
+    """Applies a changeset printed by diff --changeset to the database;
+    changes to kaomojis the database doesn't have are skipped. The whole
+    changeset is checked first, so an invalid one changes nothing.
+    """
+
+    from .changeset import KaomojiChangesetInvalid
+    from .changeset import apply_changes
+    from .changeset import iter_changeset
+
+    try:
+        changes = list(iter_changeset(changeset_file))
+    except KaomojiChangesetInvalid as error:
+        description, line_number, line = error.args
+        raise click.ClickException("{}: line {}: {!r}".format(
+            description, line_number, line.rstrip("\n")))
+
+    kaomojitool = KaomojiTool(cli_database_filename=database_filename,
+                              cli_config_filename=config_filename,
+                              lock_database=True)
+    kaomojitool.refuse_server()
+
+    print("Backing up the database...")
+    kaomojitool.backup_database()
+
+    database = kaomojitool.database
+
+    with kaomojitool.phase("mutate"):
+        report = apply_changes(database, changes)
+
+    print("added: {added}, removed: {removed}, updated: {updated},"
+          " missing: {missing}".format(**report))
+
+    print("Writing db", database.filename)
+    with kaomojitool.phase("write"):
+        database.write()
+
+
+###############################################################################
+# merge                                                                       #
+###############################################################################
+@cli.command()
+@database_filename_option
+@base_database_filename_option
+@merged_database_filename_option
+@config_filename_option
+@stream_option
+@partitions_option
+@conflicts_filename_option
+def merge(database_filename, base_database_filename, other_database_filename,
+          config_filename, stream, partitions, conflicts_filename):
+    """Three-way merges another database into the default one, both edited
+    from the base one: the keywords added and removed in the other are added
+    and removed in the default one, and so are its new and deleted entries.
+
+    An entry edited in one and deleted in the other is a conflict; the edited
+    entry is kept, the conflict is reported as a JSON line and the command
+    exits with status 1.
+
+    With --stream, the database files are read as they are on disk, without
+    replaying their journals, and the merged database is printed as database
+    lines instead of written.
+    """
+
+    kaomojitool = KaomojiTool(cli_database_filename=database_filename,
+                              cli_config_filename=config_filename,
+                              load_database=not stream,
+                              lock_database=True)
+
+    kaomojitool_base, kaomojitool_other = (
+        KaomojiTool(cli_database_filename=filename,
+                    cli_config_filename=config_filename,
+                    load_database=not stream)
+        for filename in (base_database_filename, other_database_filename))
+
+    if kaomojitool.database is None or kaomojitool_base.database is None or\
+            kaomojitool_other.database is None:
+        from .diff import iter_merge_partitioned
+
+        conflicts = list()
+
+        for kaomoji, conflict in iter_merge_partitioned(
+                base_filename=kaomojitool_base.database_filename,
+                filename=kaomojitool.database_filename,
+                other_filename=kaomojitool_other.database_filename,
+                partitions=partitions):
+            if conflict:
+                conflicts.append(conflict)
+
+            if kaomoji:
+                print(kaomoji.to_line_entry(), end="")
+    else:
+        kaomojitool.refuse_server()
+
+        print("Backing up the database...")
+        kaomojitool.backup_database()
+
+        database = kaomojitool.database
+
+        with kaomojitool.phase("merge"):
+            report, conflicts = database.merge(
+                base=kaomojitool_base.database,
+                other=kaomojitool_other.database)
 
-    if not kaomojitool.database or not kaomojitool_other.database:
-        raise KaomojiToolNoDatabase
+        print("added: {added}, updated: {updated}, removed: {removed},"
+              " conflicts: {conflicts}".format(conflicts=len(conflicts),
+                                                **report))
 
-    diff_dict = kaomojitool.database.compare(other=kaomojitool_other.database,
-                                             diff_type=diff_type)
-    print(diff_dict)
+        print("Writing db", database.filename)
+        with kaomojitool.phase("write"):
+            database.write()
 
-    # TAKE SHA256, FORMAT FOR kaomojitool.database, WRITE
+    if not conflicts:
+        return
+
+    import json
+
+    conflict_lines = [json.dumps(conflict.to_dict(), ensure_ascii=False)
+                      for conflict in conflicts]
+
+    if conflicts_filename:
+        with open(conflicts_filename, "w", encoding="utf-8") as conflicts_file:
+            conflicts_file.writelines(line + "\n" for line in conflict_lines)
+    else:
+        for line in conflict_lines:
+            click.echo(line, err=True)
+
+    click.get_current_context().exit(1)
 
 
 ###############################################################################
@@ -443,16 +1311,89 @@ def diff(database_filename, other_database_filename, diff_type,
 @cli.command()
 @database_filename_option
 @config_filename_option
-def dbstatus(database_filename, config_filename):
+@stream_option
+@top_keywords_option
+@refresh_stats_option
+def dbstatus(database_filename, config_filename, stream, top_keywords,
+             refresh_stats):
     """Show data from the database."""
 
+    from .stats import DatabaseStats
+    from .stats import read_stats
+    from .stats import stats_key
+    from .stats import write_stats
+
     kaomojitool = KaomojiTool(cli_database_filename=database_filename,
-                              cli_config_filename=config_filename)
+                              cli_config_filename=config_filename,
+                              load_database=False,
+                              use_server=not stream)
+
+    if kaomojitool.client:
+        status = kaomojitool.client.dbstatus(stats=True)
+        print("database file:", status["database_filename"])
+        print("number of kaomojis:", status["number_of_kaomojis"])
+        print("served on:", kaomojitool.socket_filename)
+        print("pending edits:", status["pending_edits"])
+        print_stats(DatabaseStats.from_dict(status["stats"]),
+                    top_keywords=top_keywords)
+        return
+
+    filename = kaomojitool.database_filename
+    # the sidecar and streaming are for the TSV backend only; an SQLite file
+    # is queried as it is, and may change without its mtime in WAL mode
+    tsv_backend = kaomojitool.config['database_backend'] == 'tsv'
+    stats = read_stats(filename, streamed=stream)\
+        if tsv_backend and not refresh_stats else None
+    cached = stats is not None
+
+    if not cached:
+        key = stats_key(filename)
+
+        if stream and tsv_backend:
+            with kaomojitool.phase("stats"):
+                stats = DatabaseStats.from_file(filename)
+        else:
+            database = kaomojitool.database or kaomojitool.open_database()
+
+            with kaomojitool.phase("stats"):
+                stats = DatabaseStats.from_database(database)
+
+        if tsv_backend:
+            write_stats(filename, stats, key=key)
+
+    print("database file:", filename)
+    print("number of kaomojis:", stats.entries)
+    print_stats(stats, top_keywords=top_keywords)
+    print("statistics: {}{}".format(
+        "streamed" if stats.streamed else "loaded",
+        ", cached" if cached else ""))
+
+
+def print_stats(stats, top_keywords):
+    """Prints the statistics of `dbstatus`, a DatabaseStats."""
+
+    print("keywords:", stats.keywords)
+    print("entries without keywords:", stats.entries_without_keywords)
+    print("average keywords per entry: {:.2f}".format(stats.average_keywords))
+
+    if top_keywords:
+        print("top keywords:")
+
+        for keyword, frequency in stats.top_keywords(top_keywords):
+            print("    {}: {}".format(keyword, frequency))
+
+    print("code lengths:")
+
+    most_common = max(stats.code_lengths.values(), default=0)
 
-    number_of_kaomoji = len(kaomojitool.database.kaomojis)
+    for length, count in sorted(stats.code_lengths.items()):
+        print("    {:>4}: {:>8} {}".format(
+            length, count, "#" * -(-count * HISTOGRAM_WIDTH // most_common)))
 
-    print("database file:", kaomojitool.database.filename)
-    print("number of kaomojis:", number_of_kaomoji)
+    print("estimated memory when loaded:")
+
+    for structure, size in stats.memory_estimate().items():
+        print("    {}: {:.1f}MB".format(structure, size / (1 << 20)))
 
 
 ###############################################################################
@@ -461,48 +1402,294 @@ def dbstatus(database_filename, config_filename):
 @cli.command()
 @database_filename_option
 @query_string_option
+@all_keywords_option
+@substring_option
+@fuzzy_option
+@search_limit_option
 @config_filename_option
-def query(database_filename, query_string, config_filename):
+@stream_option
+def query(database_filename, query_string, all_keywords, substring,
+          max_distance, search_limit, config_filename, stream):
     """Queries the database for the keyword"""
 
+    search = substring or max_distance is not None
+
+    if substring and max_distance is not None:
+        raise click.UsageError("--substring and --fuzzy are exclusive")
+
+    if search and all_keywords:
+        raise click.UsageError("--substring and --fuzzy don't go with --all")
+
     kaomojitool = KaomojiTool(cli_database_filename=database_filename,
-                              cli_config_filename=config_filename)
+                              cli_config_filename=config_filename,
+                              load_database=not stream,
+                              use_server=not stream)
+
+    if kaomojitool.client:
+        if substring:
+            matches = kaomojitool.client.query_substring(query_string,
+                                                         limit=search_limit)
+        elif max_distance is not None:
+            matches = kaomojitool.client.query_fuzzy(
+                query_string, max_distance=max_distance, limit=search_limit)
+        elif all_keywords:
+            matches = kaomojitool.client.query_all(all_keywords)
+        else:
+            matches = kaomojitool.client.query(query_string)
+
+        print(filter_query(matches, query_string if all_keywords else ""))
+        return
+
+    # print the matches as database line entries as they are found
+    if kaomojitool.database is None:
+        all_keywords = frozenset(Kaomoji._to_keyword_list(all_keywords))
+        matches_query = keyword_matcher(query_string, substring, max_distance)
+
+        for kaomoji in KaomojiDB.iter_file(
+                filename=kaomojitool.database_filename):
+            if matches_query(kaomoji) and\
+                    all_keywords.issubset(kaomoji.keywords):
+                print(kaomoji.to_line_entry(), end="")
+        return
+
+    with kaomojitool.phase("query"):
+        if substring:
+            matches = kaomojitool.database.query_substring(query_string,
+                                                           limit=search_limit)
+        elif max_distance is not None:
+            matches = kaomojitool.database.query_fuzzy(
+                query_string, max_distance=max_distance, limit=search_limit)
+        elif all_keywords:
+            matches = filter_query(
+                kaomojitool.database.query_all(all_keywords), query_string)
+        else:
+            matches = kaomojitool.database.query(query_string)
 
-    matches = kaomojitool.database.query(query_string)
     print(matches)
 
+
+def filter_query(kaomojis: dict, query_string: str) -> dict:
+    """Keeps the kaomojis having some keyword starting with `query_string`."""
+
+    if not query_string:
+        return kaomojis
+
+    return {code: kaomoji for code, kaomoji in kaomojis.items()
+            if kaomoji.matches_query(query_string)}
+
+
+def keyword_matcher(query_string: str, substring: bool,
+                    max_distance: Union[int, None]) -> Callable:
+    """The test of whether a kaomoji has some keyword matching
+        `query_string`: starting with it, containing it with `substring`, or
+        within `max_distance` edits of it.
+    """
+
+    if substring:
+        return lambda kaomoji: any(query_string in keyword
+                                   for keyword in kaomoji.keywords)
+
+    if max_distance is not None:
+        return lambda kaomoji: any(
+            edit_distance(query_string, keyword, max_distance) <= max_distance
+            for keyword in kaomoji.keywords)
+
+    return lambda kaomoji: kaomoji.matches_query(query_string)
+
+###############################################################################
+# serve                                                                       #
+###############################################################################
+@cli.command()
+@database_filename_option
+@config_filename_option
+@flush_interval_option
+def serve(database_filename, config_filename, flush_interval):
+    """Serves the database from memory over a Unix socket.
+
+    While it runs, the add, kwadd, kwrm, query and dbstatus commands send
+    their requests to it instead of loading the database; edits are written
+    in batches, every --flush-interval seconds and when it stops. It holds the
+    lock of the database file, so the other editing commands refuse to run.
+    Stop it with Ctrl-C or SIGTERM.
+    """
+
+    from .server import KaomojiServer
+
+    # the server holds the lock while it runs, so the commands not talking
+    # to it can't write edits its next flush would overwrite
+    kaomojitool = KaomojiTool(cli_database_filename=database_filename,
+                              cli_config_filename=config_filename,
+                              lock_database=True)
+
+    if flush_interval is None:
+        flush_interval = kaomojitool.config['flush_interval']
+
+    server = KaomojiServer(database=kaomojitool.database,
+                           socket_filename=kaomojitool.socket_filename,
+                           flush_interval=flush_interval,
+                           before_edits=kaomojitool.backup_database)
+
+    print("Serving db", kaomojitool.database.filename, "on",
+          kaomojitool.socket_filename)
+    server.serve()
+
+
 ###############################################################################
 # scrape                                                                      #
 ###############################################################################
 @cli.command()
-@url_to_scrape_option
+@urls_to_scrape_option
+@url_file_option
 @kaomoji_xpath_string_option
 @keywords_xpath_string_option
 @container_xpath_string_option
+@workers_option
+@rate_limit_option
+@timeout_option
+@retries_option
+@cache_option
+@into_db_option
+@database_filename_option
 @config_filename_option
-def scrape(url_to_scrape, kaomoji_xpath_string, keywords_xpath_string,
-           container_xpath_string, config_filename):
-    """Scrape kaomoji on websites via XPath.
+def scrape(urls_to_scrape, url_file, kaomoji_xpath_string,
+           keywords_xpath_string, container_xpath_string, workers, rate_limit,
+           timeout, retries, use_cache, into_db, database_filename,
+           config_filename):
+    """Scrape kaomoji on websites, or local HTML files, via XPath.
 
-    NON-IMPLEMENTED: Also, can scrape keywords and add them to kaomoji.
+    With a container XPath, each container element gives a kaomoji, and its
+    keywords if there is a keywords XPath; both are relative to the
+    container:
 
-    Redirect the output to a file then add using 'kaomojitool add'.
+    $ kaomojitool scrape -u <URL> -C '//tr' -x './td[1]' -X './td[2]//a'
 
-    $ kaomojitool scrape -u <HTTPS://WEBSITE_ADDRESS> -x <XPATH> > MY_OUTPUT
+    The entries are printed as database lines; redirect the output to a file,
+    check it for broken/multiline items, then add it using 'kaomojitool add':
+
+    $ kaomojitool scrape -u <URL> -x <XPATH> > MY_OUTPUT
     $ cat MY_OUTPUT | kaomojitool add
 
-    First check output for broken/multiline items.
+    Or add them directly with --into-db; the keywords of existing ones are
+    merged then.
+
+    Runs of whitespace in the text scraped are collapsed to one space, like a
+    browser shows them, and keywords with commas are split.
+
+    The pages are fetched concurrently, and each one is printed as soon as it
+    is fetched, so the output is not in the order of the URLs. Pages that
+    couldn't be fetched are reported on STDERR.
+
+    Pages are cached; on later runs they are requested conditionally, and the
+    ones not changed since aren't parsed again.
     """
 
-    # https://devhints.io/xpath
+    from .httpcache import HTTPCache
+    from .scrape import Scraper
+    from .scrape import XPathExtractor
+    from .scrape import merge_entries
+    from .scrape import split_keywords
+
+    try:
+        extractor = XPathExtractor(kaomoji_xpath=kaomoji_xpath_string,
+                                   keywords_xpath=keywords_xpath_string,
+                                   container_xpath=container_xpath_string)
+    except ValueError as error:
+        raise click.UsageError(str(error))
+
+    kaomojitool = KaomojiTool(cli_database_filename=database_filename,
+                              cli_config_filename=config_filename,
+                              load_database=into_db, use_server=into_db,
+                              lock_database=into_db)
+    config = kaomojitool.config
+    database = kaomojitool.client or kaomojitool.database
+
+    urls = list(urls_to_scrape)
+
+    if url_file:
+        urls.extend(line.strip() for line in url_file if line.strip())
+
+    if use_cache is None:
+        use_cache = config['scrape_cache']
 
-    url = url_to_scrape
-    page = requests.get(url)
-    tree = html.fromstring(page.content)
-    nds = tree.xpath(kaomoji_xpath_string)
+    cache = HTTPCache(directory=config['scrape_cache_directory'],
+                      max_size=int(config['scrape_cache_size_mb'] * (1 << 20)))\
+        if use_cache else None
 
-    for kaomoji in nds:
-        print(kaomoji.text_content())
+    scraper = Scraper(
+        workers=workers or config['scrape_workers'],
+        timeout=timeout or config['scrape_timeout'],
+        retries=retries if retries is not None else config['scrape_retries'],
+        rate_limit=rate_limit or config['scrape_rate_limit'],
+        cache=cache)
+
+    report = dict(fetched=0, unchanged=0, failed=0)
+    db_report = dict(added=0, updated=0, unchanged=0, skipped=0)
+    batch = list()
+
+    def ingest_batch():
+        entries = merge_entries(batch)
+        batch.clear()
+
+        kaomojis = list()
+
+        for code, keywords in entries.items():
+            if "\t" in code or "\n" in code:  # would break the db file
+                db_report["skipped"] += 1
+            else:
+                kaomojis.append(Kaomoji(code=code,
+                                        keywords=split_keywords(keywords)))
+
+        for key, value in database.ingest(kaomojis).items():
+            db_report[key] += value
+
+    if into_db and not kaomojitool.client:
+        print("Backing up the database...")
+        kaomojitool.backup_database()
+
+    with scraper:
+        for url, page, error in scraper.iter_fetch(urls):
+            if error:
+                click.echo("Couldn't scrape {}: {}".format(url, error),
+                           err=True)
+                report["failed"] += 1
+                continue
+
+            report["unchanged" if page.unchanged else "fetched"] += 1
+            entries = scraper.extract(page, extractor)
+
+            if not into_db:
+                for code, keywords in entries:
+                    print(Kaomoji(code=code, keywords=split_keywords(keywords))
+                          .to_line_entry(), end="")
+
+                continue
+
+            batch.extend(entries)
+
+            if len(batch) >= SCRAPE_BATCH_SIZE:
+                ingest_batch()
+
+    if cache:
+        cache.close()
+
+    click.echo("fetched: {fetched}, unchanged: {unchanged}, failed: {failed}"
+               .format(**report), err=True)
+
+    if not into_db:
+        return
+
+    ingest_batch()
+
+    print("added: {added}, updated: {updated}, unchanged: {unchanged},"
+          " skipped: {skipped}".format(**db_report))
+
+    if kaomojitool.client:
+        print("Sent to the server on", kaomojitool.socket_filename)
+        return
+
+    print("Writing db", kaomojitool.database.filename)
+    with kaomojitool.phase("write"):
+        kaomojitool.database.write()
 
 
 
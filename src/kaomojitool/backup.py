@@ -0,0 +1,303 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from typing import Union
+
+from .journal import journal_filename
+from .snapshot import file_digest
+
+BACKUPS_SUFFIX = ".backups"
+BACKUPS_MANIFEST = "manifest.tsv"
+BACKUPS_OBJECTS = "objects"
+
+NO_JOURNAL = "-"  # journal digest of backups taken without a journal
+
+# the write-ahead log and its index, next to a SQLite db file in WAL mode
+SQLITE_SIDECAR_SUFFIXES = ("-wal", "-shm")
+
+
+class BackupNotFound(Exception):
+    description="Backup doesn't exist in the backup store"
+    def __init__(self, *args, **kwargs):
+        super().__init__(self.description, *args, **kwargs)
+
+
+class Backup:
+    """A backup record of the manifest."""
+
+    __slots__ = ("backup_id", "timestamp", "database_digest",
+                 "journal_digest", "size")
+
+    def __init__(self, backup_id: str, timestamp: float, database_digest: str,
+                 journal_digest: str = NO_JOURNAL, size: int = 0):
+
+        self.backup_id = backup_id
+        self.timestamp = timestamp
+        self.database_digest = database_digest
+        self.journal_digest = journal_digest
+        self.size = size
+
+    @classmethod
+    def from_line_entry(cls, line_entry: str) -> "Backup":
+        backup_id, timestamp, database_digest, journal_digest, size =\
+            line_entry.rstrip("\n").split("\t")
+
+        return cls(backup_id=backup_id, timestamp=float(timestamp),
+                   database_digest=database_digest,
+                   journal_digest=journal_digest, size=int(size))
+
+    def to_line_entry(self) -> str:
+        return "{}\t{}\t{}\t{}\t{}\n".format(
+            self.backup_id, self.timestamp, self.database_digest,
+            self.journal_digest, self.size)
+
+    def same_contents(self, other: "Backup") -> bool:
+        return (self.database_digest, self.journal_digest) ==\
+            (other.database_digest, other.journal_digest)
+
+    def __repr__(self):
+        return "<Backup `{}'; {} bytes>".format(self.backup_id, self.size)
+
+
+class BackupStore:
+    """Content-addressed store of the backups of a db file.
+
+    The store is the directory <filename>.backups, holding:
+        objects/<sha256>.gz: the gzipped raw bytes of each distinct content
+            of the db file or of its journal, stored once however many
+            backups have it.
+        manifest.tsv: one line per backup, oldest first, as written by
+            `Backup.to_line_entry`.
+
+    Backing up copies bytes without parsing the database, and is skipped
+        when neither the db file nor its journal changed since the last
+        backup. A SQLite db file is copied with the SQLite backup API
+        instead, as the commits still in its write-ahead log aren't in the
+        file yet.
+    """
+
+    def __init__(self, filename: str, directory: Union[str, None] = None,
+                 sqlite: bool = False):
+        """
+        Args:
+            filename (str): the db file being backed up.
+            directory (str): the store directory; defaults to
+                <filename>.backups.
+            sqlite (bool): the db file is a SQLite database.
+        """
+
+        self.filename = filename
+        self.sqlite = sqlite
+        self.directory = directory or filename + BACKUPS_SUFFIX
+        self.objects_directory = os.path.join(self.directory, BACKUPS_OBJECTS)
+        self.manifest_filename = os.path.join(self.directory, BACKUPS_MANIFEST)
+
+    def backups(self) -> list[Backup]:
+        """The backups in the store, oldest first."""
+
+        try:
+            with open(self.manifest_filename, "r", encoding="utf-8") as manifest:
+                return [Backup.from_line_entry(line) for line in manifest
+                        if line.strip()]
+        except FileNotFoundError:
+            return list()
+
+    def get_backup(self, backup_id: str) -> Backup:
+        for backup in self.backups():
+            if backup.backup_id == backup_id:
+                return backup
+
+        raise BackupNotFound(backup_id)
+
+    def backup(self) -> Union[Backup, None]:
+        """Backs up the db file and its journal.
+
+        Returns:
+            the new Backup, or None if the contents are the same as the last
+                backup's.
+        """
+
+        if not self.sqlite:
+            return self._backup_files(self.filename)
+
+        os.makedirs(self.directory, exist_ok=True)
+        copy_filename = os.path.join(self.directory, "{}.{}.tmp".format(
+            os.path.basename(self.filename), os.getpid()))
+
+        try:
+            copy_sqlite_database(self.filename, copy_filename)
+            return self._backup_files(copy_filename)
+        finally:
+            if os.path.exists(copy_filename):
+                os.remove(copy_filename)
+
+    def _backup_files(self, filename: str) -> Union[Backup, None]:
+        """Backs up `filename` as the contents of the db file, with the
+            journal of the db file.
+        """
+
+        timestamp = time.time()
+        journal = journal_filename(self.filename)
+
+        backup = Backup(backup_id="{:.7f}".format(timestamp),
+                        timestamp=timestamp,
+                        database_digest=file_digest(filename),
+                        size=os.path.getsize(filename))
+
+        if os.path.isfile(journal):
+            backup.journal_digest = file_digest(journal)
+            backup.size += os.path.getsize(journal)
+
+        backups = self.backups()
+
+        if backups and backups[-1].same_contents(backup):
+            return None
+
+        self._store_object(filename, backup.database_digest)
+
+        if backup.journal_digest != NO_JOURNAL:
+            self._store_object(journal, backup.journal_digest)
+
+        with open(self.manifest_filename, "a", encoding="utf-8") as manifest:
+            manifest.write(backup.to_line_entry())
+
+        return backup
+
+    def prune(self, keep_last: Union[int, None] = None,
+              max_age: Union[float, None] = None) -> list[Backup]:
+        """Removes the backups out of the retention policy, and the objects
+            no backup uses anymore. The newest backup is always kept, as it
+            is the one taken before a write.
+
+        Args:
+            keep_last (int): keep only the newest `keep_last` backups.
+            max_age (float): remove the backups older than `max_age` seconds.
+
+        Returns:
+            the removed backups.
+
+        Raises:
+            ValueError: if `keep_last` is less than 1.
+        """
+
+        if keep_last is not None and keep_last < 1:
+            raise ValueError("keep_last is less than 1")
+
+        backups = self.backups()
+        kept = backups
+
+        if keep_last is not None:
+            kept = kept[-keep_last:]
+
+        if max_age is not None:
+            oldest = time.time() - max_age
+            kept = [backup for backup in kept if backup.timestamp >= oldest]
+
+        if backups and backups[-1] not in kept:
+            kept.append(backups[-1])
+
+        kept_ids = {backup.backup_id for backup in kept}
+        removed = [backup for backup in backups
+                   if backup.backup_id not in kept_ids]
+
+        if removed:
+            self._write_manifest(kept)
+            self._collect_objects(kept)
+
+        return removed
+
+    def restore(self, backup_id: str,
+                destination: Union[str, None] = None) -> Backup:
+        """Restores a backup over the db file, or to `destination`, with its
+            journal; each file is replaced atomically.
+        """
+
+        backup = self.get_backup(backup_id)
+        destination = destination or self.filename
+        journal = journal_filename(destination)
+
+        self._extract_object(backup.database_digest, destination)
+
+        # a stale write-ahead log would be replayed over the restored file
+        if self.sqlite:
+            for suffix in SQLITE_SIDECAR_SUFFIXES:
+                if os.path.exists(destination + suffix):
+                    os.remove(destination + suffix)
+
+        if backup.journal_digest != NO_JOURNAL:
+            self._extract_object(backup.journal_digest, journal)
+        elif os.path.exists(journal):
+            os.remove(journal)
+
+        return backup
+
+    def _object_filename(self, digest: str) -> str:
+        return os.path.join(self.objects_directory, digest + ".gz")
+
+    def _store_object(self, filename: str, digest: str) -> None:
+        object_filename = self._object_filename(digest)
+
+        if os.path.exists(object_filename):
+            return
+
+        os.makedirs(self.objects_directory, exist_ok=True)
+        temp_filename = "{}.{}.tmp".format(object_filename, os.getpid())
+
+        with open(filename, "rb") as source, \
+                gzip.open(temp_filename, "wb") as destination:
+            shutil.copyfileobj(source, destination)
+
+        os.replace(temp_filename, object_filename)
+
+    def _extract_object(self, digest: str, filename: str) -> None:
+        temp_filename = "{}.{}.restore.tmp".format(filename, os.getpid())
+
+        with gzip.open(self._object_filename(digest), "rb") as source, \
+                open(temp_filename, "wb") as destination:
+            shutil.copyfileobj(source, destination)
+
+        os.replace(temp_filename, filename)
+
+    def _write_manifest(self, backups: list[Backup]) -> None:
+        temp_filename = "{}.{}.tmp".format(self.manifest_filename,
+                                           os.getpid())
+
+        with open(temp_filename, "w", encoding="utf-8") as manifest:
+            manifest.writelines(backup.to_line_entry() for backup in backups)
+
+        os.replace(temp_filename, self.manifest_filename)
+
+    def _collect_objects(self, backups: list[Backup]) -> None:
+        """Removes the objects not used by `backups`."""
+
+        used = set()
+
+        for backup in backups:
+            used.add(backup.database_digest)
+            used.add(backup.journal_digest)
+
+        for object_name in os.listdir(self.objects_directory):
+            digest = object_name.split(".")[0]
+
+            if digest not in used:
+                os.remove(os.path.join(self.objects_directory, object_name))
+
+
+def copy_sqlite_database(filename: str, destination: str) -> None:
+    """Copies a consistent snapshot of a SQLite database, with the commits
+        still in its write-ahead log, to a new file `destination`.
+    """
+
+    source = sqlite3.connect(filename)
+
+    try:
+        copy = sqlite3.connect(destination)
+
+        try:
+            source.backup(copy)
+        finally:
+            copy.close()
+    finally:
+        source.close()
@@ -0,0 +1,152 @@
+from hashlib import sha256
+from typing import Iterable, Iterator, TextIO, Union
+
+from .kaomoji import Kaomoji
+from .kaomoji import keyword_difference
+
+CHANGESET_VERSION = 1
+CHANGESET_HEADER = "# kaomojitool changeset {}\n".format(CHANGESET_VERSION)
+
+# changeset operations; each change is a line "<op>\t<hash>[\t<fields>]\n",
+# the hash being the sha256 hex digest of the kaomoji code
+CHANGE_ADD = "add"  # "\t<code>\t<keywords>": adds or replaces the kaomoji
+CHANGE_REMOVE = "rm"  # removes the kaomoji
+CHANGE_KEYWORDS_ADD = "kwadd"  # "\t<keywords>": adds them to the kaomoji
+CHANGE_KEYWORDS_REMOVE = "kwrm"  # "\t<keywords>": removes them from it
+
+CHANGE_OPERATIONS = (CHANGE_ADD, CHANGE_REMOVE, CHANGE_KEYWORDS_ADD,
+                     CHANGE_KEYWORDS_REMOVE)
+
+
+class KaomojiChangesetInvalid(Exception):
+    description="The changeset has an invalid line"
+    def __init__(self, *args, **kwargs):
+        super().__init__(self.description, *args, **kwargs)
+
+
+def code_hash(code: str) -> str:
+    """The hash of a kaomoji code, as Kaomoji.hash gives it."""
+
+    return sha256(code.encode("utf-8")).hexdigest()
+
+
+def format_change(operation: str, the_hash: str, *fields: str) -> str:
+    """Formats a changeset line."""
+
+    return "\t".join((operation, the_hash) + fields) + "\n"
+
+
+def entry_changes(kaomoji: Union[Kaomoji, None],
+                  other: Union[Kaomoji, None]) -> list[str]:
+    """The changeset lines turning the entry `kaomoji` into `other`, both of
+        the same code; None stands for an entry that isn't in the database.
+    """
+
+    if other is None:
+        return [] if kaomoji is None\
+            else [format_change(CHANGE_REMOVE, code_hash(kaomoji.code))]
+
+    if kaomoji is None:
+        return [format_change(CHANGE_ADD, code_hash(other.code), other.code,
+                              ", ".join(other.keywords))]
+
+    if kaomoji.keywords == other.keywords:
+        return []
+
+    changes = list()
+    the_hash = code_hash(kaomoji.code)
+    removed = keyword_difference(kaomoji.keywords, other.keywords)
+    added = keyword_difference(other.keywords, kaomoji.keywords)
+
+    if removed:
+        changes.append(format_change(CHANGE_KEYWORDS_REMOVE, the_hash,
+                                     ", ".join(removed)))
+    if added:
+        changes.append(format_change(CHANGE_KEYWORDS_ADD, the_hash,
+                                     ", ".join(added)))
+
+    return changes
+
+
+def iter_changes(kaomojis, other_kaomojis) -> Iterator[str]:
+    """Yields the changeset lines turning a database into the other one,
+        both given as code -> Kaomoji mappings; the other one's entries
+        first, then the removed ones.
+    """
+
+    for code, other in other_kaomojis.items():
+        yield from entry_changes(kaomojis.get(code), other)
+
+    for code, kaomoji in kaomojis.items():
+        if code not in other_kaomojis:
+            yield from entry_changes(kaomoji, None)
+
+
+def iter_changeset(changeset_file: TextIO)\
+                                    -> Iterator[tuple[str, str, tuple[str]]]:
+    """Yields (operation, hash, fields) for each line of a changeset, read
+        one line at a time; blank lines and "#" comments are skipped.
+
+    Raises:
+        KaomojiChangesetInvalid: with the line number, for a line with an
+            unknown operation, a malformed hash or the wrong fields, or an
+            added code not matching its hash.
+    """
+
+    field_numbers = {CHANGE_ADD: 2, CHANGE_REMOVE: 0,
+                     CHANGE_KEYWORDS_ADD: 1, CHANGE_KEYWORDS_REMOVE: 1}
+
+    for line_number, line in enumerate(changeset_file, start=1):
+        if not line.strip() or line.startswith("#"):
+            continue
+
+        operation, _, rest = line.rstrip("\n").partition("\t")
+        the_hash, *fields = rest.split("\t")
+
+        if operation not in CHANGE_OPERATIONS or len(the_hash) != 64 or\
+                len(fields) != field_numbers[operation] or\
+                (operation == CHANGE_ADD and code_hash(fields[0]) != the_hash):
+            raise KaomojiChangesetInvalid(line_number, line)
+
+        yield operation, the_hash, tuple(fields)
+
+
+def apply_changes(database,
+                  changes: Iterable[tuple[str, str, tuple[str]]])\
+                                                        -> dict[str, int]:
+    """Applies `iter_changeset` changes to a database, looking up the
+        entries by hash.
+
+    Returns:
+        a report dict with the number of entries "added" and "removed", of
+            keyword changes made, "updated", and of changes to entries the
+            database doesn't have, "missing", which are skipped.
+    """
+
+    report = dict(added=0, removed=0, updated=0, missing=0)
+
+    for operation, the_hash, fields in changes:
+        if operation == CHANGE_ADD:
+            code, keywords = fields
+            database.add_kaomoji(Kaomoji(code=code, keywords=keywords))
+            report["added"] += 1
+            continue
+
+        kaomoji = database.get_kaomoji_by_hash(the_hash)
+
+        if kaomoji is None:
+            report["missing"] += 1
+
+        elif operation == CHANGE_REMOVE:
+            database.remove_kaomoji(kaomoji)
+            report["removed"] += 1
+
+        else:
+            if operation == CHANGE_KEYWORDS_ADD:
+                kaomoji.add_keywords(fields[0])
+            else:
+                kaomoji.remove_keywords(fields[0])
+
+            report["updated"] += 1
+
+    return report
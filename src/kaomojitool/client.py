@@ -0,0 +1,178 @@
+import json
+import os
+import select
+import socket
+from typing import Iterable, Union
+
+from .index import DEFAULT_SEARCH_LIMIT
+from .kaomoji import Kaomoji
+
+# the protocol: each request is a line with the JSON object
+#     {"command": <command>, "args": {<argument>: <value>, ...}}
+# and gets a response line with the JSON object
+#     {"ok": true, "result": <result>} or {"ok": false, "error": <message>}
+# kaomojis are sent as [<code>, [<keyword>, ...]]
+
+
+class KaomojiServerError(Exception):
+    description="Kaomoji server couldn't process the request"
+    def __init__(self, *args, **kwargs):
+        super().__init__(self.description, *args, **kwargs)
+
+
+def encode_message(message: dict) -> bytes:
+    return json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def decode_message(line: bytes) -> dict:
+    return json.loads(line.decode("utf-8"))
+
+
+def kaomoji_to_message(kaomoji: Union[Kaomoji, None]) -> Union[list, None]:
+    if kaomoji is None:
+        return None
+
+    return [kaomoji.code, list(kaomoji.keywords)]
+
+
+def kaomoji_from_message(message: Union[list, None]) -> Union[Kaomoji, None]:
+    if message is None:
+        return None
+
+    code, keywords = message
+
+    return Kaomoji(code=code, keywords=keywords)
+
+
+class KaomojiClient:
+    """Client of a `kaomojitool serve` server; its methods mirror the ones
+        of KaomojiDB used by the commands.
+    """
+
+    def __init__(self, socket_filename: str, timeout: float = 30.0):
+        """
+        Args:
+            socket_filename (str): the Unix socket the server listens on.
+            timeout (float): seconds to wait for each response.
+
+        Raises:
+            OSError: if no server is listening on `socket_filename`.
+        """
+
+        self.socket_filename = socket_filename
+        self.timeout = timeout
+        self._connect()
+
+    def _connect(self) -> None:
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(self.timeout)
+
+        try:
+            self.socket.connect(self.socket_filename)
+        except OSError:
+            self.socket.close()
+            raise
+
+        self._file = self.socket.makefile("rwb")
+
+    @classmethod
+    def connect(cls, socket_filename: str) -> Union["KaomojiClient", None]:
+        """A client of the server on `socket_filename`, or None if there is
+            no server running; a socket file left by a dead server counts as
+            no server.
+        """
+
+        if not os.path.exists(socket_filename):
+            return None
+
+        try:
+            return cls(socket_filename=socket_filename)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return None
+
+    def close(self) -> None:
+        self._file.close()
+        self.socket.close()
+
+    def request(self, command: str, **args):
+        """Sends a request and waits for its response; reconnects first if
+            the server closed the connection while it was idle.
+
+        Returns:
+            the result of the request.
+
+        Raises:
+            KaomojiServerError: if the server answered with an error.
+        """
+
+        # the server only sends responses, so a readable socket between
+        # requests is one it closed
+        if select.select([self.socket], [], [], 0)[0]:
+            self.close()
+            self._connect()
+
+        self._file.write(encode_message({"command": command, "args": args}))
+        self._file.flush()
+
+        line = self._file.readline()
+
+        if not line:
+            raise KaomojiServerError("connection closed by the server")
+
+        response = decode_message(line)
+
+        if not response["ok"]:
+            raise KaomojiServerError(response["error"])
+
+        return response["result"]
+
+    def query(self, query_string: str) -> dict[str, Kaomoji]:
+        kaomojis = map(kaomoji_from_message,
+                       self.request("query", query_string=query_string))
+
+        return {kaomoji.code: kaomoji for kaomoji in kaomojis}
+
+    def query_all(self, keywords: Union[str, list]) -> dict[str, Kaomoji]:
+        kaomojis = map(kaomoji_from_message, self.request(
+            "query_all", keywords=Kaomoji._to_keyword_list(keywords)))
+
+        return {kaomoji.code: kaomoji for kaomoji in kaomojis}
+
+    def query_substring(self, substring: str,
+                        limit: int = DEFAULT_SEARCH_LIMIT)\
+                                                    -> dict[str, Kaomoji]:
+        kaomojis = map(kaomoji_from_message, self.request(
+            "query_substring", substring=substring, limit=limit))
+
+        return {kaomoji.code: kaomoji for kaomoji in kaomojis}
+
+    def query_fuzzy(self, keyword: str, max_distance: int = 1,
+                    limit: int = DEFAULT_SEARCH_LIMIT) -> dict[str, Kaomoji]:
+        kaomojis = map(kaomoji_from_message, self.request(
+            "query_fuzzy", keyword=keyword, max_distance=max_distance,
+            limit=limit))
+
+        return {kaomoji.code: kaomoji for kaomoji in kaomojis}
+
+    def lookup_kaomoji(self, entity: str) -> Union[Kaomoji, None]:
+        """Gets a kaomoji by code, hash or shortcode; see
+            kaomoji.lookup_kaomoji.
+        """
+
+        return kaomoji_from_message(self.request("get", by_entity=entity))
+
+    def ingest(self, kaomojis: Iterable[Kaomoji]) -> dict[str, int]:
+        return self.request("add", kaomojis=[kaomoji_to_message(kaomoji)
+                                             for kaomoji in kaomojis])
+
+    def add_keywords(self, code: str, keywords: Union[str, list]) -> Kaomoji:
+        return kaomoji_from_message(self.request(
+            "kwadd", code=code, keywords=Kaomoji._to_keyword_list(keywords)))
+
+    def remove_keywords(self, code: str, keywords: Union[str, list])\
+                                                                -> Kaomoji:
+        return kaomoji_from_message(self.request(
+            "kwrm", code=code, keywords=Kaomoji._to_keyword_list(keywords)))
+
+    def dbstatus(self, stats: bool = False) -> dict:
+        return self.request("dbstatus", stats=stats)
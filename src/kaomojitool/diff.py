@@ -0,0 +1,245 @@
+import os
+import tempfile
+import zlib
+from typing import Iterator, Union
+
+from .changeset import entry_changes
+from .changeset import iter_changes
+from .kaomoji import DEFAULT_PARTITIONS
+from .kaomoji import DIFF_TYPES
+from .kaomoji import Kaomoji
+from .kaomoji import KaomojiDB
+from .kaomoji import MergeConflict
+from .kaomoji import compare_entries
+from .kaomoji import merge_databases
+from .kaomoji import parse_line_entry
+
+
+class KaomojiDBNotSorted(Exception):
+    description="The database file is not sorted by kaomoji code"
+    def __init__(self, *args, **kwargs):
+        super().__init__(self.description, *args, **kwargs)
+
+
+def iter_sorted_entries(filename: str) -> Iterator[Kaomoji]:
+    """Yields the entries of a db file sorted by code; of consecutive lines
+        with the same code, the last one wins, like when loading.
+    """
+
+    previous = None
+
+    for kaomoji in KaomojiDB.iter_file(filename=filename):
+        if previous is not None:
+            if kaomoji.code < previous.code:
+                raise KaomojiDBNotSorted(filename)
+
+            if kaomoji.code != previous.code:
+                yield previous
+
+        previous = kaomoji
+
+    if previous is not None:
+        yield previous
+
+
+def iter_compare_sorted(filename: str, other_filename: str,
+                        diff_type: str = "additional") -> Iterator[Kaomoji]:
+    """Compares two db files sorted by code with a merge join, holding one
+        entry of each in memory.
+
+    Yields:
+        the Kaomoji results of `compare_entries`, in code order.
+    """
+
+    if diff_type not in DIFF_TYPES:
+        raise ValueError("diff_type is not one of {}".format(DIFF_TYPES))
+
+    for pair in iter_sorted_pairs(filename, other_filename):
+        diff_kaomoji = compare_entries(*pair, diff_type)
+
+        if diff_kaomoji:
+            yield diff_kaomoji
+
+
+def iter_sorted_pairs(filename: str, other_filename: str)\
+            -> Iterator[tuple[Union[Kaomoji, None], Union[Kaomoji, None]]]:
+    """Joins the entries of two db files sorted by code on their code.
+
+    Yields:
+        the (entry, other entry) of each code, None for the file without
+            it, in code order.
+    """
+
+    entries = iter_sorted_entries(filename)
+    other_entries = iter_sorted_entries(other_filename)
+
+    kaomoji = next(entries, None)
+    other = next(other_entries, None)
+
+    while kaomoji is not None or other is not None:
+        if other is None or (kaomoji is not None and kaomoji.code < other.code):
+            yield kaomoji, None
+            kaomoji = next(entries, None)
+
+        elif kaomoji is None or other.code < kaomoji.code:
+            yield None, other
+            other = next(other_entries, None)
+
+        else:
+            yield kaomoji, other
+            kaomoji = next(entries, None)
+            other = next(other_entries, None)
+
+
+def partition_of(code: str, partitions: int) -> int:
+    """The partition of a code; stable across processes, unlike hash()."""
+
+    return zlib.crc32(code.encode("utf-8")) % partitions
+
+
+def partition_file(filename: str, directory: str, partitions: int) -> list[str]:
+    """Splits a db file into `partitions` files by the hash of the code,
+        keeping the line order inside each of them.
+    """
+
+    partition_filenames = [
+        os.path.join(directory, "{}.{}".format(os.path.basename(filename),
+                                               number))
+        for number in range(partitions)]
+
+    partition_files = [open(partition_filename, "w", encoding="utf-8")
+                       for partition_filename in partition_filenames]
+
+    try:
+        with open(filename, "r", encoding="utf-8") as db_file:
+            for line in db_file:
+                code = line.strip().split("\t", maxsplit=1)[0]
+
+                if code:
+                    partition_files[partition_of(code, partitions)].write(line)
+    finally:
+        for partition_file in partition_files:
+            partition_file.close()
+
+    return partition_filenames
+
+
+def iter_compare_partitioned(filename: str, other_filename: str,
+                             diff_type: str = "additional",
+                             partitions: int = DEFAULT_PARTITIONS,
+                             temp_directory: Union[str, None] = None)\
+                                                        -> Iterator[Kaomoji]:
+    """Compares two db files in any order by hash partitioning them, so only
+        one partition of each, about 1/`partitions` of it, is in memory.
+
+    Yields:
+        the Kaomoji results of `KaomojiDB.compare`, partition by partition.
+    """
+
+    if diff_type not in DIFF_TYPES:
+        raise ValueError("diff_type is not one of {}".format(DIFF_TYPES))
+
+    with tempfile.TemporaryDirectory(dir=temp_directory) as directory:
+        self_directory = os.path.join(directory, "self")
+        other_directory = os.path.join(directory, "other")
+        os.mkdir(self_directory)
+        os.mkdir(other_directory)
+
+        partition_filenames = partition_file(filename, self_directory,
+                                             partitions)
+        other_partition_filenames = partition_file(other_filename,
+                                                   other_directory,
+                                                   partitions)
+
+        for partition_filename, other_partition_filename in\
+                zip(partition_filenames, other_partition_filenames):
+
+            database = KaomojiDB(filename=partition_filename)
+            other_database = KaomojiDB(filename=other_partition_filename)
+
+            yield from database.compare(other=other_database,
+                                        diff_type=diff_type).values()
+
+
+def read_partition(filename: str) -> dict[str, Kaomoji]:
+    """Reads a partition file as a code -> Kaomoji dict, the last line of a
+        code winning like when loading, without building a keyword index.
+    """
+
+    kaomojis = dict()
+
+    with open(filename, "r", encoding="utf-8") as partition_file:
+        for line in partition_file:
+            if line.strip():
+                code, keywords = parse_line_entry(line)
+                kaomojis[code] = Kaomoji._from_parsed(code, keywords)
+
+    return kaomojis
+
+
+def iter_partitions(filenames: tuple[str, ...], partitions: int,
+                    temp_directory: Union[str, None] = None)\
+                                    -> Iterator[tuple[dict[str, Kaomoji], ...]]:
+    """Hash partitions db files alike, and yields the `read_partition` dicts
+        of each partition of all of them, one partition at a time.
+    """
+
+    with tempfile.TemporaryDirectory(dir=temp_directory) as directory:
+        partitioned = list()
+
+        for number, filename in enumerate(filenames):
+            partition_directory = os.path.join(directory, str(number))
+            os.mkdir(partition_directory)
+            partitioned.append(partition_file(filename, partition_directory,
+                                              partitions))
+
+        for partition_filenames in zip(*partitioned):
+            yield tuple(read_partition(partition_filename)
+                        for partition_filename in partition_filenames)
+
+
+def iter_merge_partitioned(base_filename: str, filename: str,
+                           other_filename: str,
+                           partitions: int = DEFAULT_PARTITIONS,
+                           temp_directory: Union[str, None] = None)\
+            -> Iterator[tuple[Union[Kaomoji, None], Union[MergeConflict, None]]]:
+    """Three-way merges db files in any order by hash partitioning them, so
+        only one partition of each is in memory; see `merge_databases`.
+
+    Yields:
+        the merged Kaomoji of each entry, or None if it is deleted, and its
+            MergeConflict or None; partition by partition.
+    """
+
+    for base, kaomojis, other in iter_partitions(
+            (base_filename, filename, other_filename), partitions=partitions,
+            temp_directory=temp_directory):
+
+        for code, keywords, conflict in merge_databases(
+                base_kaomojis=base, kaomojis=kaomojis, other_kaomojis=other):
+
+            yield (None if keywords is None
+                   else Kaomoji._from_parsed(code, keywords)), conflict
+
+
+def iter_changes_sorted(filename: str, other_filename: str) -> Iterator[str]:
+    """Yields the changeset lines turning a db file into the other one, both
+        sorted by code, with a merge join; see `iter_compare_sorted`.
+    """
+
+    for kaomoji, other in iter_sorted_pairs(filename, other_filename):
+        yield from entry_changes(kaomoji, other)
+
+
+def iter_changes_partitioned(filename: str, other_filename: str,
+                             partitions: int = DEFAULT_PARTITIONS,
+                             temp_directory: Union[str, None] = None)\
+                                                            -> Iterator[str]:
+    """Yields the changeset lines turning a db file into the other one, in
+        any order, by hash partitioning them; see `iter_changes`.
+    """
+
+    for kaomojis, other in iter_partitions((filename, other_filename),
+                                           partitions=partitions,
+                                           temp_directory=temp_directory):
+        yield from iter_changes(kaomojis, other)
@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from hashlib import sha256
+from typing import Union
+
+HTTP_CACHE_FILENAME = "http.sqlite"
+DEFAULT_CACHE_SIZE = 256 << 20  # bytes of compressed pages
+
+HTTP_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS response (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    digest TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS response_last_used ON response (last_used);
+CREATE INDEX IF NOT EXISTS response_digest ON response (digest);
+CREATE TABLE IF NOT EXISTS extraction (
+    digest TEXT NOT NULL,
+    xpath TEXT NOT NULL,
+    texts TEXT NOT NULL,
+    PRIMARY KEY (digest, xpath)
+) WITHOUT ROWID;
+"""
+
+
+def default_cache_directory() -> str:
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "kaomojitool")
+
+
+def content_digest(content: bytes) -> str:
+    return sha256(content).hexdigest()
+
+
+class CachedResponse:
+    """The validators of a cached page, sent back in conditional requests."""
+
+    __slots__ = ("url", "etag", "last_modified", "digest")
+
+    def __init__(self, url: str, etag: Union[str, None],
+                 last_modified: Union[str, None], digest: str):
+
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = dict()
+
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        return headers
+
+    def __repr__(self):
+        return "<CachedResponse `{}'; {}>".format(self.url, self.digest[:12])
+
+
+class HTTPCache:
+    """On-disk cache of the pages scraped and of the texts extracted from
+        them, in an SQLite database.
+
+    Pages are keyed by URL, and stored compressed with their ETag and
+        Last-Modified validators. Extracted texts are keyed by the digest of
+        the page content and the XPath, so a page answered with 304 Not
+        Modified, or with the same content as before, isn't parsed again.
+        When the pages exceed `max_size` bytes, the least recently used ones
+        are evicted.
+
+    The methods can be called from many threads; they share one connection
+        behind a lock.
+    """
+
+    def __init__(self, directory: Union[str, None] = None,
+                 max_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            directory (str): the cache directory; defaults to
+                $XDG_CACHE_HOME/kaomojitool.
+            max_size (int): bytes of compressed pages to keep.
+        """
+
+        self.directory = directory or default_cache_directory()
+        self.filename = os.path.join(self.directory, HTTP_CACHE_FILENAME)
+        self.max_size = max_size
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(self.filename,
+                                          check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        # a cache can lose its last writes on a crash; don't sync each one
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(HTTP_CACHE_SCHEMA)
+        self._lock = threading.Lock()
+
+        self.size = self.connection.execute(
+            "SELECT coalesce(sum(size), 0) FROM response").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get_response(self, url: str) -> Union[CachedResponse, None]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT etag, last_modified, digest FROM response"
+                " WHERE url = ?", (url,)).fetchone()
+
+        if row is None:
+            return None
+
+        return CachedResponse(url, *row)
+
+    def get_body(self, url: str) -> Union[bytes, None]:
+        """The cached content of `url`; marks it as recently used."""
+
+        with self._lock, self.connection:
+            row = self.connection.execute(
+                "SELECT body FROM response WHERE url = ?", (url,)).fetchone()
+            self._touch(url)
+
+        return zlib.decompress(row[0]) if row else None
+
+    def put_response(self, url: str, content: bytes,
+                     etag: Union[str, None] = None,
+                     last_modified: Union[str, None] = None) -> CachedResponse:
+        """Caches a page fetched, evicting the least recently used ones if
+            the cache gets too big.
+        """
+
+        response = CachedResponse(url=url, etag=etag,
+                                  last_modified=last_modified,
+                                  digest=content_digest(content))
+        body = zlib.compress(content)
+
+        with self._lock, self.connection:
+            row = self.connection.execute(
+                "SELECT size FROM response WHERE url = ?", (url,)).fetchone()
+
+            self.connection.execute(
+                "INSERT OR REPLACE INTO response (url, etag, last_modified,"
+                " digest, body, size, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, response.digest, body, len(body),
+                 time.time()))
+
+            self.size += len(body) - (row[0] if row else 0)
+
+            if self.size > self.max_size:
+                self._evict()
+
+        return response
+
+    def touch(self, url: str) -> None:
+        """Marks the page of `url` as recently used."""
+
+        with self._lock, self.connection:
+            self._touch(url)
+
+    def get_extraction(self, digest: str, key: str) -> Union[list, None]:
+        """What was extracted from the content with `digest` by the
+            extractor identified by `key`, like its XPaths.
+        """
+
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT texts FROM extraction WHERE digest = ? AND xpath = ?",
+                (digest, key)).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def put_extraction(self, digest: str, key: str, extraction: list) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO extraction (digest, xpath, texts)"
+                " VALUES (?, ?, ?)",
+                (digest, key, json.dumps(extraction, ensure_ascii=False)))
+
+    def _touch(self, url: str) -> None:
+        self.connection.execute(
+            "UPDATE response SET last_used = ? WHERE url = ?",
+            (time.time(), url))
+
+    def _evict(self) -> None:
+        """Deletes the least recently used pages until the cache fits in
+            `max_size`, and the extractions of their contents if no other
+            page has them; the extractions of local files, which have no
+            page, are kept. To be called holding the lock, inside a
+            transaction.
+        """
+
+        evicted = list()
+        evicted_digests = set()
+
+        for url, digest, size in self.connection.execute(
+                "SELECT url, digest, size FROM response ORDER BY last_used"):
+            if self.size <= self.max_size:
+                break
+
+            evicted.append((url,))
+            evicted_digests.add((digest,))
+            self.size -= size
+
+        self.connection.executemany("DELETE FROM response WHERE url = ?",
+                                    evicted)
+        self.connection.executemany(
+            "DELETE FROM extraction WHERE digest = ? AND NOT EXISTS"
+            " (SELECT 1 FROM response"
+            " WHERE response.digest = extraction.digest)",
+            evicted_digests)
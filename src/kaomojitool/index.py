@@ -0,0 +1,489 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from bisect import insort
+from collections import Counter
+from typing import Iterable, Iterator, Union
+
+# unsigned 32 bit entry ids in the postings
+POSTING_TYPECODE = "I"
+
+# keywords are padded so their start and end make trigrams too; two spaces
+# before, so the first character is in as many trigrams as the others
+TRIGRAM_PREFIX = "  "
+TRIGRAM_SUFFIX = " "
+TRIGRAM_EDITS = 3  # an edit changes at most this many trigrams of a keyword
+
+DEFAULT_SEARCH_LIMIT = 10  # keywords a substring or fuzzy query ranks
+
+
+class KeywordDictionary:
+    """Gives each keyword a small int id, and back.
+
+    Ids are given in order of first use and never reused, so the postings
+        can be kept as compact arrays of ints keyed by them.
+    """
+
+    def __init__(self, keywords: Union[list[str], None] = None) -> None:
+        """
+        Attributes:
+            keywords (list): the keyword of each id.
+            ids (dict): the id of each keyword.
+        """
+
+        self.keywords: list[str] = list(keywords or ())
+        self.ids: dict[str, int] = {keyword: keyword_id for keyword_id, keyword
+                                    in enumerate(self.keywords)}
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def encode(self, keyword: str) -> int:
+        """The id of `keyword`, giving it a new one if it has none."""
+
+        keyword_id = self.ids.get(keyword)
+
+        if keyword_id is None:
+            keyword_id = self.ids[keyword] = len(self.keywords)
+            self.keywords.append(keyword)
+
+        return keyword_id
+
+    def lookup(self, keyword: str) -> Union[int, None]:
+        """The id of `keyword`, or None if it has none."""
+
+        return self.ids.get(keyword)
+
+    def decode(self, keyword_id: int) -> str:
+        return self.keywords[keyword_id]
+
+
+class KeywordIndex:
+    """Inverted index from keywords to the entry ids of the kaomojis having
+    them.
+
+    Keywords are dictionary-encoded: the postings are keyed by keyword id,
+    and each one is an array of entry ids in ascending order, 4 bytes per
+    kaomoji instead of a dict slot; AND queries intersect those arrays.
+    The database gives the entry ids and maps them back to kaomojis.
+
+    The keywords are also kept in a sorted array, so a prefix query is one
+    bisect plus a walk over the matching keywords only; its cost is
+    proportional to the number of matches, not to the size of the database.
+    Substring and fuzzy queries go through a TrigramIndex of the keywords.
+    Both are built on first use and then kept up to date by `add` and
+    `remove`.
+    """
+
+    def __init__(self) -> None:
+        """
+        Attributes:
+            dictionary (KeywordDictionary): the keyword ids.
+            postings (dict): a dictionary which the key is the keyword id,
+                and the value is an array of the ascending entry ids of the
+                kaomojis which have that keyword, eg.:
+                    postings = dict({4: array('I', [12, 40, 41])})
+                keywords no kaomoji has anymore have no posting.
+        """
+
+        self.dictionary = KeywordDictionary()
+        self.postings: dict[int, array] = dict()
+        self._sorted_keywords: Union[list[str], None] = None  # built lazily
+        self._trigrams: Union[TrigramIndex, None] = None  # built lazily
+
+    def add(self, entry_id: int, keywords: Iterable[str]) -> None:
+        """Indexes the entry `entry_id` under each of `keywords`."""
+
+        for keyword in keywords:
+            keyword_id = self.dictionary.encode(keyword)
+            posting = self.postings.get(keyword_id)
+
+            if posting is None:
+                self.postings[keyword_id] = array(POSTING_TYPECODE,
+                                                  (entry_id,))
+
+                if self._sorted_keywords is not None:
+                    insort(self._sorted_keywords, keyword)
+
+                if self._trigrams is not None:
+                    self._trigrams.add(keyword_id, keyword)
+
+            # entries are mostly added with new, greater ids
+            elif posting[-1] < entry_id:
+                posting.append(entry_id)
+
+            else:
+                position = bisect_left(posting, entry_id)
+
+                if posting[position] != entry_id:
+                    posting.insert(position, entry_id)
+
+    def remove(self, entry_id: int, keywords: Iterable[str]) -> None:
+        """Removes the entry `entry_id` from the postings of each of
+        `keywords`.
+        """
+
+        for keyword in keywords:
+            keyword_id = self.dictionary.lookup(keyword)
+            posting = self.postings.get(keyword_id)
+
+            if posting is None:
+                continue
+
+            position = bisect_left(posting, entry_id)
+
+            if position < len(posting) and posting[position] == entry_id:
+                del posting[position]
+
+            if not posting:
+                del self.postings[keyword_id]
+
+                if self._sorted_keywords is not None:
+                    position = bisect_left(self._sorted_keywords, keyword)
+                    del self._sorted_keywords[position]
+
+                if self._trigrams is not None:
+                    self._trigrams.remove(keyword_id, keyword)
+
+    def clear(self) -> None:
+        self.dictionary = KeywordDictionary()
+        self.postings.clear()
+        self._sorted_keywords = None
+        self._trigrams = None
+
+    def load(self, dictionary: KeywordDictionary, postings: dict[int, array],
+             sorted_keywords: Union[list[str], None] = None) -> None:
+        """Replaces the index contents with prebuilt ones, eg. a snapshot."""
+
+        self.dictionary = dictionary
+        self.postings = postings
+        self._sorted_keywords = sorted_keywords
+        self._trigrams = None
+
+    def renumber(self, entry_ids: array) -> None:
+        """Maps every entry id `old` in the postings to `entry_ids[old]`;
+        the mapping must keep the order of the ids.
+        """
+
+        for keyword_id, posting in self.postings.items():
+            self.postings[keyword_id] = array(
+                POSTING_TYPECODE, [entry_ids[entry_id] for entry_id in posting])
+
+    def sorted_keywords(self) -> list[str]:
+        """The indexed keywords, sorted; built on first use."""
+
+        if self._sorted_keywords is None:
+            decode = self.dictionary.decode
+            self._sorted_keywords = sorted(decode(keyword_id)
+                                           for keyword_id in self.postings)
+
+        return self._sorted_keywords
+
+    def trigram_index(self) -> "TrigramIndex":
+        """The trigram index of the indexed keywords; built on first use."""
+
+        if self._trigrams is None:
+            self._trigrams = TrigramIndex()
+            decode = self.dictionary.decode
+
+            for keyword_id in sorted(self.postings):
+                self._trigrams.add(keyword_id, decode(keyword_id))
+
+        return self._trigrams
+
+    def posting(self, keyword: str) -> array:
+        """The entry ids of the kaomojis having `keyword`."""
+
+        return self.postings.get(self.dictionary.lookup(keyword),
+                                 array(POSTING_TYPECODE))
+
+    def keyword_count(self, keyword: str) -> int:
+        """The number of kaomojis having `keyword`."""
+
+        return len(self.posting(keyword))
+
+    def keywords_with_prefix(self, prefix: str) -> Iterator[str]:
+        """Yields, in sorted order, the indexed keywords starting with
+        `prefix`.
+        """
+
+        sorted_keywords = self.sorted_keywords()
+        position = bisect_left(sorted_keywords, prefix)
+
+        while position < len(sorted_keywords):
+            keyword = sorted_keywords[position]
+
+            if not keyword.startswith(prefix):
+                break
+
+            yield keyword
+            position += 1
+
+    def query(self, prefix: str) -> dict[int, None]:
+        """Returns the entry ids having some keyword starting with `prefix`,
+        as an ordered set.
+        """
+
+        entry_ids = dict()
+
+        for keyword in self.keywords_with_prefix(prefix):
+            entry_ids.update(dict.fromkeys(self.posting(keyword)))
+
+        return entry_ids
+
+    def query_all(self, keywords: Iterable[str]) -> list[int]:
+        """Returns the ascending entry ids having every one of `keywords`.
+
+        The postings are intersected starting from the shortest one, whose
+        ids are looked up in the longer ones by bisection, so the cost is
+        bounded by the rarest keyword.
+        """
+
+        postings = sorted((self.posting(keyword) for keyword in keywords),
+                          key=len)
+
+        if not postings:
+            return list()
+
+        entry_ids = list(postings[0])
+
+        for posting in postings[1:]:
+            if not entry_ids:
+                break
+
+            entry_ids = [entry_id for entry_id in entry_ids
+                         if contains(posting, entry_id)]
+
+        return entry_ids
+
+    def keywords_containing(self, substring: str,
+                            limit: int = DEFAULT_SEARCH_LIMIT) -> list[str]:
+        """The best `limit` indexed keywords containing `substring`; see
+        `rank_substring_matches`.
+        """
+
+        decode = self.dictionary.decode
+
+        return rank_substring_matches(substring, (
+            (decode(keyword_id), len(self.postings[keyword_id]))
+            for keyword_id
+            in self.trigram_index().candidates_containing(substring)),
+            limit=limit)
+
+    def keywords_near(self, keyword: str, max_distance: int = 1,
+                      limit: int = DEFAULT_SEARCH_LIMIT) -> list[str]:
+        """The best `limit` indexed keywords at most `max_distance` edits
+        away from `keyword`; see `rank_fuzzy_matches`.
+        """
+
+        decode = self.dictionary.decode
+        candidates = self.trigram_index().candidates_near(keyword,
+                                                          max_distance)
+
+        if candidates is None:  # too short to filter by trigrams
+            candidates = self.postings
+
+        return rank_fuzzy_matches(keyword, (
+            (decode(keyword_id), len(self.postings[keyword_id]))
+            for keyword_id in candidates),
+            max_distance=max_distance, limit=limit)
+
+    def query_keywords(self, keywords: Iterable[str]) -> dict[int, None]:
+        """Returns the entry ids having some of `keywords`, as an ordered
+        set: the ones of the first keyword first.
+        """
+
+        entry_ids = dict()
+
+        for keyword in keywords:
+            entry_ids.update(dict.fromkeys(self.posting(keyword)))
+
+        return entry_ids
+
+
+class TrigramIndex:
+    """Inverted index from the trigrams of keywords to their keyword ids,
+    for substring and approximate matching without comparing the query to
+    every keyword.
+
+    A keyword containing a substring has all of its trigrams, so the
+    candidates are the intersection of their postings. A keyword within
+    `d` edits of a query shares at least all but TRIGRAM_EDITS * `d` of its
+    trigrams, so the candidates are the keywords counted in enough of their
+    postings. Either way the candidates are then checked.
+    """
+
+    def __init__(self) -> None:
+        """
+        Attributes:
+            postings (dict): a dictionary which the key is a trigram, and
+                the value is an array of the ascending ids of the keywords
+                having it.
+        """
+
+        self.postings: dict[str, array] = dict()
+
+    def add(self, keyword_id: int, keyword: str) -> None:
+        for trigram in keyword_trigrams(keyword):
+            posting = self.postings.get(trigram)
+
+            if posting is None:
+                self.postings[trigram] = array(POSTING_TYPECODE,
+                                               (keyword_id,))
+
+            # ids are mostly given in ascending order
+            elif posting[-1] < keyword_id:
+                posting.append(keyword_id)
+
+            elif not contains(posting, keyword_id):
+                posting.insert(bisect_left(posting, keyword_id), keyword_id)
+
+    def remove(self, keyword_id: int, keyword: str) -> None:
+        for trigram in keyword_trigrams(keyword):
+            posting = self.postings.get(trigram)
+
+            if posting is None:
+                continue
+
+            position = bisect_left(posting, keyword_id)
+
+            if position < len(posting) and posting[position] == keyword_id:
+                del posting[position]
+
+            if not posting:
+                del self.postings[trigram]
+
+    def candidates_containing(self, substring: str) -> Iterable[int]:
+        """The ids of the keywords which may contain `substring`."""
+
+        trigrams = substring_trigrams(substring)
+
+        # shorter than a trigram: the keywords of the trigrams containing it
+        if not trigrams:
+            candidates = set()
+
+            for trigram, posting in self.postings.items():
+                if substring in trigram:
+                    candidates.update(posting)
+
+            return candidates
+
+        postings = sorted((self.postings.get(trigram, array(POSTING_TYPECODE))
+                           for trigram in trigrams), key=len)
+        candidates = postings[0]
+
+        for posting in postings[1:]:
+            if not candidates:
+                break
+
+            candidates = [keyword_id for keyword_id in candidates
+                          if contains(posting, keyword_id)]
+
+        return candidates
+
+    def candidates_near(self, keyword: str,
+                        max_distance: int) -> Union[Iterable[int], None]:
+        """The ids of the keywords which may be at most `max_distance`
+        edits away from `keyword`; None if it is too short for any trigram
+        to be left, and every keyword is a candidate.
+        """
+
+        trigrams = keyword_trigrams(keyword)
+        min_shared = len(trigrams) - TRIGRAM_EDITS * max_distance
+
+        if min_shared <= 0:
+            return None
+
+        counts = Counter()
+
+        for trigram in trigrams:
+            counts.update(self.postings.get(trigram, ()))
+
+        return [keyword_id for keyword_id, count in counts.items()
+                if count >= min_shared]
+
+
+def keyword_trigrams(keyword: str) -> set[str]:
+    """The trigrams of a padded keyword, eg. "hap" for "  hap " gives
+    {"  h", " ha", "hap", "ap "}.
+    """
+
+    padded = TRIGRAM_PREFIX + keyword + TRIGRAM_SUFFIX
+
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+def substring_trigrams(substring: str) -> set[str]:
+    """The trigrams of a substring, unpadded as it may be anywhere in a
+    keyword; none if it is shorter than 3 characters.
+    """
+
+    return {substring[start:start + 3]
+            for start in range(len(substring) - 2)}
+
+
+def edit_distance(text: str, other: str, max_distance: int) -> int:
+    """The Levenshtein distance of two strings, or `max_distance` + 1 if
+    it is greater; rows stop being computed once every cell is over it.
+    """
+
+    if abs(len(text) - len(other)) > max_distance:
+        return max_distance + 1
+
+    if len(text) > len(other):
+        text, other = other, text
+
+    previous = list(range(len(text) + 1))
+
+    for row, character in enumerate(other, start=1):
+        current = [row]
+
+        for column, text_character in enumerate(text, start=1):
+            current.append(min(previous[column] + 1, current[-1] + 1,
+                               previous[column - 1]
+                               + (text_character != character)))
+
+        if min(current) > max_distance:
+            return max_distance + 1
+
+        previous = current
+
+    return min(previous[-1], max_distance + 1)
+
+
+def rank_substring_matches(substring: str,
+                           candidates: Iterable[tuple[str, int]],
+                           limit: int = DEFAULT_SEARCH_LIMIT) -> list[str]:
+    """The best `limit` of the (keyword, number of kaomojis) candidates
+    containing `substring`: the ones starting with it first, then the
+    shortest, then the most used; kept in a heap instead of sorting them
+    all.
+    """
+
+    return [keyword for _, keyword in heapq.nsmallest(limit, (
+        ((position, len(keyword), -count, keyword), keyword)
+        for keyword, count in candidates
+        for position in (keyword.find(substring),) if position >= 0))]
+
+
+def rank_fuzzy_matches(keyword: str, candidates: Iterable[tuple[str, int]],
+                       max_distance: int = 1,
+                       limit: int = DEFAULT_SEARCH_LIMIT) -> list[str]:
+    """The best `limit` of the (keyword, number of kaomojis) candidates at
+    most `max_distance` edits away from `keyword`: the closest first, then
+    the most used; kept in a heap instead of sorting them all.
+    """
+
+    return [candidate for _, candidate in heapq.nsmallest(limit, (
+        ((distance, -count, candidate), candidate)
+        for candidate, count in candidates
+        for distance in (edit_distance(keyword, candidate, max_distance),)
+        if distance <= max_distance))]
+
+
+def contains(posting: array, entry_id: int) -> bool:
+    """Whether the ascending `posting` has `entry_id`, by bisection."""
+
+    position = bisect_left(posting, entry_id)
+
+    return position < len(posting) and posting[position] == entry_id
@@ -0,0 +1,98 @@
+import os
+from typing import Iterable, Iterator
+
+JOURNAL_SUFFIX = ".journal"
+
+# journal operations; each record is a line "<op>\t<code>\t<keywords>\n"
+JOURNAL_PUT = "put"  # adds or replaces the kaomoji, with the given keywords
+JOURNAL_DELETE = "del"  # removes the kaomoji
+JOURNAL_KEYWORDS_ADD = "kwadd"  # adds the keywords to the kaomoji
+JOURNAL_KEYWORDS_REMOVE = "kwrm"  # removes the keywords from the kaomoji
+
+JOURNAL_OPERATIONS = (JOURNAL_PUT, JOURNAL_DELETE, JOURNAL_KEYWORDS_ADD,
+                      JOURNAL_KEYWORDS_REMOVE)
+
+
+def journal_filename(filename: str) -> str:
+    """The append-only file holding the not yet compacted edits of a db."""
+
+    return filename + JOURNAL_SUFFIX
+
+
+def format_record(operation: str, code: str, keywords: Iterable[str] = ())\
+                                                                    -> str:
+    """Formats a journal record line."""
+
+    return "{operation}\t{code}\t{keywords}\n".format(
+        operation=operation, code=code, keywords=", ".join(keywords))
+
+
+def append_journal(filename: str, records: list[str]) -> None:
+    """Appends formatted records to the journal of the db file `filename`,
+        making sure they reached the disk.
+    """
+
+    with open(journal_filename(filename), "a", encoding="utf-8") as journal:
+        journal.writelines(records)
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def iter_journal(filename: str) -> Iterator[tuple[str, str, str]]:
+    """Yields (operation, code, keywords) for each record of the journal of
+        the db file `filename`; see `iter_records`.
+    """
+
+    return iter_records(journal_filename(filename))
+
+
+def iter_records(records_filename: str) -> Iterator[tuple[str, str, str]]:
+    """Yields (operation, code, keywords) for each record of a file of
+        journal records, if it exists.
+
+    A last line without a newline is the trace of an interrupted append, and
+        is ignored like lines with unknown operations.
+    """
+
+    try:
+        records_file = open(records_filename, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+
+    with records_file:
+        for line in records_file:
+            if not line.endswith("\n"):
+                break
+
+            operation, _, rest = line.rstrip("\n").partition("\t")
+            code, _, keywords = rest.partition("\t")
+
+            if operation in JOURNAL_OPERATIONS and code:
+                yield operation, code, keywords
+
+
+def database_state(filename: str) -> list:
+    """What the contents of a db file depend on: the size and mtime of the
+        file and of its journal, None for a missing one.
+    """
+
+    state = list()
+
+    for name in (filename, journal_filename(filename)):
+        try:
+            stat = os.stat(name)
+        except FileNotFoundError:
+            state.append(None)
+        else:
+            state.append([stat.st_size, stat.st_mtime_ns])
+
+    return state
+
+
+def remove_journal(filename: str) -> None:
+    """Removes the journal of the db file `filename`, if any."""
+
+    try:
+        os.remove(journal_filename(filename))
+    except FileNotFoundError:
+        pass
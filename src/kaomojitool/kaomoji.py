@@ -1,6 +1,33 @@
 import base64
+import binascii
+import gc
+import os
+import shutil
+from array import array
+from collections.abc import Mapping
+from contextlib import contextmanager
+from contextlib import nullcontext
+from hashlib import blake2b
 from hashlib import sha256
-from typing import Union
+from sys import intern
+from typing import Iterable, Iterator, Union
+
+from .index import DEFAULT_SEARCH_LIMIT
+from .index import KeywordDictionary
+from .index import KeywordIndex
+from .index import POSTING_TYPECODE
+from .journal import JOURNAL_DELETE
+from .journal import JOURNAL_KEYWORDS_ADD
+from .journal import JOURNAL_KEYWORDS_REMOVE
+from .journal import JOURNAL_PUT
+from .journal import append_journal
+from .journal import database_state
+from .journal import format_record
+from .journal import iter_journal
+from .journal import remove_journal
+from .lock import DatabaseLock
+from .snapshot import read_snapshot
+from .snapshot import write_snapshot
 
 # let's make a notebook of exceptions here: we can use it later or not
 
@@ -25,14 +52,122 @@ class KaomojiKaomojiKeywordDoesntExist(Exception):
         super().__init__(self.description, *args, **kwargs)
 
 
+def normalize_hash(the_hash: Union[str, int]) -> str:
+    """Gives the hex digest form of a kaomoji hash given as hex or int."""
+
+    if isinstance(the_hash, int):
+        return format(the_hash, "064x")
+
+    return the_hash.lower()
+
+
+def is_hex_hash(string: str) -> bool:
+    """Checks if a string looks like a sha256 hex digest."""
+
+    if len(string) != 64:
+        return False
+
+    try:
+        int(string, base=16)
+    except ValueError:
+        return False
+
+    return True
+
+
+def shortcode_to_code(shortcode: Union[str, bytes]) -> Union[str, None]:
+    """Decodes a base64 shortcode back to the kaomoji code; None if invalid."""
+
+    try:
+        return base64.b64decode(shortcode, validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def parse_line_entry(line_entry: str) -> tuple[str, tuple[str, ...]]:
+    """Parses a database line entry into its code and its keywords, stripped,
+        interned and without duplicates, as Kaomoji keeps them.
+    """
+
+    code, _, keywords_str = line_entry.strip().partition("\t")
+
+    keywords = dict.fromkeys(intern(keyword.strip())
+                             for keyword in keywords_str.split(",")
+                             if keyword.strip())
+
+    return code, tuple(keywords)
+
+
+@contextmanager
+def gc_paused():
+    """Pauses the cyclic garbage collector while building many objects.
+
+    Loading creates no garbage to collect, but every few hundred
+        allocations the collector would walk the ever-growing heap anyway.
+    """
+
+    was_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def blake2b_identity(code: str) -> int:
+    """Fast 64 bit in-memory identity of a kaomoji code.
+
+    Used by `Kaomoji.__hash__`; the sha256 `Kaomoji.hash` stays the stable
+        ID written to disk.
+    """
+
+    return int.from_bytes(blake2b(code.encode("utf-8"), digest_size=8).digest(),
+                          "big")
+
+
+def sha256_identity(code: str) -> int:
+    """The base10 of the sha256 digest of the kaomoji code, as an identity."""
+
+    return int(sha256(code.encode("utf-8")).hexdigest(), base=16)
+
+
 class Kaomoji:
-    """Represents a Kaomoji entity."""
+    """Represents a Kaomoji entity.
+
+    `hash` and `shortcode` are computed on first use and cached, so parsing
+        a database doesn't digest every code. `identity_digest` is the
+        pluggable function giving the int used by hash().
+
+    Instances use __slots__ and keep their keywords in a tuple without
+        duplicates, in insertion order, with the keyword strings interned;
+        kaomojis sharing a keyword share the same string object.
+    """
+
+    __slots__ = ("code", "keywords", "line_entry", "_database", "_entry_id",
+                 "_hash", "_shortcode", "_identity")
 
-    code: str = str()  # unicode of the kaomoji
-    keywords: list[str] = list()  # list of strings
+    code: str  # unicode of the kaomoji
+    keywords: tuple[str, ...]  # tuple of unique, interned strings
+    line_entry: Union[str, None]  # set by to_line_entry(self_register=True)
+    _database: "KaomojiDB"  # the KaomojiDB indexing this kaomoji
+    _entry_id: Union[int, None]  # its id in the keyword index of _database
+    _hash: Union[str, None]  # cached sha256 hex digest
+    _shortcode: Union[str, None]  # cached base64 shortcode
+    _identity: Union[int, None]  # cached identity_digest(code)
+
+    identity_digest = staticmethod(blake2b_identity)
 
     def __init__(self, code=None, keywords=None, line_entry=None):
 
+        self.code = str()
+        self.keywords = tuple()
+        self.line_entry = None
+        self._database = None
+        self._entry_id = None
+        self._reset_cache()
+
         if line_entry:
             self.from_line_entry(line_entry=line_entry)
 
@@ -40,45 +175,70 @@ class Kaomoji:
             self.code = code
             self.add_keywords(keywords)
 
-        self._make_inits()
-
-    def add_keyword(self, keyword: str) -> None:
-        """Adds a keyword to this kaomoji entity."""
-
-        if keyword and not keyword in self.keywords:
-            self.keywords.append(keyword.strip())
+    @classmethod
+    def _from_parsed(cls, code: str, keywords: tuple[str, ...],
+                     database: "KaomojiDB" = None) -> "Kaomoji":
+        """Builds a Kaomoji from an already parsed and de-duplicated entry,
+            skipping the parsing done by __init__.
+        """
 
-    def add_keywords(self, keywords: Union[str, list, None]= None) -> None:
+        kaomoji = cls.__new__(cls)
+        kaomoji.code = code
+        kaomoji.keywords = keywords
+        kaomoji.line_entry = None
+        kaomoji._database = database
+        kaomoji._entry_id = None
+        kaomoji._hash = None
+        kaomoji._shortcode = None
+        kaomoji._identity = None
+
+        return kaomoji
+
+    @staticmethod
+    def _to_keyword_list(keywords: Union[str, list, tuple, None]) -> list[str]:
+        """Splits a comma-separated str, or takes a list, of keywords; gives
+            them stripped and interned, empty ones left out.
+        """
 
         if not keywords:
             keyword_list = []
         elif isinstance(keywords, str):
-            keyword_list = [kw.strip() for kw in keywords.split(',')]
-        elif isinstance(keywords, list):
+            keyword_list = keywords.split(',')
+        elif isinstance(keywords, (list, tuple)):
             keyword_list = keywords
         else:
             raise TypeError("keywords is not str | list")
 
-        resume = list(set(self.keywords + keyword_list))  # remove duplicates
+        return [intern(keyword.strip()) for keyword in keyword_list
+                if keyword.strip()]
+
+    def add_keyword(self, keyword: str) -> None:
+        """Adds a keyword to this kaomoji entity."""
+
+        self.add_keywords([keyword] if keyword else None)
+
+    def add_keywords(self, keywords: Union[str, list, None]= None) -> None:
+
+        added = list()
 
-        while '' in resume:
-            resume.remove('')
+        for keyword in self._to_keyword_list(keywords):
+            if keyword not in self.keywords and keyword not in added:
+                added.append(keyword)
 
-        self.keywords = resume
+        if added:
+            self.keywords += tuple(added)
+            self._keywords_changed(added=added)
 
     def from_line_entry(self, line_entry: str):
         """Formats the database line entry as a Kaomoji instance."""
 
-        self.code = str()  # unicode of the kaomoji
-        self.keywords = list()  # list of strings
-
-        line = line_entry.strip()
+        code, keywords = parse_line_entry(line_entry)
 
-        code, *keywords_str = line.split('\t', maxsplit=1)
-        self.code = code
-        self.add_keywords(*keywords_str)
+        self.code = code  # unicode of the kaomoji
+        self.keywords = tuple()  # tuple of strings
+        self.add_keywords(list(keywords))
 
-        self._make_inits()
+        self._reset_cache()
 
         return self
 
@@ -86,35 +246,23 @@ class Kaomoji:
     def remove_keyword(self, keyword: str) -> None:
         """Removes a keyword to this kaomoji entity."""
 
-        if keyword in self.keywords:
-            # self.keywords.remove(keyword.strip())
-            self.keywords.remove(keyword.strip())
+        self.remove_keywords([keyword] if keyword else None)
 
     def remove_keywords(self, keywords: Union[str, list, None]) -> None:
 
-        if not keywords:
-            keyword_list = []
-        elif isinstance(keywords, str):
-            keyword_list = [kw.strip() for kw in keywords.split(',')]
-        elif isinstance(keywords, list):
-            keyword_list = keywords
-        else:
-            raise TypeError("keywords is not str | list")
-
-        for keyword in keyword_list:
-            kw = keyword.strip()
+        removed = [keyword for keyword in self._to_keyword_list(keywords)
+                   if keyword in self.keywords]
 
-            print("KEYWORD", kw)
-            print("self.KWYWORDS", self.keywords)
-            if kw in self.keywords:
-                self.keywords.remove(kw)
+        if removed:
+            self.keywords = tuple(keyword for keyword in self.keywords
+                                  if keyword not in removed)
+            self._keywords_changed(removed=removed)
 
     def to_line_entry(self, self_register=False) -> str:
         """Formats the current Kaomoji instance as a database line entry."""
 
         code = self.code
-        keywords_str = ", ".join([keyword.strip()
-                                  for keyword in self.keywords])
+        keywords_str = ", ".join(self.keywords)
         line_entry = "{code}\t{keywords_str}\n"\
             .format(code=code, keywords_str=keywords_str)
 
@@ -130,12 +278,19 @@ class Kaomoji:
 
         return False
 
+    def _keywords_changed(self, added=(), removed=()) -> None:
+        """Keeps the indexes of the database holding this kaomoji in sync."""
 
-    def _make_hash(self, code, self_register=False) -> int:
+        if self._database is not None:
+            self._database._reindex_keywords(kaomoji=self, added=added,
+                                             removed=removed)
+
+
+    def _make_hash(self, code, self_register=False) -> str:
         """Gives a UUID for a given kaomoji, for comparison.
 
-        It is the base10 of the sha256 digest of the kaomoji code:
-            HASH = INT10(SHA256(BYTES(UNICODE_KAOMOJI_CODE_UTF8)))
+        It is the hex sha256 digest of the kaomoji code:
+            HASH = HEX(SHA256(BYTES(UNICODE_KAOMOJI_CODE_UTF8)))
 
         With this we can know if some emoji is already on the DATABASE, so to
             append keywords to it.
@@ -147,7 +302,7 @@ class Kaomoji:
         # the_hash = int(code_sha256_hex_digestion, base=16)
 
         if self_register:
-            self.hash = the_hash
+            self._hash = the_hash
 
         return the_hash
 
@@ -178,37 +333,95 @@ class Kaomoji:
 
         code_bytes = code.encode("utf-8")
 
-        b64_shortcode = base64.b64encode(code_bytes)
+        b64_shortcode = base64.b64encode(code_bytes).decode("ascii")
 
         if self_register:
-            self.shortcode = b64_shortcode
+            self._shortcode = b64_shortcode
 
         return b64_shortcode
 
-    def _make_inits(self):
-        if self.code:
-            self.hash = self._make_hash(code=self.code)
-            self.shortcode = self._make_shortcode(code=self.code)
+    @property
+    def hash(self) -> str:
+        """The sha256 hex digest of the code; the stable ID of the kaomoji."""
+
+        if self._hash is None:
+            self._hash = self._make_hash(code=self.code)
+
+        return self._hash
+
+    @property
+    def shortcode(self) -> str:
+        """The base64 shortcode of the code."""
+
+        if self._shortcode is None:
+            self._shortcode = self._make_shortcode(code=self.code)
+
+        return self._shortcode
+
+    def _reset_cache(self) -> None:
+        """Forgets the digests computed from the previous code."""
+
+        self._hash = None
+        self._shortcode = None
+        self._identity = None
+
+    def _hash_to_shortcode(self, the_hash: Union[str, int, None] = None) ->\
+                                                            Union[str, None]:
+        """Gives the shortcode of the kaomoji having the given hash; defaults
+            to this kaomoji's hash.
+
+        sha256 can't be reversed, so hashes of other kaomojis are resolved via
+            the hash index of the KaomojiDB holding this kaomoji.
+        """
+
+        if the_hash is None or normalize_hash(the_hash) == self.hash:
+            return self.shortcode
+
+        if self._database is not None:
+            other = self._database.get_kaomoji_by_hash(the_hash)
+
+            if other:
+                return other.shortcode
+
+        return None
+
+    def _shortcode_to_hash(self, shortcode: Union[str, bytes, None] = None)\
+                                                        -> Union[str, None]:
+        """Gives the hash of the kaomoji having the given shortcode; defaults
+            to this kaomoji's shortcode.
+
+        The shortcode is just the base64 of the code, so it is decoded back.
+        """
+
+        if shortcode is None:
+            return self.hash
+
+        code = shortcode_to_code(shortcode)
 
-    def _hash_to_shortcode(self):
-        pass
+        if code is None:
+            return None
 
-    def _shortcode_to_hash(self):
-        pass
+        return self._make_hash(code=code)
 
     def __eq__(self, other):
         """ Implements the == (equality) operator to compare two Kaomoji
                 instances.
         """
 
-        return hash(self) == hash(other)
+        if not isinstance(other, Kaomoji):
+            return NotImplemented
+
+        return self.code == other.code
 
     def __hash__(self):
         """ Implements hash() which makes a given emoji to be compared as a
                 numeric entity.
         """
 
-        return self.hash
+        if self._identity is None:
+            self._identity = self.identity_digest(self.code)
+
+        return self._identity
 
     def __repr__(self):
         """ Implements a repr() pythonic programmatic representation of the
@@ -223,13 +436,356 @@ class Kaomoji:
         return self.code
 
 
+DIFF_TYPES = ("additional", "difference", "exclusive", "intersection")
+
+# smaller db files load faster in one process than a process pool starts
+MIN_PARALLEL_SIZE = 4 << 20
+
+# number of hash partitions of a streaming diff; see diff.iter_compare_partitioned
+DEFAULT_PARTITIONS = 64
+
+# the conflicts of a three-way merge, as "<ours>/<theirs>"
+CONFLICT_DELETE_EDIT = "delete/edit"  # deleted by ours, edited by theirs
+CONFLICT_EDIT_DELETE = "edit/delete"  # edited by ours, deleted by theirs
+
+
+def keyword_difference(keywords: tuple[str, ...],
+                       other_keywords: tuple[str, ...]) -> tuple[str, ...]:
+    """The keywords not in `other_keywords`, in order."""
+
+    if keywords == other_keywords:
+        return tuple()
+
+    other_set = frozenset(other_keywords)
+
+    return tuple(keyword for keyword in keywords if keyword not in other_set)
+
+
+def keyword_intersection(keywords: tuple[str, ...],
+                         other_keywords: tuple[str, ...]) -> tuple[str, ...]:
+    """The keywords also in `other_keywords`, in order."""
+
+    if keywords == other_keywords:
+        return keywords
+
+    other_set = frozenset(other_keywords)
+
+    return tuple(keyword for keyword in keywords if keyword in other_set)
+
+
+def compare_entries(kaomoji: Union[Kaomoji, None],
+                    other: Union[Kaomoji, None],
+                    diff_type: str = "additional") -> Union[Kaomoji, None]:
+    """Compares the entries of the same code in two databases.
+
+    Args:
+        kaomoji (Kaomoji): the entry in the first database, or None.
+        other (Kaomoji): the entry in the other database, or None.
+        diff_type (str): one of:
+            "additional": what `other` has and `kaomoji` doesn't.
+            "exclusive": what `kaomoji` has and `other` doesn't.
+            "difference": both of the above, keywords joined.
+            "intersection": what both have; the entry is kept even if they
+                have no keyword in common.
+
+    Returns:
+        a new, detached Kaomoji with the resulting keywords, or None if
+            there is no difference of that type.
+    """
+
+    if diff_type == "additional":
+        kaomoji, other = other, kaomoji
+        diff_type = "exclusive"
+
+    if diff_type == "exclusive":
+        if kaomoji is None:
+            return None
+
+        if other is None:
+            return Kaomoji._from_parsed(kaomoji.code, kaomoji.keywords)
+
+        keywords = keyword_difference(kaomoji.keywords, other.keywords)
+
+    elif diff_type == "difference":
+        if kaomoji is None or other is None:
+            entry = kaomoji or other
+            return Kaomoji._from_parsed(entry.code, entry.keywords)
+
+        keywords = keyword_difference(other.keywords, kaomoji.keywords) +\
+            keyword_difference(kaomoji.keywords, other.keywords)
+
+    elif diff_type == "intersection":
+        if kaomoji is None or other is None:
+            return None
+
+        return Kaomoji._from_parsed(kaomoji.code, keyword_intersection(
+            kaomoji.keywords, other.keywords))
+
+    else:
+        raise ValueError("diff_type is not one of {}".format(DIFF_TYPES))
+
+    if not keywords:
+        return None
+
+    return Kaomoji._from_parsed(kaomoji.code, keywords)
+
+
+def compare_databases(kaomojis, other_kaomojis,
+                      diff_type: str = "additional") -> dict[str, Kaomoji]:
+    """Compares the entries of two databases, given as code -> Kaomoji
+        mappings.
+
+    Only the requested `diff_type` is computed, see `compare_entries`;
+        entries come in the order of the database walked: the other one for
+        "additional", the first one for "exclusive" and "intersection", and
+        both, the other one first, for "difference".
+    """
+
+    if diff_type not in DIFF_TYPES:
+        raise ValueError("diff_type is not one of {}".format(DIFF_TYPES))
+
+    diff_dict = dict()
+
+    # other has and self doesn't
+    if diff_type in ("additional", "difference"):
+        for code, other_kaomoji in other_kaomojis.items():
+            diff_kaomoji = compare_entries(kaomojis.get(code), other_kaomoji,
+                                           diff_type)
+            if diff_kaomoji:
+                diff_dict.update({code: diff_kaomoji})
+
+    # self has and other doesn't; shared codes are done for "difference"
+    if diff_type in ("exclusive", "difference"):
+        for code, kaomoji in kaomojis.items():
+            if diff_type == "difference" and code in other_kaomojis:
+                continue
+
+            diff_kaomoji = compare_entries(kaomoji, other_kaomojis.get(code),
+                                           diff_type)
+            if diff_kaomoji:
+                diff_dict.update({code: diff_kaomoji})
+
+    # both have
+    if diff_type == "intersection":
+        for code, kaomoji in kaomojis.items():
+            other_kaomoji = other_kaomojis.get(code)
+
+            if other_kaomoji:
+                diff_dict.update({code: compare_entries(kaomoji, other_kaomoji,
+                                                        diff_type)})
+
+    return diff_dict
+
+
+def merge_keywords(base: Union[tuple[str, ...], None],
+                   ours: Union[tuple[str, ...], None],
+                   theirs: Union[tuple[str, ...], None])\
+                        -> tuple[Union[tuple[str, ...], None],
+                                 Union[str, None]]:
+    """Three-way merges the keywords of an entry; None stands for an entry
+        that isn't in that database.
+
+    Keywords are a set, so edits on both sides always merge: what theirs
+        removed from base is removed from ours, and what theirs added is
+        appended. Entries added on both sides get the keywords of both. An
+        entry edited on one side and deleted on the other is a conflict,
+        and the edited entry is kept.
+
+    Returns:
+        the merged keywords, or None if the entry is deleted; and the
+            conflict, CONFLICT_DELETE_EDIT or CONFLICT_EDIT_DELETE, or None.
+    """
+
+    if ours == theirs or theirs == base:
+        return ours, None
+
+    if ours == base:
+        return theirs, None
+
+    if base is None:
+        return ours + keyword_difference(theirs, ours), None
+
+    if ours is None:
+        return theirs, CONFLICT_DELETE_EDIT
+
+    if theirs is None:
+        return ours, CONFLICT_EDIT_DELETE
+
+    base_set = frozenset(base)
+    theirs_set = frozenset(theirs)
+    ours_set = frozenset(ours)
+
+    return tuple(keyword for keyword in ours
+                 if keyword in theirs_set or keyword not in base_set) +\
+        tuple(keyword for keyword in theirs
+              if keyword not in base_set and keyword not in ours_set), None
+
+
+class MergeConflict:
+    """An entry edited on one side of a merge and deleted on the other.
+
+    Attributes:
+        code (str): the kaomoji.
+        conflict (str): CONFLICT_DELETE_EDIT or CONFLICT_EDIT_DELETE.
+        base, ours, theirs (tuple): the keywords of each side, None where
+            it is deleted.
+    """
+
+    __slots__ = ("code", "conflict", "base", "ours", "theirs")
+
+    def __init__(self, code: str, conflict: str,
+                 base: Union[tuple[str, ...], None],
+                 ours: Union[tuple[str, ...], None],
+                 theirs: Union[tuple[str, ...], None]) -> None:
+        self.code = code
+        self.conflict = conflict
+        self.base = base
+        self.ours = ours
+        self.theirs = theirs
+
+    @property
+    def hash(self) -> str:
+        return sha256(self.code.encode("utf-8")).hexdigest()
+
+    def to_dict(self) -> dict:
+        """The conflict for a JSON report, keywords as lists or None."""
+
+        return dict(hash=self.hash, code=self.code, conflict=self.conflict,
+                    base=self._list(self.base), ours=self._list(self.ours),
+                    theirs=self._list(self.theirs))
+
+    @staticmethod
+    def _list(keywords):
+        return None if keywords is None else list(keywords)
+
+    def __repr__(self):
+        return "<MergeConflict `{}'; {}>".format(self.code, self.conflict)
+
+
+def merge_databases(base_kaomojis, kaomojis, other_kaomojis)\
+        -> Iterator[tuple[str, Union[tuple[str, ...], None],
+                          Union[MergeConflict, None]]]:
+    """Three-way merges databases given as code -> Kaomoji mappings, ours
+        being `kaomojis` and theirs `other_kaomojis`.
+
+    The entries are joined on their code, the key their hash is a digest
+        of, in one pass over ours and one over the entries only theirs has;
+        the ones only base has were deleted on both sides. Each entry costs
+        one lookup per side and time linear in its keywords.
+
+    Yields:
+        the code, the merged keywords (None if the entry is deleted) and the
+            MergeConflict or None, of every entry in ours or theirs.
+    """
+
+    for code, kaomoji in kaomojis.items():
+        base = base_kaomojis.get(code)
+        other = other_kaomojis.get(code)
+        base_keywords = None if base is None else base.keywords
+        other_keywords = None if other is None else other.keywords
+
+        keywords, conflict = merge_keywords(base_keywords, kaomoji.keywords,
+                                            other_keywords)
+
+        yield code, keywords, conflict and MergeConflict(
+            code, conflict, base_keywords, kaomoji.keywords, other_keywords)
+
+    for code, other in other_kaomojis.items():
+        if code in kaomojis:
+            continue
+
+        base = base_kaomojis.get(code)
+        base_keywords = None if base is None else base.keywords
+
+        keywords, conflict = merge_keywords(base_keywords, None,
+                                            other.keywords)
+
+        yield code, keywords, conflict and MergeConflict(
+            code, conflict, base_keywords, None, other.keywords)
+
+
+def merge_into(database, base, other) -> tuple[dict[str, int],
+                                               list[MergeConflict]]:
+    """Three-way merges `other` into `database`, any databases with a
+        `kaomojis` mapping; see `merge_databases`. The changes are applied
+        after the pass, as the mappings can't change while walked.
+
+    Returns:
+        a report dict with the number of entries "added", "updated" and
+            "removed" in `database`, and the list of MergeConflict.
+    """
+
+    for db in (base, other):
+        if not isinstance(getattr(db, "kaomojis", None), Mapping):
+            raise TypeError("{!r} is not a KaomojiDB".format(db))
+
+    report = dict(added=0, updated=0, removed=0)
+    conflicts = list()
+    changes = list()
+
+    for code, keywords, conflict in merge_databases(
+            base_kaomojis=base.kaomojis, kaomojis=database.kaomojis,
+            other_kaomojis=other.kaomojis):
+        if conflict:
+            conflicts.append(conflict)
+
+        kaomoji = database.kaomojis.get(code)
+
+        if kaomoji is None:
+            if keywords is not None:
+                changes.append((code, None, keywords))
+        elif keywords != kaomoji.keywords:
+            changes.append((code, kaomoji, keywords))
+
+    with gc_paused():
+        for code, kaomoji, keywords in changes:
+            if keywords is None:
+                database.remove_kaomoji(kaomoji)
+                report["removed"] += 1
+                continue
+
+            database.add_kaomoji(Kaomoji._from_parsed(code, keywords))
+            report["added" if kaomoji is None else "updated"] += 1
+
+    return report, conflicts
+
+
+def lookup_kaomoji(database, entity: str) -> Union[Kaomoji, None]:
+    """Gets a kaomoji of a KaomojiDB or KaomojiSQLiteDB by code, else by hex
+        hash, else by base64 shortcode; for lookups only, as a new code can
+        look like the hash or the shortcode of another kaomoji.
+    """
+
+    kaomoji = database.get_kaomoji_by_code(entity)
+
+    if kaomoji is None and is_hex_hash(entity):
+        kaomoji = database.get_kaomoji_by_hash(entity)
+
+    if kaomoji is None:
+        kaomoji = database.get_kaomoji_by_shortcode(entity)
+
+    return kaomoji
+
+
 class KaomojiDB:
     """Offers facilities to edit and check the DB file."""
 
-    def __init__(self, filename=None) -> None:
+    def __init__(self, filename=None, use_snapshot=False,
+                 use_journal=False, workers=1, timings=None) -> None:
         """
         Args:
             filename (str): The filename of the splatmoji database to be read.
+            use_snapshot (bool): keep a binary snapshot of the parsed file and
+                its indexes in a sidecar file, and load from it while the
+                file is unchanged.
+            use_journal (bool): make `write` append the edits to a journal
+                next to the file instead of rewriting it; `compact` folds the
+                journal into the file.
+            workers (int): number of processes parsing the file, in shards;
+                files under MIN_PARALLEL_SIZE bytes are parsed in this
+                process anyway.
+            timings (Timings): records the phases of loading and writing;
+                see `timed`.
 
         Attributes:
             filename (str): the filename of the database file.
@@ -237,54 +793,336 @@ class KaomojiDB:
                 and the value is a list of keywords, eg.:
                     kaomojis = dict({'o_o': ['keyword 1', 'keyword 2'],
                                     '~_o': ['keywordd', 'keyy2', 'etc']})
+            keyword_index (KeywordIndex): the keyword -> entry ids inverted
+                index used by `query` and `query_all`.
+            entries (list): the Kaomoji of each entry id of `keyword_index`,
+                in database order; None for the ids of removed entries,
+                until the ids are renumbered by `compact`.
+            hash_index (dict): a dictionary which the key is the sha256 hex
+                digest of the kaomoji code, and the value is the Kaomoji; it
+                is built on first use, so loading doesn't hash every code.
         """
+
+        self.filename = filename
+        self.use_snapshot = use_snapshot
+        self.use_journal = use_journal
+        self.workers = workers
+        self.timings = timings
+        self.kaomojis = dict()
+        self.entry_num = int()
+        self.keyword_index = KeywordIndex()
+        self.entries = list()
+        self._hash_index = None
+        self._pending = list()  # journal records not written yet
+        self._loaded_state = None  # the database_state the file was read in
+
         if filename:
             self.load_file(filename=filename)
 
-    def load_file(self, filename: str) -> None:
+    def phase(self, name: str):
+        """Times the block as a phase in `timings`, if there are any."""
+
+        if self.timings is None:
+            return nullcontext()
+
+        return self.timings.phase(name)
+
+    @contextmanager
+    def timed(self, timings=None) -> Iterator["Timings"]:
+        """Records the phases of what the database does in the block, eg.:
+
+            with database.timed() as timings:
+                database.load_file(filename)
+                database.write()
+
+            print(timings.report())
+
+        Args:
+            timings (Timings): where to record them; a new one by default.
+
+        Yields:
+            the Timings.
+        """
+
+        from .timings import Timings
+
+        previous_timings = self.timings
+        self.timings = timings or Timings()
+
+        try:
+            yield self.timings
+        finally:
+            self.timings = previous_timings
+
+    @staticmethod
+    def iter_file(filename: str, encoding: str = "utf-8") -> Iterator[Kaomoji]:
+        """Lazily yields a Kaomoji for each line entry of a db file.
+
+        The file is read one line at a time and closed when the generator is
+            exhausted or closed, so memory use doesn't grow with the file
+            size. Blank lines are skipped; every other line is an entry, its
+            code up to the first tab, as `parse_line_entry` reads it.
+        """
+
+        with open(filename, "r", encoding=encoding) as db_file:
+            for line in db_file:
+                if not line.strip():
+                    continue
+
+                yield Kaomoji(line_entry=line)
+
+    def load_file(self, filename: str, encoding: str = "utf-8") -> None:
         """ Loads a db file reading it in the format usable by KaomojiDB class.
+
+        The edits in the journal of the file, if any, are replayed on top of
+            it, so they are visible before being compacted.
         """
 
         self.filename = filename
         self.kaomojis = dict()
         self.entry_num = int()
+        self.keyword_index.clear()
+        self.entries = list()
+        self._hash_index = None
+        self._pending = list()
+        self._loaded_state = database_state(filename)
 
-        # TODO: check here for errors
-        db_file = open(filename, "r")
-        #with open(filename) as dbfile:
-        lines = db_file.readlines()
+        with self.phase("load"), gc_paused():
+            snapshot = None
 
-        for line in lines:
+            if self.use_snapshot:
+                with self.phase("snapshot"):
+                    snapshot = read_snapshot(filename)
 
-            # processed_line = line.strip().split("\t", maxsplit=1)
-            # if len(processed_line) == 2:
-            #     code, keywords = processed_line
-            # else:
-            #     code, *throwaway = processed_line
-            #     keywords = None
-            #
-            # kaomoji = Kaomoji(code=code, keywords=keywords)
-            # kaomoji = Kaomoji().from_line_entry(line_entry=line)
-            kaomoji = Kaomoji(line_entry=line)
+                    if snapshot:
+                        self._load_snapshot(*snapshot)
 
-            self.kaomojis.update({kaomoji.code: kaomoji})
+            if not snapshot:
+                with self.phase("parse"):
+                    self._parse_file(filename=filename, encoding=encoding)
+
+                if self.use_snapshot:
+                    self.save_snapshot()
+
+            with self.phase("journal"):
+                self._replay_journal()
 
         self.entry_num = len(self.kaomojis)
 
+    def _parse_file(self, filename: str, encoding: str = "utf-8") -> None:
+        """Fills the database from a db file, in shards in `workers`
+            processes if it is big enough.
+        """
+
+        if self.workers > 1 and os.path.getsize(filename) >= MIN_PARALLEL_SIZE:
+            from .shards import iter_parsed_shards
+
+            self._load_parsed(iter_parsed_shards(
+                filename=filename, workers=self.workers, encoding=encoding))
+            return
+
+        for kaomoji in self.iter_file(filename=filename, encoding=encoding):
+            entry_id = self._unindex_kaomoji(self.kaomojis.get(kaomoji.code))
+            self.kaomojis.update({kaomoji.code: kaomoji})
+            self._index_kaomoji(kaomoji, entry_id=entry_id)
+
+    def save_snapshot(self) -> None:
+        """Writes the snapshot sidecar of the current db file."""
+
+        with self.phase("save_snapshot"):
+            self.renumber_entries()
+
+            write_snapshot(
+                filename=self.filename,
+                codes=[kaomoji.code for kaomoji in self.entries],
+                keywords=[kaomoji.keywords for kaomoji in self.entries],
+                dictionary=self.keyword_index.dictionary,
+                postings=self.keyword_index.postings,
+                sorted_keywords=self.keyword_index.sorted_keywords())
+
+    def _load_snapshot(self, codes: list, keywords: list,
+                       dictionary: KeywordDictionary, postings: dict,
+                       sorted_keywords: list) -> None:
+        """Fills the database from the contents of a snapshot."""
+
+        # share them with keywords added later
+        for keyword in dictionary.keywords:
+            intern(keyword)
+
+        kaomojis = self.kaomojis
+        entries = self.entries
+        from_parsed = Kaomoji._from_parsed
+
+        for entry_id, (code, code_keywords) in enumerate(zip(codes, keywords)):
+            kaomoji = kaomojis[code] = from_parsed(code, code_keywords,
+                                                   database=self)
+            kaomoji._entry_id = entry_id
+            entries.append(kaomoji)
+
+        self.keyword_index.load(dictionary=dictionary, postings=postings,
+                                sorted_keywords=sorted_keywords)
+
+    def _load_parsed(self, shards: Iterable[tuple[list, list]]) -> None:
+        """Fills the database from the parsed shards of a file, in file
+            order.
+
+        Entries are added line by line like the sequential loader does: a
+            repeated code keeps the position and entry id of its first line
+            and the keywords of its last one, so both loaders give the same
+            database.
+        """
+
+        kaomojis = self.kaomojis
+        entries = self.entries
+        from_parsed = Kaomoji._from_parsed
+        index_add = self.keyword_index.add
+
+        for codes, keywords in shards:
+            for code, code_keywords in zip(codes, keywords):
+                kaomoji = from_parsed(code, code_keywords, database=self)
+                old_kaomoji = kaomojis.get(code)
+
+                if old_kaomoji is None:
+                    kaomoji._entry_id = len(entries)
+                    entries.append(kaomoji)
+                else:
+                    kaomoji._entry_id = self._unindex_kaomoji(old_kaomoji)
+                    entries[kaomoji._entry_id] = kaomoji
+
+                kaomojis[code] = kaomoji
+                index_add(kaomoji._entry_id, code_keywords)
+
+    def _replay_journal(self) -> None:
+        """Applies the journal of the db file to the loaded database."""
+
+        self.apply_records(iter_journal(self.filename))
+        self._pending = list()
+
+    def apply_records(self, records: Iterable[tuple[str, str, str]]) -> None:
+        """Applies (operation, code, keywords) journal records, as
+            `iter_records` reads them.
+
+        Every record sets the state of an entry or of some of its keywords,
+            so replaying a journal that was already folded in by an
+            interrupted `compact` gives the same database.
+        """
+
+        for operation, code, keywords in records:
+            kaomoji = self.kaomojis.get(code)
+
+            if operation == JOURNAL_PUT:
+                self.add_kaomoji(Kaomoji(code=code, keywords=keywords))
+
+            elif operation == JOURNAL_DELETE and kaomoji:
+                self.remove_kaomoji(kaomoji)
+
+            elif operation == JOURNAL_KEYWORDS_ADD:
+                if not kaomoji:
+                    kaomoji = self.add_kaomoji(Kaomoji(code=code))
+
+                kaomoji.add_keywords(keywords)
+
+            elif operation == JOURNAL_KEYWORDS_REMOVE and kaomoji:
+                kaomoji.remove_keywords(keywords)
+
+    @contextmanager
+    def transaction(self, timeout: Union[float, None] = None)\
+                                                    -> Iterator["KaomojiDB"]:
+        """Holds the DatabaseLock of the db file for a read-modify-write
+            cycle, so concurrent writers don't drop each other's edits:
+
+            with database.transaction():
+                database.add_kaomoji(kaomoji)
+
+        The file is reloaded first if it was written since it was loaded,
+            dropping the edits not written yet, and the edits made in the
+            block are written when it ends without raising.
+
+        Args:
+            timeout (float): seconds to wait for the lock; see DatabaseLock.
+        """
+
+        with DatabaseLock(self.filename, timeout=timeout):
+            if database_state(self.filename) != self._loaded_state:
+                self.load_file(filename=self.filename)
+
+            yield self
+
+            self.write()
+
     def write(self, filename: str=None) -> None:
-        """Writes a db file with the changes made."""
+        """Writes a db file with the changes made.
+
+        With `use_journal`, the edits made since the last write are appended
+            to the journal; else the whole database is written, like when
+            writing to another file. Nothing is reloaded afterwards.
+        """
+
+        with self.phase("write"):
+            if filename and filename != self.filename:
+                self._dump(filename=filename)
+
+            elif self.use_journal:
+                if self._pending:
+                    append_journal(filename=self.filename,
+                                   records=self._pending)
+                    self._pending = list()
+                    self._loaded_state = database_state(self.filename)
+
+            else:
+                self.compact()
+
+    def compact(self) -> None:
+        """Folds the journal into the db file, rewriting it atomically."""
 
-        if not filename:
-            filename = self.filename
+        with self.phase("write"):
+            self._dump(filename=self.filename)
+            remove_journal(filename=self.filename)
+            self._pending = list()
+            self._loaded_state = database_state(self.filename)
 
-        database_file = open(filename, "w")
+            if self.use_snapshot:
+                self.save_snapshot()
+            else:
+                self.renumber_entries()
+
+    def renumber_entries(self) -> None:
+        """Gives the entries consecutive ids again, dropping the ids of the
+            removed ones from `entries`.
+        """
+
+        if len(self.entries) == len(self.kaomojis):
+            return
+
+        entry_ids = array(POSTING_TYPECODE, [0]) * len(self.entries)
+        entries = list()
+
+        for entry_id, kaomoji in enumerate(self.entries):
+            if kaomoji is not None:
+                entry_ids[entry_id] = kaomoji._entry_id = len(entries)
+                entries.append(kaomoji)
+
+        self.entries = entries
+        self.keyword_index.renumber(entry_ids)
+
+    def _dump(self, filename: str) -> None:
+        """Writes the whole database to a temporary file, then renames it over
+            `filename`, so readers never see a half written file.
+        """
+
+        temp_filename = "{filename}.{pid}.tmp".format(filename=filename,
+                                                      pid=os.getpid())
 
-        for kaomoji in self.kaomojis.values():
-            database_entry_line = kaomoji.to_line_entry()
-            database_file.write(database_entry_line)
+        with open(temp_filename, "w", encoding="utf-8") as database_file:
+            database_file.writelines(kaomoji.to_line_entry()
+                                     for kaomoji in self.kaomojis.values())
+            database_file.flush()
+            os.fsync(database_file.fileno())
 
-        database_file.close()
-        self.load_file(filename=self.filename)
+        if os.path.exists(filename):
+            shutil.copymode(filename, temp_filename)
+
+        os.replace(temp_filename, filename)
 
     def kaomoji_exists(self, kaomoji: Kaomoji) -> bool:
         """Checks if a kaomoji exists already in the database."""
@@ -295,14 +1133,61 @@ class KaomojiDB:
         return False
 
     def add_kaomoji(self, kaomoji: Kaomoji) -> Kaomoji:
-        """Adds a Kaomoji to the database."""
+        """Adds a Kaomoji to the database; a copy of it if it is held by
+            another database.
+        """
 
-        self.kaomojis.update({kaomoji.code: kaomoji})
+        if self.kaomojis.get(kaomoji.code) is not kaomoji:
+            if kaomoji._database not in (None, self):
+                kaomoji = Kaomoji._from_parsed(kaomoji.code, kaomoji.keywords)
+
+            entry_id = self._unindex_kaomoji(self.kaomojis.get(kaomoji.code))
+            self.kaomojis.update({kaomoji.code: kaomoji})
+            self._index_kaomoji(kaomoji, entry_id=entry_id)
+            self._record(JOURNAL_PUT, kaomoji.code, kaomoji.keywords)
 
         return self.kaomojis[kaomoji.code]
 
+    def ingest(self, kaomojis: Iterable[Kaomoji]) -> dict[str, int]:
+        """Adds many kaomojis; the keywords of the ones already in the
+            database, or repeated in `kaomojis`, are merged instead of
+            replaced.
+
+        Returns:
+            a report dict with the number of entries "added", "updated" with
+                new keywords, and "unchanged".
+        """
+
+        report = dict(added=0, updated=0, unchanged=0)
+
+        with gc_paused():
+            for kaomoji in kaomojis:
+                db_kaomoji = self.kaomojis.get(kaomoji.code)
+
+                if db_kaomoji is None:
+                    self.add_kaomoji(kaomoji)
+                    report["added"] += 1
+                    continue
+
+                keyword_num = len(db_kaomoji.keywords)
+                db_kaomoji.add_keywords(kaomoji.keywords)
+
+                if len(db_kaomoji.keywords) != keyword_num:
+                    report["updated"] += 1
+                else:
+                    report["unchanged"] += 1
+
+        return report
+
     def get_kaomoji(self, by_entity: Union[Kaomoji, str, int]) ->\
                                                         Union[Kaomoji, None]:
+        """Gets a Kaomoji from the database by Kaomoji entity, code or int
+            hash.
+
+        A str is matched as a code only, so an edit of a new code which
+            looks like the hash or the shortcode of another kaomoji doesn't
+            change that one; see `lookup_kaomoji` for those.
+        """
 
         # Kaomoji entity
         if isinstance(by_entity, Kaomoji):
@@ -319,9 +1204,8 @@ class KaomojiDB:
         # int, numeric hash
         elif isinstance(by_entity, int):
 
-            for kaomoji in self.kaomojis.values():
-                if the_hash == kaomoji.hash:
-                    return kaomoji
+            return self.get_kaomoji_by_hash(by_entity)
+
         else:
             raise TypeError("by_entity is not Kaomoji | str | int")
 
@@ -343,83 +1227,194 @@ class KaomojiDB:
 
         return None
 
-    def get_kaomoji_by_hash(self, the_hash: int) -> Union[Kaomoji, None]:
+    def get_kaomoji_by_hash(self, the_hash: Union[str, int]) ->\
+                                                        Union[Kaomoji, None]:
         """Gets a Kaomoji with it's current keywords from the database."""
 
-        for kaomoji in self.kaomojis.values():
-            if the_hash == kaomoji.hash:
-                return kaomoji
+        return self.hash_index.get(normalize_hash(the_hash))
 
-        return None
+    @property
+    def hash_index(self) -> dict[str, Kaomoji]:
+        if self._hash_index is None:
+            self._hash_index = {kaomoji.hash: kaomoji
+                                for kaomoji in self.kaomojis.values()}
+
+        return self._hash_index
+
+    def get_kaomoji_by_shortcode(self, shortcode: Union[str, bytes]) ->\
+                                                        Union[Kaomoji, None]:
+        """Gets a Kaomoji with it's current keywords from the database.
+
+        The shortcode is the base64 of the code, so it is decoded and looked
+            up by code; no separate index is needed.
+        """
+
+        code = shortcode_to_code(shortcode)
+
+        if code is None:
+            return None
+
+        return self.kaomojis.get(code)
 
     def remove_kaomoji(self, kaomoji: Kaomoji) -> None:
         """Removes a Kaomoji from the database."""
 
         if kaomoji.code in self.kaomojis:
-            self.kaomojis.pop(kaomoji.code)
+            self._unindex_kaomoji(self.kaomojis.pop(kaomoji.code))
+            self._record(JOURNAL_DELETE, kaomoji.code)
 
     def update_kaomoji(self, kaomoji: Kaomoji) -> Kaomoji:
         """Updates keywords to database."""
 
-        self.kaomojis.update({kaomoji.code: kaomoji})
+        return self.add_kaomoji(kaomoji)
 
-        return self.kaomojis[kaomoji.code]
+    def merge(self, base, other) -> tuple[dict[str, int],
+                                          list[MergeConflict]]:
+        """Three-way merges `other` into this database, `base` being the
+            version both were edited from; see `merge_into`.
+        """
+
+        return merge_into(database=self, base=base, other=other)
 
     def query(self, query):
+        """Gets the kaomojis having some keyword which starts with `query`.
+
+        Uses the keyword index, so it costs time proportional to the number
+            of matches instead of scanning every entry.
+        """
+
         results = dict()
 
-        for code, kaomoji in self.kaomojis.items():
-            if kaomoji.matches_query(query):
-                results.update({code: kaomoji})
+        for entry_id in self.keyword_index.query(query):
+            kaomoji = self.entries[entry_id]
+            results.update({kaomoji.code: kaomoji})
 
         return results
 
-    def compare(self, other, diff_type="additional") -> dict[str: Kaomoji]:
-        """Compares two KaomojiDB instances."""
+    def query_all(self, keywords: Union[str, list]) -> dict[str, Kaomoji]:
+        """Gets the kaomojis having all of `keywords`, eg. 'happy, cat', in
+            database order; the keywords are matched whole.
+        """
 
-        if not isinstance(other, KaomojiDB):
-            raise TypeError("other is not a KaomojiDB")
+        return {kaomoji.code: kaomoji for kaomoji in (
+            self.entries[entry_id] for entry_id in self.keyword_index.query_all(
+                Kaomoji._to_keyword_list(keywords)))}
 
-        other_extra_dict = dict()
-        self_extra_dict = dict()
-        difference_dict = dict()
+    def query_substring(self, substring: str,
+                        limit: int = DEFAULT_SEARCH_LIMIT)\
+                                                    -> dict[str, Kaomoji]:
+        """Gets the kaomojis having some of the best `limit` keywords which
+            contain `substring`, eg. "ppy" for "happy", in the order of the
+            keywords: the ones starting with it first, then the shortest,
+            then the most used.
 
-        # other_extra - other has and self doesn't
-        for kaomoji_code in other.kaomojis:
-            if kaomoji_code not in self.kaomojis:
-                other_extra_kaomoji = other.kaomojis[kaomoji_code]
-                other_extra_dict.update({kaomoji_code: other_extra_kaomoji})
+        Uses the trigram index of the keywords, built on the first substring
+            or fuzzy query after a load and then kept up to date on edits.
+        """
 
-            else:
-                for keyword in other.kaomojis[kaomoji_code].keywords:
-                    if not keyword in self.kaomojis[kaomoji_code].keywords:
-                        if not kaomoji_code in other_extra_dict:
-                            other_extra_kaomoji = Kaomoji(code=kaomoji_code, keywords=list())
-                            other_extra_dict.update({kaomoji_code: other_extra_kaomoji})
-                        other_extra_dict[kaomoji_code].keywords.append(keyword)
-
-        # self_extra - self has and other doesn't
-        for kaomoji_code in self.kaomojis:
-            if kaomoji_code not in other.kaomojis:
-                self_extra_kaomoji = self.kaomojis[kaomoji_code]
-                self_extra_dict.update({kaomoji_code: self_extra_kaomoji})
+        return self._query_keywords(
+            self.keyword_index.keywords_containing(substring, limit=limit))
 
-            else:
-                for keyword in self.kaomojis[kaomoji_code].keywords:
-                    if not keyword in other.kaomojis[kaomoji_code].keywords:
-                        if not kaomoji_code in self_extra_dict:
-                            self_extra_kaomoji = Kaomoji(code=kaomoji_code, keywords=list())
-                            self_extra_dict.update({kaomoji_code: self_extra_kaomoji})
-                        self_extra_dict[kaomoji_code].keywords.append(keyword)
-
-        # difference between both
-        difference_dict.update(other_extra_dict)
-        difference_dict.update(self_extra_dict)
-
-        diff_types = {
-            "additional": other_extra_dict,
-            "difference": difference_dict,
-            "exclusive": self_extra_dict,
-        }
-
-        return diff_types[diff_type]
+    def query_fuzzy(self, keyword: str, max_distance: int = 1,
+                    limit: int = DEFAULT_SEARCH_LIMIT) -> dict[str, Kaomoji]:
+        """Gets the kaomojis having some of the best `limit` keywords at most
+            `max_distance` edits (insertions, deletions or substitutions of
+            a character) away from `keyword`, eg. "happy" for "hapy", in the
+            order of the keywords: the closest first, then the most used.
+
+        Uses the trigram index of the keywords, like `query_substring`; only
+            the keywords sharing enough trigrams with `keyword` are compared
+            to it, unless it is too short for any to be left after
+            `max_distance` edits.
+        """
+
+        return self._query_keywords(self.keyword_index.keywords_near(
+            keyword, max_distance=max_distance, limit=limit))
+
+    def _query_keywords(self, keywords: list[str]) -> dict[str, Kaomoji]:
+        return {kaomoji.code: kaomoji for kaomoji in (
+            self.entries[entry_id] for entry_id
+            in self.keyword_index.query_keywords(keywords))}
+
+    def keyword_count(self, keyword: str) -> int:
+        """The number of kaomojis having `keyword`."""
+
+        return self.keyword_index.keyword_count(keyword)
+
+    def _index_kaomoji(self, kaomoji: Kaomoji,
+                       entry_id: Union[int, None] = None) -> None:
+        """Registers a kaomoji stored in `self.kaomojis` in the indexes,
+            with the entry id of the kaomoji it replaces, if any, else a new
+            one.
+        """
+
+        if entry_id is None:
+            entry_id = len(self.entries)
+            self.entries.append(kaomoji)
+        else:
+            self.entries[entry_id] = kaomoji
+
+        kaomoji._database = self
+        kaomoji._entry_id = entry_id
+        self.keyword_index.add(entry_id, kaomoji.keywords)
+        if self._hash_index is not None:
+            self._hash_index.update({kaomoji.hash: kaomoji})
+
+    def _unindex_kaomoji(self, kaomoji: Union[Kaomoji, None])\
+                                                        -> Union[int, None]:
+        """Drops a kaomoji from the indexes; does nothing for None.
+
+        Returns:
+            the entry id it had, free to be given to a kaomoji replacing it.
+        """
+
+        if kaomoji is None:
+            return None
+
+        entry_id = kaomoji._entry_id
+        self.keyword_index.remove(entry_id, kaomoji.keywords)
+        self.entries[entry_id] = None
+
+        if self._hash_index is not None and\
+                self._hash_index.get(kaomoji.hash) is kaomoji:
+            del self._hash_index[kaomoji.hash]
+
+        if kaomoji._database is self:
+            kaomoji._database = None
+            kaomoji._entry_id = None
+
+        return entry_id
+
+    def _reindex_keywords(self, kaomoji: Kaomoji, added=(), removed=()) -> None:
+        """Called by the Kaomoji keyword mutators of registered kaomojis."""
+
+        if self.kaomojis.get(kaomoji.code) is not kaomoji:
+            return
+
+        self.keyword_index.add(kaomoji._entry_id, added)
+        self.keyword_index.remove(kaomoji._entry_id, removed)
+
+        if added:
+            self._record(JOURNAL_KEYWORDS_ADD, kaomoji.code, added)
+        if removed:
+            self._record(JOURNAL_KEYWORDS_REMOVE, kaomoji.code, removed)
+
+    def _record(self, operation: str, code: str, keywords=()) -> None:
+        """Keeps an edit to be appended to the journal by `write`."""
+
+        if self.use_journal:
+            self._pending.append(format_record(operation, code, keywords))
+
+    def compare(self, other, diff_type="additional") -> dict[str: Kaomoji]:
+        """Compares two KaomojiDB instances; see `compare_databases`.
+
+        `other` can be any database with a `kaomojis` mapping, like a
+            KaomojiSQLiteDB.
+        """
+
+        if not isinstance(getattr(other, "kaomojis", None), Mapping):
+            raise TypeError("other is not a KaomojiDB")
+
+        return compare_databases(kaomojis=self.kaomojis,
+                                 other_kaomojis=other.kaomojis,
+                                 diff_type=diff_type)
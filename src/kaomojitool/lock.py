@@ -0,0 +1,131 @@
+import fcntl
+import os
+import time
+from typing import Union
+
+LOCK_SUFFIX = ".lock"
+LOCK_POLL_INTERVAL = 0.05  # seconds between tries to take a lock, with timeout
+
+
+class KaomojiDBLockTimeout(Exception):
+    description="Timed out waiting for the lock of the database file"
+    def __init__(self, *args, **kwargs):
+        super().__init__(self.description, *args, **kwargs)
+
+
+def lock_filename(filename: str) -> str:
+    """The file locked for the db file `filename`."""
+
+    return filename + LOCK_SUFFIX
+
+
+class DatabaseLock:
+    """An advisory lock on a db file, for read-modify-write cycles.
+
+    It is a flock(2) on a sidecar file, as the db file itself is replaced
+        when written and a lock on it would stay on the replaced file. The
+        kernel releases it if the process dies. It isn't reentrant: taking
+        it twice in a process, even through two instances, blocks.
+
+        with DatabaseLock("emoticons.tsv"):
+            database = KaomojiDB(filename="emoticons.tsv")
+            ...
+            database.write()
+    """
+
+    def __init__(self, filename: str, shared: bool = False,
+                 timeout: Union[float, None] = None) -> None:
+        """
+        Args:
+            filename (str): the db file.
+            shared (bool): take a shared lock, for readers, instead of an
+                exclusive one.
+            timeout (float): seconds to wait for the lock before raising
+                KaomojiDBLockTimeout; None waits for as long as it takes.
+        """
+
+        self.filename = filename
+        self.shared = shared
+        self.timeout = timeout
+        self._fd = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Takes the lock; without `blocking`, only if it is free.
+
+        Returns:
+            True if the lock was taken.
+        """
+
+        if self._fd is not None:
+            raise RuntimeError("the lock is already held")
+
+        fd = os.open(lock_filename(self.filename), os.O_RDWR | os.O_CREAT,
+                     0o666)
+        operation = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+
+        try:
+            if blocking and self.timeout is None:
+                fcntl.flock(fd, operation)
+                taken = True
+            else:
+                taken = self._poll(fd, operation, blocking)
+        except BaseException:
+            os.close(fd)
+            raise
+
+        if not taken:
+            os.close(fd)
+            return False
+
+        self._fd = fd
+
+        return True
+
+    def _poll(self, fd: int, operation: int, blocking: bool) -> bool:
+        """Tries to take the lock until `timeout`, or once if not
+            `blocking`.
+        """
+
+        deadline = time.monotonic() + (self.timeout or 0)
+
+        while True:
+            try:
+                fcntl.flock(fd, operation | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if not blocking:
+                    return False
+
+                if time.monotonic() >= deadline:
+                    raise KaomojiDBLockTimeout(self.filename)
+
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self) -> None:
+        """Releases the lock, if held."""
+
+        if self._fd is None:
+            return
+
+        fd, self._fd = self._fd, None
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def __enter__(self) -> "DatabaseLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def __repr__(self):
+        return "<DatabaseLock `{}'; {}{}>".format(
+            self.filename, "shared" if self.shared else "exclusive",
+            ", held" if self.locked else "")
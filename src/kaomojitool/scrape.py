@@ -0,0 +1,469 @@
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Iterator, Union
+from urllib.parse import urlsplit
+
+from lxml import etree
+from lxml import html
+import requests
+
+from .httpcache import HTTPCache
+from .httpcache import content_digest
+
+# this module is imported only by the scrape command: lxml and requests
+# take most of the startup time of the other commands otherwise
+
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 10.0  # seconds to connect, and between bytes received
+DEFAULT_RETRIES = 3
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_BACKOFF = 0.5  # seconds; doubled at each retry
+RETRY_AFTER_MAX = 60.0  # seconds; longer Retry-After waits are cut to this
+
+# requests in flight per worker; bounds the memory used by pages fetched
+# but not consumed yet
+QUEUE_FACTOR = 2
+
+HTTP_SCHEMES = ("http", "https")
+
+UTF8_HTML_PARSER = html.HTMLParser(encoding="utf-8")
+
+# runs of HTML whitespace, which a browser renders as one space; unlike
+# str.split(), no-break spaces are left alone, as kaomojis use them
+HTML_WHITESPACE = re.compile(r"[ \t\n\r\f]+")
+
+# keywords with these would break a db line; commas separate keywords
+UNSAFE_KEYWORD_CHARACTERS = ("\t", "\n", "\r")
+KEYWORD_SEPARATOR = ","
+
+
+class HostRateLimiter:
+    """Spaces the requests to each host by at least 1/`rate` seconds,
+        across all the threads using it.
+    """
+
+    def __init__(self, rate: Union[float, None] = None):
+        """
+        Args:
+            rate (float): requests per second to each host; None or 0 for
+                no limit.
+        """
+
+        self.interval = 1 / rate if rate else 0
+        self._next_slots = dict()  # host: monotonic time of its next request
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        """Blocks until a request to the host of `url` is allowed."""
+
+        if not self.interval:
+            return
+
+        host = urlsplit(url).netloc
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slots.get(host, now))
+            self._next_slots[host] = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Page:
+    """A page fetched.
+
+    Attributes:
+        url (str): the URL of the page, or the name of a local HTML file.
+        content (bytes): the content, or None if the server answered 304 Not
+            Modified to a conditional request; it is then in the cache.
+        digest (str): the content digest, if there is a cache.
+        unchanged (bool): the page is the same as the cached one, either
+            not modified or with the same content digest.
+    """
+
+    __slots__ = ("url", "content", "digest", "unchanged")
+
+    def __init__(self, url: str, content: Union[bytes, None],
+                 digest: Union[str, None] = None, unchanged: bool = False):
+
+        self.url = url
+        self.content = content
+        self.digest = digest
+        self.unchanged = unchanged
+
+    def __repr__(self):
+        return "<Page `{}'; unchanged: {}>".format(self.url, self.unchanged)
+
+
+class Scraper:
+    """Fetches pages concurrently with a pool of worker threads.
+
+    Each worker has its own requests.Session, so connections to a host are
+        kept alive and reused from page to page; sessions aren't shared,
+        as requests doesn't make them thread safe. Failed connections and
+        the RETRY_STATUSES responses are retried with exponential backoff,
+        following Retry-After when the server sends it; every attempt,
+        retries included, waits for its turn with the rate limiter.
+
+    With an HTTPCache, pages already cached are requested conditionally,
+        with their ETag and Last-Modified, and the texts extracted from a
+        page are reused while its content doesn't change.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES,
+                 rate_limit: Union[float, None] = None,
+                 cache: Union[HTTPCache, None] = None):
+        """
+        Args:
+            workers (int): number of pages fetched at the same time.
+            timeout (float): seconds to wait to connect, and for each read.
+            retries (int): times a failed request is retried.
+            rate_limit (float): requests per second to each host.
+            cache (HTTPCache): the cache of the pages and extracted texts.
+        """
+
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.rate_limiter = HostRateLimiter(rate=rate_limit)
+        self.cache = cache
+
+        self._local = threading.local()
+        self._sessions = list()
+        self._sessions_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+
+            self._sessions.clear()
+
+    @property
+    def session(self) -> requests.Session:
+        """The session of the current thread."""
+
+        session = getattr(self._local, "session", None)
+
+        if session is None:
+            session = self._local.session = self._make_session()
+
+            with self._sessions_lock:
+                self._sessions.append(session)
+
+        return session
+
+    def _make_session(self) -> requests.Session:
+        return requests.Session()
+
+    def get(self, url: str, headers: Union[dict, None] = None)\
+                                                    -> requests.Response:
+        """GETs `url` in the current thread, retrying failed connections
+            and the RETRY_STATUSES responses up to `retries` times.
+
+        Returns:
+            the response; the last one if all the attempts got a
+                RETRY_STATUSES response.
+
+        Raises:
+            requests.RequestException: if the last attempt couldn't connect
+                or timed out.
+        """
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            self.rate_limiter.wait(url)
+
+            try:
+                response = self.session.get(url, timeout=self.timeout,
+                                            headers=headers)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+
+                delay = None
+            else:
+                if (response.status_code not in RETRY_STATUSES or
+                        last_attempt):
+                    return response
+
+                delay = retry_after(response)
+                response.close()
+
+            if delay is None:
+                delay = RETRY_BACKOFF * 2 ** attempt
+
+            time.sleep(delay)
+
+    def fetch(self, url: str, conditional: bool = True) -> Page:
+        """Fetches a page in the current thread; `url` can also be a local
+            file, as a file name or a file:// URL.
+
+        Raises:
+            requests.RequestException: if the page couldn't be fetched after
+                the retries, or the response status is an error.
+            OSError: if a local file couldn't be read.
+        """
+
+        split_url = urlsplit(url)
+
+        if split_url.scheme not in HTTP_SCHEMES:
+            return self.read_file(url if split_url.scheme != "file"
+                                  else split_url.path)
+
+        cached = self.cache.get_response(url)\
+            if self.cache and conditional else None
+        headers = cached.conditional_headers() if cached else None
+
+        response = self.get(url, headers=headers)
+
+        if cached and response.status_code == 304:
+            self.cache.touch(url)
+
+            return Page(url=url, content=None, digest=cached.digest,
+                        unchanged=True)
+
+        response.raise_for_status()
+
+        if not self.cache:
+            return Page(url=url, content=response.content)
+
+        digest = self.cache.put_response(
+            url=url, content=response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified")).digest
+
+        return Page(url=url, content=response.content, digest=digest,
+                    unchanged=bool(cached) and cached.digest == digest)
+
+    def read_file(self, filename: str) -> Page:
+        """Reads a local HTML file as a page; it isn't stored in the cache,
+            but its extractions are.
+        """
+
+        with open(filename, "rb") as html_file:
+            content = html_file.read()
+
+        digest = content_digest(content) if self.cache else None
+
+        return Page(url=filename, content=content, digest=digest)
+
+    def extract(self, page: Page, extractor: "XPathExtractor")\
+                                            -> list[tuple[str, list[str]]]:
+        """The entries `extractor` finds in a page; cached by content
+            digest, so pages seen before aren't parsed.
+        """
+
+        if not self.cache:
+            return extractor.extract(page.content)
+
+        entries = self.cache.get_extraction(page.digest, extractor.key)
+
+        if entries is not None:  # JSON arrays; as extracted, (code, keywords)
+            return [(code, keywords) for code, keywords in entries]
+
+        content = page.content
+
+        if content is None:
+            content = self.cache.get_body(page.url)
+
+        if content is None:  # evicted since the conditional request
+            page = self.fetch(page.url, conditional=False)
+            content = page.content
+
+        entries = extractor.extract(content)
+        self.cache.put_extraction(page.digest, extractor.key, entries)
+
+        return entries
+
+    def iter_fetch(self, urls: Iterable[str])\
+            -> Iterator[tuple[str, Union[Page, None], Union[Exception, None]]]:
+        """Fetches the pages concurrently, yielding them as they finish.
+
+        Yields:
+            (url, Page, None) for each page fetched, and
+                (url, None, error) for each page that failed, in the order
+                they finish.
+        """
+
+        urls = iter(urls)
+        max_pending = self.workers * QUEUE_FACTOR
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = dict()  # future: url
+
+            while True:
+                for url in urls:
+                    pending[executor.submit(self.fetch, url)] = url
+
+                    if len(pending) >= max_pending:
+                        break
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    url = pending.pop(future)
+                    error = future.exception()
+
+                    if error is None:
+                        yield url, future.result(), None
+                    else:
+                        yield url, None, error
+
+
+def retry_after(response: requests.Response) -> Union[float, None]:
+    """The seconds the Retry-After header of a response asks to wait, at
+        most RETRY_AFTER_MAX; None if there is no valid one.
+    """
+
+    value = response.headers.get("Retry-After")
+
+    if not value:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+
+    return min(max(seconds, 0.0), RETRY_AFTER_MAX)
+
+
+def parse_html(content: bytes):
+    """Parses a page as UTF-8 if it is valid UTF-8; lxml would take pages
+        without a charset declaration as Latin-1 otherwise.
+    """
+
+    try:
+        content.decode("utf-8")
+    except UnicodeDecodeError:
+        return html.fromstring(content)
+
+    return html.fromstring(content, parser=UTF8_HTML_PARSER)
+
+
+def text_of(result) -> str:
+    """The text of an XPath result: an element, or a string for text() and
+        attribute steps; with its whitespace collapsed like a browser does,
+        so a line break in the markup doesn't end up in a db line.
+    """
+
+    text = str(result) if isinstance(result, str) else result.text_content()
+
+    return HTML_WHITESPACE.sub(" ", text).strip()
+
+
+def split_keywords(keywords: Iterable[str]) -> list[str]:
+    """Splits the scraped keywords having commas into the keywords they
+        stand for in a db line, dropping the ones which can't be in one.
+    """
+
+    return [keyword.strip() for text in keywords
+            for keyword in text.split(KEYWORD_SEPARATOR)
+            if keyword.strip() and not any(character in keyword for character
+                                           in UNSAFE_KEYWORD_CHARACTERS)]
+
+
+class XPathExtractor:
+    """Extracts kaomoji entries from pages via XPath.
+
+    Without a container XPath, each element matching the kaomoji XPath is a
+        kaomoji without keywords. With one, each container element matching
+        it gives an entry: the kaomoji is the first match of the kaomoji
+        XPath and the keywords are all the matches of the keywords XPath,
+        both evaluated relative to the container, eg.:
+            container: //tr
+            kaomoji: ./td[1]
+            keywords: ./td[2]//a
+    """
+
+    # https://devhints.io/xpath
+
+    def __init__(self, kaomoji_xpath: str,
+                 keywords_xpath: Union[str, None] = None,
+                 container_xpath: Union[str, None] = None):
+        """
+        Raises:
+            ValueError: if there is a keywords XPath without a container one,
+                or an XPath is invalid.
+        """
+
+        if keywords_xpath and not container_xpath:
+            raise ValueError("the keywords XPath needs a container XPath")
+
+        try:
+            self.kaomoji_xpath = etree.XPath(kaomoji_xpath)
+            self.keywords_xpath = etree.XPath(keywords_xpath)\
+                if keywords_xpath else None
+            self.container_xpath = etree.XPath(container_xpath)\
+                if container_xpath else None
+        except etree.XPathSyntaxError as error:
+            raise ValueError("invalid XPath: {}".format(error))
+
+        # identifies the extraction in the cache
+        self.key = "\x1f".join((container_xpath or "", kaomoji_xpath,
+                                keywords_xpath or ""))
+
+    def extract(self, content: bytes) -> list[tuple[str, list[str]]]:
+        """The (kaomoji, keywords) entries of a page, in page order; entries
+            without kaomoji text are left out.
+        """
+
+        tree = parse_html(content)
+
+        if not self.container_xpath:
+            entries = [(text_of(result), list())
+                       for result in self.kaomoji_xpath(tree)]
+        else:
+            entries = [self._extract_container(container)
+                       for container in self.container_xpath(tree)]
+
+        return [entry for entry in entries if entry[0]]
+
+    def _extract_container(self, container) -> tuple[str, list[str]]:
+        results = self.kaomoji_xpath(container)
+
+        if not results:
+            return str(), list()
+
+        keywords = list()
+
+        if self.keywords_xpath:
+            keywords = [text_of(result)
+                        for result in self.keywords_xpath(container)]
+
+        return text_of(results[0]), [keyword for keyword in keywords
+                                     if keyword]
+
+
+def merge_entries(entries: Iterable[tuple[str, list[str]]])\
+                                                -> dict[str, list[str]]:
+    """Merges the keywords of repeated kaomojis, keeping the first order."""
+
+    merged = dict()
+
+    for code, keywords in entries:
+        merged.setdefault(code, list()).extend(keywords)
+
+    return merged
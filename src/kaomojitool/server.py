@@ -0,0 +1,239 @@
+import os
+import signal
+import socketserver
+import threading
+import time
+from typing import Callable, Union
+
+from .client import KaomojiClient
+from .client import decode_message
+from .client import encode_message
+from .client import kaomoji_from_message
+from .client import kaomoji_to_message
+from .kaomoji import Kaomoji
+from .kaomoji import lookup_kaomoji
+from .stats import DatabaseStats
+
+DEFAULT_FLUSH_INTERVAL = 5.0  # seconds an edit can wait before being written
+# seconds a connection can be idle before it is closed, ending its thread;
+# the clients reconnect on their next request
+IDLE_TIMEOUT = 60.0
+
+
+class KaomojiServerRunning(Exception):
+    description="A kaomoji server is already running on the socket"
+    def __init__(self, *args, **kwargs):
+        super().__init__(self.description, *args, **kwargs)
+
+
+class KaomojiRequestHandler(socketserver.StreamRequestHandler):
+    """Answers the requests of a connection, one line each, until the
+        client closes it or is idle for IDLE_TIMEOUT seconds.
+    """
+
+    timeout = IDLE_TIMEOUT  # set on the socket by StreamRequestHandler
+
+    def handle(self):
+        try:
+            for line in self.rfile:
+                self.wfile.write(encode_message(self.server.respond(line)))
+                self.wfile.flush()
+        except TimeoutError:  # an abandoned connection
+            pass
+
+
+class KaomojiServer(socketserver.ThreadingUnixStreamServer):
+    """Serves a database loaded once over a Unix socket; see the protocol in
+        the client module.
+
+    Each connection is served in a thread of its own, so a client idle
+        between requests holds up no other; the requests and the flushes
+        take `lock` to use the database, one at a time. Edits are applied in
+        memory and written in a batch, by one `write` of the database, at
+        most `flush_interval` seconds after the first of them, and when the
+        server stops.
+    """
+
+    daemon_threads = True  # idle connections don't keep the server running
+
+    def __init__(self, database, socket_filename: str,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 before_edits: Union[Callable[[], None], None] = None):
+        """
+        Args:
+            database (KaomojiDB | KaomojiSQLiteDB): the loaded database.
+            socket_filename (str): the Unix socket to listen on.
+            flush_interval (float): seconds between an edit and the write of
+                the database.
+            before_edits (callable): called before the first edit of each
+                batch, eg. to back up the database file; not before the
+                write, as the SQLite backend commits edits as they are made.
+
+        Raises:
+            KaomojiServerRunning: if another server listens on the socket.
+        """
+
+        client = KaomojiClient.connect(socket_filename=socket_filename)
+
+        if client:
+            client.close()
+            raise KaomojiServerRunning(socket_filename)
+
+        if os.path.exists(socket_filename):  # left by a dead server
+            os.remove(socket_filename)
+
+        self.database = database
+        self.lock = threading.Lock()
+        self.flush_interval = flush_interval
+        self.before_edits = before_edits
+        self.pending_edits = 0
+        self.first_edit_time = None
+
+        self.commands = {
+            "query": self.query,
+            "query_all": self.query_all,
+            "query_substring": self.query_substring,
+            "query_fuzzy": self.query_fuzzy,
+            "get": self.get,
+            "add": self.add,
+            "kwadd": self.kwadd,
+            "kwrm": self.kwrm,
+            "dbstatus": self.dbstatus,
+        }
+
+        super().__init__(socket_filename, KaomojiRequestHandler)
+
+    def serve(self, poll_interval: float = 0.5) -> None:
+        """Serves until interrupted or terminated, then writes the pending
+            edits and removes the socket.
+        """
+
+        def terminate(signum, frame):
+            raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, terminate)
+
+        try:
+            self.serve_forever(poll_interval=min(poll_interval,
+                                                 self.flush_interval))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.flush()
+            self.server_close()
+            os.remove(self.server_address)
+
+    def service_actions(self) -> None:
+        """Called by serve_forever between requests; flushes the edits
+            waiting for longer than `flush_interval`.
+        """
+
+        with self.lock:
+            due = self.pending_edits and\
+                time.monotonic() - self.first_edit_time >= self.flush_interval
+
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the pending edits to the database file."""
+
+        with self.lock:
+            if not self.pending_edits:
+                return
+
+            self.database.write()
+            self.pending_edits = 0
+            self.first_edit_time = None
+
+    def respond(self, line: bytes) -> dict:
+        try:
+            request = decode_message(line)
+            command = self.commands[request["command"]]
+
+            with self.lock:
+                result = command(**request.get("args", dict()))
+        except Exception as error:
+            return {"ok": False, "error": "{}: {}".format(
+                type(error).__name__, error)}
+
+        return {"ok": True, "result": result}
+
+    def _editing(self) -> None:
+        """Called before an edit."""
+
+        if not self.pending_edits and self.before_edits:
+            self.before_edits()
+
+    def _edited(self) -> None:
+        if not self.pending_edits:
+            self.first_edit_time = time.monotonic()
+
+        self.pending_edits += 1
+
+    def _get_or_add(self, code: str) -> Kaomoji:
+        kaomoji = self.database.get_kaomoji(by_entity=code)
+
+        if not kaomoji:
+            kaomoji = self.database.add_kaomoji(Kaomoji(code=code))
+
+        return kaomoji
+
+    def query(self, query_string: str) -> list:
+        return [kaomoji_to_message(kaomoji) for kaomoji
+                in self.database.query(query_string).values()]
+
+    def query_all(self, keywords: list) -> list:
+        return [kaomoji_to_message(kaomoji) for kaomoji
+                in self.database.query_all(keywords).values()]
+
+    def query_substring(self, substring: str, limit: int) -> list:
+        return [kaomoji_to_message(kaomoji) for kaomoji in
+                self.database.query_substring(substring, limit=limit).values()]
+
+    def query_fuzzy(self, keyword: str, max_distance: int, limit: int) -> list:
+        matches = self.database.query_fuzzy(keyword, max_distance=max_distance,
+                                            limit=limit)
+
+        return [kaomoji_to_message(kaomoji) for kaomoji in matches.values()]
+
+    def get(self, by_entity: str) -> Union[list, None]:
+        return kaomoji_to_message(lookup_kaomoji(self.database, by_entity))
+
+    def add(self, kaomojis: list) -> dict:
+        self._editing()
+        report = self.database.ingest(map(kaomoji_from_message, kaomojis))
+
+        if report["added"] or report["updated"]:
+            self._edited()
+
+        return report
+
+    def kwadd(self, code: str, keywords: list) -> list:
+        self._editing()
+        kaomoji = self._get_or_add(code)
+        kaomoji.add_keywords(keywords=keywords)
+        kaomoji = self.database.update_kaomoji(kaomoji)
+        self._edited()
+
+        return kaomoji_to_message(kaomoji)
+
+    def kwrm(self, code: str, keywords: list) -> list:
+        self._editing()
+        kaomoji = self._get_or_add(code)
+        kaomoji.remove_keywords(keywords=keywords)
+        kaomoji = self.database.update_kaomoji(kaomoji)
+        self._edited()
+
+        return kaomoji_to_message(kaomoji)
+
+    def dbstatus(self, stats: bool = False) -> dict:
+        status = {"database_filename": self.database.filename,
+                  "number_of_kaomojis": len(self.database.kaomojis),
+                  "pending_edits": self.pending_edits}
+
+        if stats:  # of the database in memory, with the pending edits
+            status["stats"] = DatabaseStats.from_database(self.database)\
+                .to_dict()
+
+        return status
@@ -0,0 +1,90 @@
+import marshal
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterator
+
+from .kaomoji import parse_line_entry
+
+SHARDS_PER_WORKER = 4  # smaller shards even out the work between workers
+
+
+def shard_offsets(filename: str, shards: int) -> list[tuple[int, int]]:
+    """Splits a file into about `shards` (start, end) byte ranges, each
+        ending right after a newline, or at the end of the file.
+    """
+
+    size = os.path.getsize(filename)
+    boundaries = [0]
+
+    with open(filename, "rb") as db_file:
+        for shard in range(1, shards):
+            # from one byte before, so a line starting at the offset is kept
+            db_file.seek(max(size * shard // shards - 1, 0))
+            db_file.readline()
+            boundary = db_file.tell()
+
+            if boundaries[-1] < boundary < size:
+                boundaries.append(boundary)
+
+    boundaries.append(size)
+
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def parse_lines(text: str) -> tuple[list[str], list[tuple[str, ...]]]:
+    """Parses the line entries of a text, as KaomojiDB.iter_file reads them.
+
+    Returns:
+        the codes and the keyword tuples of the entries, as parallel lists,
+            in line order and with repeated codes, blank lines left out.
+    """
+
+    codes = list()
+    keywords = list()
+
+    # universal newlines, like a file opened in text mode
+    for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        if not line.strip():
+            continue
+
+        code, code_keywords = parse_line_entry(line)
+        codes.append(code)
+        keywords.append(code_keywords)
+
+    return codes, keywords
+
+
+def parse_shard(filename: str, start: int, end: int, encoding: str) -> bytes:
+    """Parses a byte range of a db file in a worker process.
+
+    Returns:
+        the `parse_lines` lists, marshaled; marshal keeps the keywords
+            interned and shared, and is faster than pickle for them.
+    """
+
+    with open(filename, "rb") as db_file:
+        db_file.seek(start)
+        text = db_file.read(end - start).decode(encoding)
+
+    return marshal.dumps(parse_lines(text))
+
+
+def iter_parsed_shards(filename: str, workers: int,
+                       encoding: str = "utf-8")\
+                            -> Iterator[tuple[list[str], list[tuple[str, ...]]]]:
+    """Parses a db file in `workers` processes, shard by shard.
+
+    Yields:
+        the `parse_lines` lists of each shard, in file order; the first ones
+            are yielded while the next ones are being parsed.
+    """
+
+    offsets = shard_offsets(filename, workers * SHARDS_PER_WORKER)
+    starts = [start for start, _ in offsets]
+    ends = [end for _, end in offsets]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for shard in executor.map(parse_shard, repeat(filename), starts, ends,
+                                  repeat(encoding)):
+            yield marshal.loads(shard)
@@ -0,0 +1,120 @@
+import marshal
+import os
+from array import array
+from hashlib import sha256
+from typing import Union
+
+from .index import KeywordDictionary
+from .index import POSTING_TYPECODE
+
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_MAGIC = "kaomojitool-snapshot"
+SNAPSHOT_VERSION = 2
+
+# layout: header length (4 bytes, big endian), marshaled header, marshaled body
+HEADER_LENGTH_SIZE = 4
+
+
+def snapshot_filename(filename: str) -> str:
+    """The sidecar file holding the snapshot of a db file."""
+
+    return filename + SNAPSHOT_SUFFIX
+
+
+def file_key(filename: str, with_digest: bool = True) -> tuple:
+    """Gives (absolute path, size, mtime in ns, sha256 of the contents) of a
+        file; the digest is left as None if `with_digest` is False.
+    """
+
+    stat = os.stat(filename)
+    digest = file_digest(filename) if with_digest else None
+
+    return (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns, digest)
+
+
+def file_digest(filename: str) -> str:
+    """The sha256 hex digest of the contents of a file, read in chunks."""
+
+    hasher = sha256()
+
+    with open(filename, "rb") as the_file:
+        for chunk in iter(lambda: the_file.read(1 << 20), b""):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def read_snapshot(filename: str) -> Union[tuple, None]:
+    """Reads the snapshot of the db file `filename`.
+
+    Returns:
+        (codes, keywords, dictionary, postings, sorted_keywords) if a
+            snapshot exists and was made from the current contents of
+            `filename`, else None; see `write_snapshot`.
+    """
+
+    try:
+        with open(snapshot_filename(filename), "rb") as snapshot_file:
+            header_length = int.from_bytes(
+                snapshot_file.read(HEADER_LENGTH_SIZE), "big")
+            magic, version, key = marshal.loads(
+                snapshot_file.read(header_length))
+
+            if (magic, version) != (SNAPSHOT_MAGIC, SNAPSHOT_VERSION):
+                return None
+
+            # cheap checks first; the digest catches same size/mtime edits
+            if key[:3] != file_key(filename, with_digest=False)[:3]:
+                return None
+
+            if key != file_key(filename):
+                return None
+
+            # marshal.load() on a file is slow; read the body in one go
+            codes, keywords, dictionary_keywords, postings, sorted_keywords =\
+                marshal.loads(snapshot_file.read())
+
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    postings = {keyword_id: array(POSTING_TYPECODE, posting)
+                for keyword_id, posting in postings.items()}
+
+    return (codes, keywords, KeywordDictionary(dictionary_keywords), postings,
+            sorted_keywords)
+
+
+def write_snapshot(filename: str, codes: list, keywords: list,
+                   dictionary: KeywordDictionary, postings: dict,
+                   sorted_keywords: list) -> None:
+    """Writes the snapshot of the db file `filename` atomically.
+
+    Flat lists load much faster than lists of pairs or dicts of dicts, so
+        the entries are stored as two parallel lists, and the postings as
+        the raw bytes of their arrays.
+
+    Args:
+        codes (list): the kaomoji codes, in database order; the entry id of
+            each one is its position.
+        keywords (list): the keywords tuple of each of `codes`.
+        dictionary (KeywordDictionary): the keyword ids of `postings`.
+        postings (dict): the KeywordIndex postings.
+        sorted_keywords (list): the keywords of `postings`, sorted.
+    """
+
+    header = marshal.dumps((SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                            file_key(filename)))
+    body = (codes, keywords, dictionary.keywords,
+            {keyword_id: posting.tobytes()
+             for keyword_id, posting in postings.items()},
+            sorted_keywords)
+
+    temp_filename = snapshot_filename(filename) + ".tmp"
+
+    with open(temp_filename, "wb") as snapshot_file:
+        snapshot_file.write(len(header).to_bytes(HEADER_LENGTH_SIZE, "big"))
+        snapshot_file.write(header)
+        marshal.dump(body, snapshot_file)
+
+    os.replace(temp_filename, snapshot_filename(filename))
+
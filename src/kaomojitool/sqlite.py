@@ -0,0 +1,526 @@
+import sqlite3
+from collections.abc import Mapping
+from itertools import groupby
+from sys import intern
+from typing import Iterable, Iterator, Union
+
+from .index import DEFAULT_SEARCH_LIMIT
+from .index import rank_fuzzy_matches
+from .index import rank_substring_matches
+from .kaomoji import Kaomoji
+from .kaomoji import KaomojiDB
+from .kaomoji import MergeConflict
+from .kaomoji import compare_databases
+from .kaomoji import merge_into
+from .kaomoji import normalize_hash
+from .kaomoji import shortcode_to_code
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kaomoji (
+    id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE,
+    hash TEXT NOT NULL UNIQUE,
+    shortcode TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS keyword (
+    id INTEGER PRIMARY KEY,
+    keyword TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS kaomoji_keyword (
+    kaomoji_id INTEGER NOT NULL REFERENCES kaomoji (id) ON DELETE CASCADE,
+    keyword_id INTEGER NOT NULL REFERENCES keyword (id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (kaomoji_id, keyword_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS kaomoji_keyword_keyword_id
+    ON kaomoji_keyword (keyword_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS keyword_fts
+    USING fts5 (keyword, content='keyword', content_rowid='id');
+
+CREATE TRIGGER IF NOT EXISTS keyword_fts_insert AFTER INSERT ON keyword
+BEGIN
+    INSERT INTO keyword_fts (rowid, keyword) VALUES (new.id, new.keyword);
+END;
+
+CREATE TRIGGER IF NOT EXISTS keyword_fts_delete AFTER DELETE ON keyword
+BEGIN
+    INSERT INTO keyword_fts (keyword_fts, rowid, keyword)
+        VALUES ('delete', old.id, old.keyword);
+END;
+"""
+
+# rows of kaomoji id, code and keyword, in database and keyword order
+SELECT_ENTRIES = """
+SELECT kaomoji.id, kaomoji.code, keyword.keyword
+    FROM kaomoji
+    LEFT JOIN kaomoji_keyword ON kaomoji_keyword.kaomoji_id = kaomoji.id
+    LEFT JOIN keyword ON keyword.id = kaomoji_keyword.keyword_id
+    {where}
+    ORDER BY kaomoji.id, kaomoji_keyword.position
+"""
+
+# the largest code point; every string with a prefix sorts before
+# prefix + MAX_CHARACTER
+MAX_CHARACTER = "\U0010ffff"
+
+
+class SQLiteKaomojis(Mapping):
+    """Read-only code -> Kaomoji mapping over the entries of a
+        KaomojiSQLiteDB, standing for `KaomojiDB.kaomojis`.
+    """
+
+    def __init__(self, database: "KaomojiSQLiteDB"):
+        self.database = database
+
+    def __getitem__(self, code: str) -> Kaomoji:
+        kaomoji = self.database.get_kaomoji_by_code(code)
+
+        if kaomoji is None:
+            raise KeyError(code)
+
+        return kaomoji
+
+    def __contains__(self, code) -> bool:
+        return self.database.connection.execute(
+            "SELECT 1 FROM kaomoji WHERE code = ?", (code,)).fetchone()\
+            is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for code, in self.database.connection.execute(
+                "SELECT code FROM kaomoji ORDER BY id"):
+            yield code
+
+    def __len__(self) -> int:
+        return self.database.connection.execute(
+            "SELECT count(*) FROM kaomoji").fetchone()[0]
+
+    def items(self) -> Iterator[tuple[str, Kaomoji]]:
+        """Yields the (code, Kaomoji) pairs with a single query."""
+
+        for kaomoji in self.database._select_entries():
+            yield kaomoji.code, kaomoji
+
+    def values(self) -> Iterator[Kaomoji]:
+        """Yields the entries with a single query."""
+
+        return self.database._select_entries()
+
+
+class KaomojiSQLiteDB:
+    """Offers the KaomojiDB facilities over a SQLite database file.
+
+    Each entry is a row of code, sha256 hash and shortcode; keywords are
+        normalized into their own table, linked to the entries in order, and
+        indexed by an FTS5 table for `search`.
+
+    Edits are single-row transactions committed right away, including the
+        ones made through the keyword mutators of the Kaomoji instances it
+        returns, so `write` has nothing left to do but exporting.
+    """
+
+    def __init__(self, filename=None) -> None:
+        """
+        Args:
+            filename (str): The filename of the SQLite database; it is
+                created if it doesn't exist.
+
+        Attributes:
+            filename (str): the filename of the database file.
+            connection (sqlite3.Connection): the connection to it.
+            kaomojis (SQLiteKaomojis): code -> Kaomoji mapping of the entries.
+        """
+
+        self.filename = filename
+        self.connection = None
+        self.kaomojis = SQLiteKaomojis(self)
+
+        if filename:
+            self.load_file(filename=filename)
+
+    def load_file(self, filename: str) -> None:
+        """Opens a SQLite database file, creating its tables if needed."""
+
+        if self.connection is not None:
+            self.connection.close()
+
+        self.filename = filename
+        # the server uses it from the thread of each connection, one at a
+        # time under its lock
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+
+        with self.connection:
+            self.connection.executescript(SQLITE_SCHEMA)
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    @property
+    def entry_num(self) -> int:
+        return len(self.kaomojis)
+
+    def import_tsv(self, filename: str) -> dict[str, int]:
+        """Imports a TSV db file in a single transaction; like loading it, an
+            entry replaces the one with the same code.
+
+        Returns:
+            a report dict with the number of entries "imported".
+        """
+
+        report = dict(imported=0)
+
+        with self.connection:
+            for kaomoji in KaomojiDB.iter_file(filename=filename):
+                self._put(kaomoji)
+                report["imported"] += 1
+
+        return report
+
+    def export_tsv(self, filename: str) -> None:
+        """Exports the entries as a TSV db file."""
+
+        with open(filename, "w", encoding="utf-8") as database_file:
+            database_file.writelines(kaomoji.to_line_entry()
+                                     for kaomoji in self._select_entries())
+
+    def write(self, filename: str=None) -> None:
+        """Exports the entries to `filename`, if given; edits are already
+            committed as they are made.
+        """
+
+        if filename and filename != self.filename:
+            self.export_tsv(filename=filename)
+
+    def compact(self) -> None:
+        """Drops keywords no entry uses, then rebuilds the database file."""
+
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM keyword WHERE id NOT IN"
+                " (SELECT keyword_id FROM kaomoji_keyword)")
+
+        self.connection.execute("VACUUM")
+
+    def kaomoji_exists(self, kaomoji: Kaomoji) -> bool:
+        """Checks if a kaomoji exists already in the database."""
+
+        return kaomoji.code in self.kaomojis
+
+    def add_kaomoji(self, kaomoji: Kaomoji) -> Kaomoji:
+        """Adds a Kaomoji to the database, replacing the one with the same
+            code.
+        """
+
+        with self.connection:
+            self._put(kaomoji)
+
+        kaomoji._database = self
+
+        return kaomoji
+
+    def update_kaomoji(self, kaomoji: Kaomoji) -> Kaomoji:
+        """Updates keywords to database."""
+
+        return self.add_kaomoji(kaomoji)
+
+    def remove_kaomoji(self, kaomoji: Kaomoji) -> None:
+        """Removes a Kaomoji from the database."""
+
+        with self.connection:
+            self.connection.execute("DELETE FROM kaomoji WHERE code = ?",
+                                    (kaomoji.code,))
+
+        if kaomoji._database is self:
+            kaomoji._database = None
+
+    def ingest(self, kaomojis: Iterable[Kaomoji]) -> dict[str, int]:
+        """Adds many kaomojis in one transaction, merging keywords; see
+            `KaomojiDB.ingest`.
+        """
+
+        report = dict(added=0, updated=0, unchanged=0)
+
+        with self.connection:
+            for kaomoji in kaomojis:
+                kaomoji_id = self._kaomoji_id(kaomoji.code)
+
+                if kaomoji_id is None:
+                    self._put(kaomoji)
+                    report["added"] += 1
+                elif self._link_keywords(kaomoji_id, kaomoji.keywords):
+                    report["updated"] += 1
+                else:
+                    report["unchanged"] += 1
+
+        return report
+
+    def get_kaomoji(self, by_entity: Union[Kaomoji, str, int]) ->\
+                                                        Union[Kaomoji, None]:
+        """Gets a Kaomoji from the database by Kaomoji entity, code or int
+            hash; see `KaomojiDB.get_kaomoji`.
+        """
+
+        if isinstance(by_entity, Kaomoji):
+            return self.get_kaomoji_by_code(by_entity.code)
+
+        elif isinstance(by_entity, str):
+            return self.get_kaomoji_by_code(by_entity)
+
+        elif isinstance(by_entity, int):
+            return self.get_kaomoji_by_hash(by_entity)
+
+        raise TypeError("by_entity is not Kaomoji | str | int")
+
+    def get_kaomoji_by_code(self, code: str) -> Union[Kaomoji, None]:
+        """Gets a Kaomoji with it's current keywords from the database."""
+
+        return next(self._select_entries("WHERE kaomoji.code = ?", (code,)),
+                    None)
+
+    def get_kaomoji_by_hash(self, the_hash: Union[str, int]) ->\
+                                                        Union[Kaomoji, None]:
+        """Gets a Kaomoji with it's current keywords from the database."""
+
+        return next(self._select_entries("WHERE kaomoji.hash = ?",
+                                         (normalize_hash(the_hash),)), None)
+
+    def get_kaomoji_by_shortcode(self, shortcode: Union[str, bytes]) ->\
+                                                        Union[Kaomoji, None]:
+        """Gets a Kaomoji with it's current keywords from the database."""
+
+        code = shortcode_to_code(shortcode)
+
+        if code is None:
+            return None
+
+        return self.get_kaomoji_by_code(code)
+
+    def query(self, query: str) -> dict[str, Kaomoji]:
+        """Gets the kaomojis having some keyword which starts with `query`,
+            as a range scan of the keyword index.
+        """
+
+        return self._select_matches(
+            "SELECT id FROM keyword WHERE keyword >= ? AND keyword < ?",
+            (query, query + MAX_CHARACTER))
+
+    def query_all(self, keywords: Union[str, list]) -> dict[str, Kaomoji]:
+        """Gets the kaomojis having all of `keywords`, eg. 'happy, cat'; the
+            keywords are matched whole.
+        """
+
+        keywords = list(dict.fromkeys(Kaomoji._to_keyword_list(keywords)))
+
+        if not keywords:
+            return dict()
+
+        where = """WHERE kaomoji.id IN (
+            SELECT kaomoji_id FROM kaomoji_keyword
+                JOIN keyword ON keyword.id = kaomoji_keyword.keyword_id
+                WHERE keyword.keyword IN ({})
+                GROUP BY kaomoji_id HAVING count(*) = ?)
+        """.format(", ".join("?" * len(keywords)))
+
+        return {kaomoji.code: kaomoji for kaomoji in self._select_entries(
+            where, (*keywords, len(keywords)))}
+
+    def search(self, match: str) -> dict[str, Kaomoji]:
+        """Gets the kaomojis having some keyword matching an FTS5 query, eg.
+            'hap*', 'table AND flip' or '"table flip"'.
+        """
+
+        return self._select_matches(
+            "SELECT rowid FROM keyword_fts WHERE keyword_fts MATCH ?",
+            (match,))
+
+    def query_substring(self, substring: str,
+                        limit: int = DEFAULT_SEARCH_LIMIT)\
+                                                    -> dict[str, Kaomoji]:
+        """Gets the kaomojis having some of the best `limit` keywords which
+            contain `substring`; see `KaomojiDB.query_substring`. The keyword
+            table is scanned, as the FTS5 index only matches whole tokens.
+        """
+
+        return self._query_keywords(rank_substring_matches(
+            substring, self._keyword_counts("instr(keyword.keyword, ?) > 0",
+                                            (substring,)),
+            limit=limit))
+
+    def query_fuzzy(self, keyword: str, max_distance: int = 1,
+                    limit: int = DEFAULT_SEARCH_LIMIT) -> dict[str, Kaomoji]:
+        """Gets the kaomojis having some of the best `limit` keywords at most
+            `max_distance` edits away from `keyword`; see
+            `KaomojiDB.query_fuzzy`. The keywords of a close enough length
+            are scanned, as there is no trigram index in the file.
+        """
+
+        return self._query_keywords(rank_fuzzy_matches(
+            keyword, self._keyword_counts(
+                "length(keyword.keyword) BETWEEN ? AND ?",
+                (len(keyword) - max_distance, len(keyword) + max_distance)),
+            max_distance=max_distance, limit=limit))
+
+    def _keyword_counts(self, where: str,
+                        parameters: tuple) -> Iterator[tuple[str, int]]:
+        """Yields (keyword, number of kaomojis) for the keywords selected by
+            a condition over `keyword` which some kaomoji has.
+        """
+
+        yield from self.connection.execute("""
+            SELECT keyword.keyword, count(*) FROM keyword
+                JOIN kaomoji_keyword ON kaomoji_keyword.keyword_id = keyword.id
+                WHERE {} GROUP BY keyword.id
+        """.format(where), parameters)
+
+    def _query_keywords(self, keywords: list[str]) -> dict[str, Kaomoji]:
+        """Gets the kaomojis having some of `keywords`, the ones of the first
+            keyword first.
+        """
+
+        results = dict()
+
+        for keyword in keywords:
+            for kaomoji in self._select_entries("""WHERE kaomoji.id IN (
+                    SELECT kaomoji_id FROM kaomoji_keyword
+                        JOIN keyword ON keyword.id = kaomoji_keyword.keyword_id
+                        WHERE keyword.keyword = ?)
+                    """, (keyword,)):
+                results.setdefault(kaomoji.code, kaomoji)
+
+        return results
+
+    def compare(self, other, diff_type="additional") -> dict[str: Kaomoji]:
+        """Compares with a KaomojiDB or KaomojiSQLiteDB; see
+            `compare_databases`.
+        """
+
+        if not isinstance(other, (KaomojiDB, KaomojiSQLiteDB)):
+            raise TypeError("other is not a KaomojiDB | KaomojiSQLiteDB")
+
+        return compare_databases(kaomojis=self.kaomojis,
+                                 other_kaomojis=other.kaomojis,
+                                 diff_type=diff_type)
+
+    def merge(self, base, other) -> tuple[dict[str, int],
+                                          list[MergeConflict]]:
+        """Three-way merges `other` into this database; see
+            `KaomojiDB.merge`.
+        """
+
+        return merge_into(database=self, base=base, other=other)
+
+    def _select_matches(self, keyword_ids_query: str,
+                        parameters: tuple) -> dict[str, Kaomoji]:
+        where = """WHERE kaomoji.id IN (
+            SELECT kaomoji_id FROM kaomoji_keyword WHERE keyword_id IN ({}))
+        """.format(keyword_ids_query)
+
+        return {kaomoji.code: kaomoji
+                for kaomoji in self._select_entries(where, parameters)}
+
+    def _select_entries(self, where: str = "",
+                        parameters: tuple = ()) -> Iterator[Kaomoji]:
+        """Yields the entries selected by a WHERE clause over `kaomoji`,
+            attached to this database.
+        """
+
+        rows = self.connection.execute(SELECT_ENTRIES.format(where=where),
+                                       parameters)
+
+        for (_, code), group in groupby(rows, key=lambda row: row[:2]):
+            keywords = tuple(intern(keyword) for _, _, keyword in group
+                             if keyword is not None)
+
+            yield Kaomoji._from_parsed(code, keywords, database=self)
+
+    def _kaomoji_id(self, code: str) -> Union[int, None]:
+        row = self.connection.execute("SELECT id FROM kaomoji WHERE code = ?",
+                                      (code,)).fetchone()
+
+        return row[0] if row else None
+
+    def _keyword_ids(self, keywords: Iterable[str],
+                     create: bool = True) -> list[int]:
+        """Gives the ids of keywords, creating the missing ones, or leaving
+            them out if not `create`.
+        """
+
+        keyword_ids = list()
+
+        for keyword in keywords:
+            if create:
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO keyword (keyword) VALUES (?)",
+                    (keyword,))
+
+            row = self.connection.execute(
+                "SELECT id FROM keyword WHERE keyword = ?",
+                (keyword,)).fetchone()
+
+            if row:
+                keyword_ids.append(row[0])
+
+        return keyword_ids
+
+    def _put(self, kaomoji: Kaomoji) -> None:
+        """Inserts or replaces an entry; must run inside a transaction."""
+
+        self.connection.execute(
+            "INSERT INTO kaomoji (code, hash, shortcode) VALUES (?, ?, ?)"
+            " ON CONFLICT (code) DO NOTHING",
+            (kaomoji.code, kaomoji.hash, kaomoji.shortcode))
+
+        kaomoji_id = self._kaomoji_id(kaomoji.code)
+
+        self.connection.execute(
+            "DELETE FROM kaomoji_keyword WHERE kaomoji_id = ?", (kaomoji_id,))
+        self._link_keywords(kaomoji_id, kaomoji.keywords)
+
+    def _link_keywords(self, kaomoji_id: int, keywords: Iterable[str]) -> int:
+        """Links keywords to an entry after its current ones; must run inside
+            a transaction.
+
+        Returns:
+            the number of keywords linked, not counting the ones it had.
+        """
+
+        position = self.connection.execute(
+            "SELECT coalesce(max(position), -1) FROM kaomoji_keyword"
+            " WHERE kaomoji_id = ?", (kaomoji_id,)).fetchone()[0]
+        linked = 0
+
+        for keyword_id in self._keyword_ids(keywords):
+            position += 1
+            linked += self.connection.execute(
+                "INSERT OR IGNORE INTO kaomoji_keyword"
+                " (kaomoji_id, keyword_id, position) VALUES (?, ?, ?)",
+                (kaomoji_id, keyword_id, position)).rowcount
+
+        return linked
+
+    def _reindex_keywords(self, kaomoji: Kaomoji, added=(), removed=()) -> None:
+        """Called by the Kaomoji keyword mutators of the entries it returned;
+            commits the change as one transaction.
+        """
+
+        with self.connection:
+            kaomoji_id = self._kaomoji_id(kaomoji.code)
+
+            if kaomoji_id is None:
+                return
+
+            self._link_keywords(kaomoji_id, added)
+
+            for keyword_id in self._keyword_ids(removed, create=False):
+                self.connection.execute(
+                    "DELETE FROM kaomoji_keyword"
+                    " WHERE kaomoji_id = ? AND keyword_id = ?",
+                    (kaomoji_id, keyword_id))
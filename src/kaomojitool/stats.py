@@ -0,0 +1,267 @@
+import json
+import os
+import sys
+from array import array
+from collections import Counter
+from typing import Iterable, Iterator, Union
+
+from .index import POSTING_TYPECODE
+from .journal import database_state
+from .kaomoji import Kaomoji
+from .kaomoji import parse_line_entry
+
+STATS_SUFFIX = ".stats"
+STATS_VERSION = 1
+
+DEFAULT_TOP_KEYWORDS = 10
+
+# sizes of the empty containers; every item adds a pointer to them
+LIST_SIZE = sys.getsizeof(list())
+POINTER_SIZE = 8
+POSTING_SIZE = sys.getsizeof(array(POSTING_TYPECODE))
+POSTING_ITEM_SIZE = array(POSTING_TYPECODE).itemsize
+DICT_HEADER_SIZE = 64
+DICT_ENTRY_SIZE = 24  # hash, key and value of a combined table entry
+HASH_SIZE = sys.getsizeof("0" * 64)  # the sha256 hex digests of hash_index
+
+
+def stats_filename(filename: str) -> str:
+    """The sidecar file caching the statistics of a db file."""
+
+    return filename + STATS_SUFFIX
+
+
+def estimated_dict_size(items: int) -> int:
+    """The bytes of a dict of `items` keys, as CPython sizes its tables."""
+
+    table_size = 8
+
+    while table_size * 2 // 3 < items:
+        table_size *= 2
+
+    index_size = 1 if table_size <= 1 << 7 else 2 if table_size <= 1 << 15\
+        else 4 if table_size <= 1 << 31 else 8
+
+    return DICT_HEADER_SIZE + table_size * index_size +\
+        table_size * 2 // 3 * DICT_ENTRY_SIZE
+
+
+def estimated_list_size(items: int) -> int:
+    return LIST_SIZE + items * POINTER_SIZE
+
+
+class DatabaseStats:
+    """Statistics of the entries of a database, gathered in a single pass.
+
+    Attributes:
+        entries (int): number of entries.
+        entries_without_keywords (int): number of entries with no keyword.
+        keyword_references (int): number of keywords of all the entries.
+        keyword_frequencies (Counter): number of entries with each keyword.
+        code_lengths (Counter): number of codes of each length.
+        code_bytes (int): bytes of the code strings, as Python objects.
+        keyword_tuple_bytes (int): bytes of the keyword tuples.
+        streamed (bool): the entries were read from the file line by line;
+            repeated codes are counted once per line, and the journal isn't
+            applied.
+    """
+
+    def __init__(self, streamed: bool = False) -> None:
+        self.entries = 0
+        self.entries_without_keywords = 0
+        self.keyword_references = 0
+        self.keyword_frequencies = Counter()
+        self.code_lengths = Counter()
+        self.code_bytes = 0
+        self.keyword_tuple_bytes = 0
+        self.streamed = streamed
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[tuple[str, tuple[str, ...]]],
+                     streamed: bool = False) -> "DatabaseStats":
+        """Gathers the statistics of (code, keywords) entries."""
+
+        stats = cls(streamed=streamed)
+        getsizeof = sys.getsizeof
+        code_lengths = stats.code_lengths
+        keyword_frequencies = stats.keyword_frequencies
+
+        for code, keywords in entries:
+            stats.entries += 1
+            stats.code_bytes += getsizeof(code)
+            stats.keyword_tuple_bytes += getsizeof(keywords)
+            code_lengths[len(code)] += 1
+
+            if keywords:
+                stats.keyword_references += len(keywords)
+                keyword_frequencies.update(keywords)
+            else:
+                stats.entries_without_keywords += 1
+
+        return stats
+
+    @classmethod
+    def from_database(cls, database) -> "DatabaseStats":
+        """Gathers the statistics of a loaded database."""
+
+        return cls.from_entries((kaomoji.code, kaomoji.keywords)
+                                for kaomoji in database.kaomojis.values())
+
+    @classmethod
+    def from_file(cls, filename: str, encoding: str = "utf-8")\
+                                                        -> "DatabaseStats":
+        """Gathers the statistics of a db file, reading it line by line."""
+
+        return cls.from_entries(iter_file_entries(filename, encoding),
+                                streamed=True)
+
+    @property
+    def keywords(self) -> int:
+        """Number of distinct keywords."""
+
+        return len(self.keyword_frequencies)
+
+    @property
+    def average_keywords(self) -> float:
+        """Average number of keywords per entry."""
+
+        return self.keyword_references / self.entries if self.entries else 0.0
+
+    def top_keywords(self, number: int = DEFAULT_TOP_KEYWORDS)\
+                                                    -> list[tuple[str, int]]:
+        return self.keyword_frequencies.most_common(number)
+
+    def memory_estimate(self) -> dict[str, int]:
+        """Estimates the resident bytes of each structure of a KaomojiDB
+            holding these entries.
+
+        Returns:
+            a dict of bytes, with the keys:
+                "entries": the Kaomoji objects with their code strings and
+                    keyword tuples, and the `kaomojis` dict.
+                "keyword strings": the keyword strings, shared by all the
+                    entries, and the keyword dictionary of the index.
+                "keyword index": the postings and the sorted keywords.
+                "entry ids": the `entries` list and the ids of the entries.
+                "hash index": the hash -> Kaomoji dict, built on first use.
+                "total": all of the above.
+        """
+
+        kaomoji_size = sys.getsizeof(Kaomoji._from_parsed("", ()))
+        keyword_string_bytes = sum(sys.getsizeof(keyword)
+                                   for keyword in self.keyword_frequencies)
+
+        estimate = {
+            "entries": self.entries * kaomoji_size + self.code_bytes
+                + self.keyword_tuple_bytes + estimated_dict_size(self.entries),
+            "keyword strings": keyword_string_bytes
+                + estimated_list_size(self.keywords)
+                + estimated_dict_size(self.keywords),
+            "keyword index": self.keywords * POSTING_SIZE
+                + self.keyword_references * POSTING_ITEM_SIZE
+                + estimated_dict_size(self.keywords)
+                + estimated_list_size(self.keywords),
+            "entry ids": estimated_list_size(self.entries)
+                + self.entries * sys.getsizeof(1 << 20),
+            "hash index": self.entries * HASH_SIZE
+                + estimated_dict_size(self.entries),
+        }
+        estimate["total"] = sum(estimate.values())
+
+        return estimate
+
+    def to_dict(self) -> dict:
+        return dict(entries=self.entries,
+                    entries_without_keywords=self.entries_without_keywords,
+                    keyword_references=self.keyword_references,
+                    keyword_frequencies=dict(self.keyword_frequencies),
+                    code_lengths={str(length): count for length, count
+                                  in self.code_lengths.items()},
+                    code_bytes=self.code_bytes,
+                    keyword_tuple_bytes=self.keyword_tuple_bytes,
+                    streamed=self.streamed)
+
+    @classmethod
+    def from_dict(cls, fields: dict) -> "DatabaseStats":
+        stats = cls(streamed=fields["streamed"])
+        stats.entries = fields["entries"]
+        stats.entries_without_keywords = fields["entries_without_keywords"]
+        stats.keyword_references = fields["keyword_references"]
+        stats.keyword_frequencies = Counter(fields["keyword_frequencies"])
+        stats.code_lengths = Counter({int(length): count for length, count
+                                      in fields["code_lengths"].items()})
+        stats.code_bytes = fields["code_bytes"]
+        stats.keyword_tuple_bytes = fields["keyword_tuple_bytes"]
+
+        return stats
+
+    def __repr__(self):
+        return "<DatabaseStats; entries: {}, keywords: {}>".format(
+            self.entries, self.keywords)
+
+
+def iter_file_entries(filename: str, encoding: str = "utf-8")\
+                                    -> Iterator[tuple[str, tuple[str, ...]]]:
+    """Yields the (code, keywords) of each line entry of a db file, without
+        building Kaomoji objects.
+    """
+
+    with open(filename, "r", encoding=encoding) as db_file:
+        for line in db_file:
+            if line.strip():
+                yield parse_line_entry(line)
+
+
+def stats_key(filename: str) -> list:
+    """What the statistics of a db file depend on; see `database_state`."""
+
+    return database_state(filename)
+
+
+def read_stats(filename: str,
+               streamed: bool = False) -> Union[DatabaseStats, None]:
+    """The cached statistics of a db file, if they are up to date and were
+        gathered the same way: streamed from the file, which counts
+        repeated codes and ignores the journal, or from the database loaded.
+    """
+
+    try:
+        with open(stats_filename(filename), "r",
+                  encoding="utf-8") as stats_file:
+            cached = json.load(stats_file)
+
+        if cached["version"] != STATS_VERSION or\
+                cached["key"] != stats_key(filename) or\
+                cached["stats"]["streamed"] != streamed:
+            return None
+
+        return DatabaseStats.from_dict(cached["stats"])
+
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_stats(filename: str, stats: DatabaseStats, key: list) -> None:
+    """Caches the statistics of a db file in its sidecar, atomically; the
+        cache is best effort, so it isn't written if the directory or the
+        sidecar aren't writable.
+
+    Args:
+        key (list): the `stats_key` of the file taken before gathering the
+            statistics, so they aren't taken for the ones of later edits.
+    """
+
+    temp_filename = "{}.{}.tmp".format(stats_filename(filename), os.getpid())
+
+    try:
+        with open(temp_filename, "w", encoding="utf-8") as stats_file:
+            json.dump(dict(version=STATS_VERSION, key=key,
+                           stats=stats.to_dict()),
+                      stats_file, ensure_ascii=False)
+
+        os.replace(temp_filename, stats_filename(filename))
+    except OSError:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
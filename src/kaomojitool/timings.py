@@ -0,0 +1,196 @@
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator, Union
+
+# ru_maxrss is in kilobytes on Linux, in bytes on macOS
+MAX_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+PAGE_SIZE = resource.getpagesize()
+
+
+def max_rss() -> int:
+    """The peak resident memory of the process so far, in bytes."""
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAX_RSS_UNIT
+
+
+def current_rss() -> Union[int, None]:
+    """The resident memory of the process now, in bytes; None where there
+        is no /proc/self/statm to read it from.
+    """
+
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def rss_delta(start_rss: Union[int, None]) -> Union[int, None]:
+    """The change of the resident memory since it was `start_rss`."""
+
+    end_rss = current_rss()
+
+    if start_rss is None or end_rss is None:
+        return None
+
+    return end_rss - start_rss
+
+
+class PhaseTiming:
+    """What a phase took.
+
+    Attributes:
+        name (str): the phase name, prefixed with the names of the phases it
+            is nested in, eg. "load.snapshot".
+        wall (float): seconds elapsed.
+        cpu (float): seconds of CPU time of the process.
+        rss_delta (int): the change of the resident memory of the process
+            during the phase, in bytes; None where it can't be read.
+        process_peak_rss (int): the peak resident memory of the process
+            since it started, at the end of the phase, in bytes; it is
+            never lower than the one of an earlier phase.
+        peak_traced (int): the peak of the memory allocated by Python during
+            the phase, in bytes; None unless tracemalloc is tracing, eg.
+            with PYTHONTRACEMALLOC=1.
+    """
+
+    __slots__ = ("name", "wall", "cpu", "rss_delta", "process_peak_rss",
+                 "peak_traced")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = None
+        self.cpu = None
+        self.rss_delta = None
+        self.process_peak_rss = None
+        self.peak_traced = None
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self):
+        return "<PhaseTiming `{}'; {:.4f}s>".format(self.name, self.wall or 0)
+
+
+class Timings:
+    """Records the wall time, CPU time and memory of the phases of a run.
+
+    Phases can nest; a phase with the same name as the one it is nested in
+        is merged into it, so both a command and the database it calls can
+        mark the same "load" or "write".
+
+        timings = Timings()
+
+        with timings.phase("load"):
+            ...
+
+        print(timings.report())
+    """
+
+    def __init__(self) -> None:
+        """
+        Attributes:
+            phases (list): a PhaseTiming per phase, in the order they
+                started.
+        """
+
+        self.phases: list[PhaseTiming] = list()
+        self._stack: list[PhaseTiming] = list()
+        self._start_rss = current_rss()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[Union[PhaseTiming, None]]:
+        """Times the block as the phase `name`.
+
+        Yields:
+            the PhaseTiming, filled when the block ends; None if it is merged
+                into the enclosing phase of the same name.
+        """
+
+        parent = self._stack[-1] if self._stack else None
+
+        if parent and parent.name.rsplit(".", 1)[-1] == name:
+            yield None
+            return
+
+        timing = PhaseTiming(parent.name + "." + name if parent else name)
+        self.phases.append(timing)
+        self._stack.append(timing)
+
+        if tracemalloc.is_tracing():
+            if parent:  # the peak of the parent until now
+                parent.peak_traced = max(parent.peak_traced or 0,
+                                         tracemalloc.get_traced_memory()[1])
+
+            tracemalloc.reset_peak()
+
+        start_rss = current_rss()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+
+        try:
+            yield timing
+        finally:
+            timing.wall = time.perf_counter() - start_wall
+            timing.cpu = time.process_time() - start_cpu
+            timing.rss_delta = rss_delta(start_rss)
+            timing.process_peak_rss = max_rss()
+            self._stack.pop()
+
+            # not reset here, so the peak counts for the parent too
+            if tracemalloc.is_tracing():
+                timing.peak_traced = max(timing.peak_traced or 0,
+                                         tracemalloc.get_traced_memory()[1])
+
+    def total(self) -> PhaseTiming:
+        """The timing of the whole run so far."""
+
+        timing = PhaseTiming("total")
+        timing.wall = time.perf_counter() - self._start_wall
+        timing.cpu = time.process_time() - self._start_cpu
+        timing.rss_delta = rss_delta(self._start_rss)
+        timing.process_peak_rss = max_rss()
+
+        return timing
+
+    def to_dict(self) -> dict:
+        return dict(phases=[timing.to_dict() for timing in self.phases],
+                    total=self.total().to_dict())
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def report(self) -> str:
+        """The timings as a table; with a column of the peaks traced by
+            tracemalloc only if it is tracing.
+        """
+
+        timings = self.phases + [self.total()]
+        traced = any(timing.peak_traced is not None for timing in timings)
+        row = "{:<24} {:>10} {:>10} {:>10} {:>18}" + (" {:>12}" if traced
+                                                      else "")
+
+        lines = [row.format("phase", "wall (s)", "cpu (s)", "rss delta",
+                            "process peak rss", "peak traced")]
+
+        for timing in timings:
+            lines.append(row.format(
+                timing.name, "{:.4f}".format(timing.wall),
+                "{:.4f}".format(timing.cpu), format_bytes(timing.rss_delta),
+                format_bytes(timing.process_peak_rss),
+                format_bytes(timing.peak_traced)))
+
+        return "\n".join(lines)
+
+
+def format_bytes(size: Union[int, None]) -> str:
+    if size is None:
+        return "-"
+
+    return "{:.1f}MB".format(size / (1 << 20))
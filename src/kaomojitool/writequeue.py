@@ -0,0 +1,114 @@
+import os
+import time
+import uuid
+from typing import Callable, Union
+
+from .journal import iter_records
+from .lock import DatabaseLock
+
+QUEUE_SUFFIX = ".queue"
+QUEUED_SUFFIX = ".records"
+
+
+def queue_directory(filename: str) -> str:
+    """The directory of the edits queued for the db file `filename`."""
+
+    return filename + QUEUE_SUFFIX
+
+
+def enqueue(filename: str, records: list[str]) -> str:
+    """Queues formatted journal records for the db file `filename`, in a
+        file of their own that shows up whole, named so they sort in the
+        order they were queued.
+
+    Returns:
+        the queued file name.
+    """
+
+    directory = queue_directory(filename)
+
+    queued_filename = os.path.join(directory, "{:020d}-{}{}".format(
+        time.time_ns(), uuid.uuid4().hex, QUEUED_SUFFIX))
+    temp_filename = queued_filename + ".tmp"
+
+    queued_file = None
+
+    while queued_file is None:
+        os.makedirs(directory, exist_ok=True)
+
+        try:
+            queued_file = open(temp_filename, "w", encoding="utf-8")
+        except FileNotFoundError:  # removed, empty, by a group commit
+            pass
+
+    with queued_file:
+        queued_file.writelines(records)
+        queued_file.flush()
+        os.fsync(queued_file.fileno())
+
+    os.replace(temp_filename, queued_filename)
+
+    return queued_filename
+
+
+def queued_filenames(filename: str) -> list[str]:
+    """The files of records queued for the db file `filename`, oldest
+        first.
+    """
+
+    try:
+        names = os.listdir(queue_directory(filename))
+    except FileNotFoundError:
+        return list()
+
+    return [os.path.join(queue_directory(filename), name)
+            for name in sorted(names) if name.endswith(QUEUED_SUFFIX)]
+
+
+def group_commit(filename: str, records: list[str],
+                 open_database: Callable[[], "KaomojiDB"],
+                 timeout: Union[float, None] = None) -> int:
+    """Writes journal records to the db file `filename` together with the
+        ones concurrent writers queued, with a single write.
+
+    The records are queued, then the DatabaseLock is taken. If a writer that
+        held it meanwhile applied them, there is nothing left to do;
+        otherwise this writer loads the database with `open_database`,
+        applies every record queued so far, writes it once, and removes the
+        queued files, and the queue directory if no more were queued. A
+        writer dying after the write but before removing them makes the
+        next one apply them again, which the records, each setting a state,
+        allow.
+
+    Args:
+        open_database (callable): gives the database loaded from the file.
+        timeout (float): seconds to wait for the lock; see DatabaseLock.
+
+    Returns:
+        the number of queued files applied by this call; 0 if another
+            writer applied these records.
+    """
+
+    queued_filename = enqueue(filename, records)
+
+    with DatabaseLock(filename, timeout=timeout):
+        if not os.path.exists(queued_filename):
+            return 0
+
+        batch = queued_filenames(filename)
+        database = open_database()
+
+        for batch_filename in batch:
+            database.apply_records(iter_records(batch_filename))
+
+        database.write()
+
+        for batch_filename in batch:
+            os.remove(batch_filename)
+
+        try:
+            os.rmdir(queue_directory(filename))
+        except OSError:  # not empty: queued by writers waiting for the lock
+            pass
+
+    return len(batch)
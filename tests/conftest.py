@@ -1,10 +1,62 @@
 """
-    Dummy conftest.py for kaomojitool.
+    Shared fixtures for the kaomojitool tests.
 
-    If you don't know what this is for, just leave it empty.
     Read more about conftest.py under:
     - https://docs.pytest.org/en/stable/fixture.html
     - https://docs.pytest.org/en/stable/writing_plugins.html
 """
 
-# import pytest
+import pytest
+
+from kaomojitool.kaomoji import KaomojiDB
+
+DATABASE_TEXT = "(^_^)\thappy\n(T_T)\tsad\n"
+
+
+@pytest.fixture
+def write_db(tmp_path):
+    """Writes a db file in `tmp_path`; write_db(text, name) gives its
+    filename.
+    """
+
+    def write(text: str = DATABASE_TEXT, name: str = "db.tsv") -> str:
+        filename = tmp_path / name
+        filename.write_text(text, encoding="utf-8")
+
+        return str(filename)
+
+    return write
+
+
+@pytest.fixture
+def load_db(write_db):
+    """Writes a db file and loads it; load_db(text, name, **kwargs) gives
+    the KaomojiDB, the kwargs going to KaomojiDB.
+    """
+
+    def load(text: str = DATABASE_TEXT, name: str = "db.tsv",
+             **kwargs) -> KaomojiDB:
+        return KaomojiDB(filename=write_db(text, name=name), **kwargs)
+
+    return load
+
+
+@pytest.fixture
+def config_filename(tmp_path):
+    """An empty config file, so the CLI doesn't read the user's one."""
+
+    filename = tmp_path / "config.toml"
+    filename.write_text("")
+
+    return str(filename)
+
+
+@pytest.fixture
+def db_contents():
+    """db_contents(database) gives the code -> keywords of a database."""
+
+    def contents(database) -> dict:
+        return {code: kaomoji.keywords
+                for code, kaomoji in database.kaomojis.items()}
+
+    return contents
@@ -0,0 +1,130 @@
+import pytest
+from click.testing import CliRunner
+
+from kaomojitool.__main__ import cli
+from kaomojitool.backup import BackupStore
+from kaomojitool.kaomoji import Kaomoji
+from kaomojitool.sqlite import KaomojiSQLiteDB
+
+
+def test_sqlite_backup_has_the_commits_in_the_wal(tmp_path):
+    filename = str(tmp_path / "db.sqlite")
+    database = KaomojiSQLiteDB(filename=filename)
+    database.add_kaomoji(Kaomoji(code="(^_^)", keywords="happy"))
+
+    # the connection stays open, so the commit is still in the -wal file
+    store = BackupStore(filename, sqlite=True)
+    backup = store.backup()
+    restored = str(tmp_path / "restored.sqlite")
+    store.restore(backup.backup_id, destination=restored)
+
+    restored_database = KaomojiSQLiteDB(filename=restored)
+    assert restored_database.get_kaomoji_by_code("(^_^)").keywords ==\
+        ("happy",)
+
+    restored_database.close()
+    database.close()
+
+
+def test_sqlite_backup_is_skipped_when_unchanged(tmp_path):
+    filename = str(tmp_path / "db.sqlite")
+    database = KaomojiSQLiteDB(filename=filename)
+    database.add_kaomoji(Kaomoji(code="(^_^)", keywords="happy"))
+    store = BackupStore(filename, sqlite=True)
+
+    assert store.backup() is not None
+    assert store.backup() is None
+
+    database.close()
+
+
+def test_sqlite_restore_drops_the_stale_wal(tmp_path):
+    filename = str(tmp_path / "db.sqlite")
+    database = KaomojiSQLiteDB(filename=filename)
+    database.add_kaomoji(Kaomoji(code="(^_^)", keywords="happy"))
+    store = BackupStore(filename, sqlite=True)
+    backup = store.backup()
+
+    database.add_kaomoji(Kaomoji(code="(T_T)", keywords="sad"))
+    # a crashed process leaves its -wal file behind; closing checkpoints it
+    wal = (tmp_path / "db.sqlite-wal").read_bytes()
+    database.close()
+    (tmp_path / "db.sqlite-wal").write_bytes(wal)
+
+    store.restore(backup.backup_id)
+
+    restored_database = KaomojiSQLiteDB(filename=filename)
+    assert set(restored_database.kaomojis) == {"(^_^)"}
+    restored_database.close()
+
+
+def test_edit_backs_up_the_sqlite_database_before_editing(tmp_path):
+    filename = str(tmp_path / "db.sqlite")
+    config_filename = tmp_path / "config.toml"
+    config_filename.write_text('database_backend = "sqlite"\n')
+
+    database = KaomojiSQLiteDB(filename=filename)
+    database.add_kaomoji(Kaomoji(code="(^_^)", keywords="happy"))
+    database.close()
+
+    result = CliRunner().invoke(cli, [
+        "edit", "-f", filename, "-c", str(config_filename),
+        "-k", "(^_^)", "-a", "smile"])
+    assert result.exit_code == 0, result.output
+
+    store = BackupStore(filename, sqlite=True)
+    restored = str(tmp_path / "restored.sqlite")
+    store.restore(store.backups()[-1].backup_id, destination=restored)
+
+    restored_database = KaomojiSQLiteDB(filename=restored)
+    assert restored_database.get_kaomoji_by_code("(^_^)").keywords ==\
+        ("happy",)
+    restored_database.close()
+
+
+def backed_up_store(write_db, versions=3):
+    """A store with a backup of each of `versions` contents of a db file."""
+
+    for version in range(versions):
+        filename = write_db("(^_^)\tv{}\n".format(version))
+        store = BackupStore(filename)
+        store.backup()
+
+    return store
+
+
+def test_prune_refuses_to_keep_no_backup(write_db):
+    store = backed_up_store(write_db)
+
+    with pytest.raises(ValueError):
+        store.prune(keep_last=0)
+
+    assert len(store.backups()) == 3
+
+
+def test_prune_keeps_the_newest_backup(write_db):
+    store = backed_up_store(write_db)
+    newest = store.backups()[-1].backup_id
+
+    assert len(store.prune(max_age=-1)) == 2
+    assert [backup.backup_id for backup in store.backups()] == [newest]
+
+    assert store.prune(keep_last=1, max_age=-1) == []
+
+
+def test_keep_last_below_1_is_refused(tmp_path, write_db):
+    filename = write_db()
+    config_filename = tmp_path / "config.toml"
+    config_filename.write_text("backup_keep_last = 0\n")
+
+    result = CliRunner().invoke(cli, [
+        "backups", "prune", "-f", filename, "-c", str(config_filename),
+        "-n", "0"])
+    assert result.exit_code == 2
+
+    result = CliRunner().invoke(cli, [
+        "edit", "-f", filename, "-c", str(config_filename),
+        "-k", "(^_^)", "-a", "smile"])
+    assert result.exit_code == 1
+    assert "backup_keep_last is 0" in result.output
+    assert "Traceback" not in result.output
@@ -0,0 +1,93 @@
+import io
+
+import pytest
+from click.testing import CliRunner
+
+from kaomojitool.__main__ import cli
+from kaomojitool.changeset import CHANGESET_HEADER
+from kaomojitool.changeset import KaomojiChangesetInvalid
+from kaomojitool.changeset import apply_changes
+from kaomojitool.changeset import code_hash
+from kaomojitool.changeset import iter_changes
+from kaomojitool.changeset import iter_changeset
+from kaomojitool.diff import iter_changes_partitioned
+from kaomojitool.diff import iter_changes_sorted
+from kaomojitool.kaomoji import KaomojiDB
+
+
+SOURCE = "(-_-)\tbored\n(T_T)\tsad, cry\n(^_^)\thappy, smile\n(o_o)\twow\n"
+TARGET = "(-_-)\tbored\n(>_<)\tangry\n(T_T)\tsad\n(^_^)\thappy, cat\n"
+
+
+def test_apply_refuses_an_invalid_changeset_before_editing(
+        tmp_path, write_db, config_filename):
+    filename = write_db()
+    changeset = CHANGESET_HEADER +\
+        "kwadd\t{}\tsmile\n".format(code_hash("(^_^)")) +\
+        "bogus\t{}\n".format(code_hash("(T_T)"))
+
+    result = CliRunner().invoke(cli, [
+        "apply", "-f", filename, "-c", config_filename, "-i", "-"],
+        input=changeset)
+
+    assert result.exit_code == 1
+    assert "line 3" in result.output
+    assert "Traceback" not in result.output
+    assert KaomojiDB(filename=filename).get_kaomoji_by_code("(^_^)")\
+        .keywords == ("happy",)
+    assert not (tmp_path / "db.tsv.backups").exists()
+
+
+@pytest.mark.parametrize("how", ["memory", "sorted", "partitioned"])
+def test_changeset_round_trip(load_db, db_contents, how):
+    source = load_db(SOURCE, name="source.tsv")
+    target = load_db(TARGET, name="target.tsv")
+
+    if how == "memory":
+        lines = iter_changes(source.kaomojis, target.kaomojis)
+    elif how == "sorted":
+        lines = iter_changes_sorted(source.filename, target.filename)
+    else:
+        lines = iter_changes_partitioned(source.filename, target.filename,
+                                         partitions=3)
+
+    changeset = io.StringIO(CHANGESET_HEADER + "".join(lines))
+    report = apply_changes(source, iter_changeset(changeset))
+
+    assert db_contents(source) == db_contents(target)
+    # updated counts keyword changes: (^_^) has a kwrm and a kwadd
+    assert report == dict(added=1, removed=1, updated=3, missing=0)
+
+
+def test_changeset_of_equal_databases_is_empty(load_db):
+    source = load_db(SOURCE)
+
+    assert list(iter_changes(source.kaomojis, source.kaomojis)) == []
+
+
+def test_changes_to_missing_entries_are_skipped(load_db):
+    source = load_db(SOURCE, name="source.tsv")
+    target = load_db(TARGET, name="target.tsv")
+    changeset = io.StringIO(
+        "".join(iter_changes(source.kaomojis, target.kaomojis)))
+    other = load_db("(^_^)\thappy, smile\n", name="other.tsv")
+
+    report = apply_changes(other, iter_changeset(changeset))
+
+    assert report["missing"] == 2
+    assert other.get_kaomoji_by_code("(^_^)").keywords == ("happy", "cat")
+
+
+@pytest.mark.parametrize("line", [
+    "bogus\t{}\n".format(code_hash("(^_^)")),
+    "rm\tabc\n",
+    "rm\t{}\textra\n".format(code_hash("(^_^)")),
+    "add\t{}\t(T_T)\tsad\n".format(code_hash("(^_^)")),
+])
+def test_iter_changeset_refuses_invalid_lines(line):
+    changeset = io.StringIO(CHANGESET_HEADER + "\n" + line)
+
+    with pytest.raises(KaomojiChangesetInvalid) as error:
+        list(iter_changeset(changeset))
+
+    assert error.value.args[1] == 3
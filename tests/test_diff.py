@@ -0,0 +1,48 @@
+import pytest
+from click.testing import CliRunner
+
+from kaomojitool.__main__ import cli
+from kaomojitool.diff import KaomojiDBNotSorted
+from kaomojitool.diff import iter_compare_partitioned
+from kaomojitool.diff import iter_compare_sorted
+from kaomojitool.kaomoji import DIFF_TYPES
+
+
+@pytest.mark.parametrize("diff_type", DIFF_TYPES)
+def test_iter_compare_sorted_matches_partitioned(write_db, diff_type):
+    filename = write_db("a\tx, y\nb\ty\nc\tz\nc\tw\n", name="a.tsv")
+    other_filename = write_db("a\ty, q\nc\tw\nd\tv\n", name="b.tsv")
+
+    def lines(kaomojis):
+        return sorted(kaomoji.to_line_entry() for kaomoji in kaomojis)
+
+    assert lines(iter_compare_sorted(filename, other_filename, diff_type))\
+        == lines(iter_compare_partitioned(filename, other_filename,
+                                          diff_type, partitions=3))
+
+
+@pytest.mark.parametrize("unsorted", ["this", "other"])
+def test_iter_compare_sorted_refuses_unsorted_input(write_db, unsorted):
+    sorted_filename = write_db("a\tx\nb\ty\n", name="sorted.tsv")
+    unsorted_filename = write_db("b\ty\na\tx\n", name="unsorted.tsv")
+    filenames = (unsorted_filename, sorted_filename) if unsorted == "this"\
+        else (sorted_filename, unsorted_filename)
+
+    with pytest.raises(KaomojiDBNotSorted) as error:
+        list(iter_compare_sorted(*filenames))
+
+    assert error.value.args[1] == unsorted_filename
+
+
+def test_diff_sorted_reports_unsorted_input(write_db, config_filename):
+    filename = write_db("b\ty\na\tx\n", name="a.tsv")
+    other_filename = write_db("a\tx\n", name="b.tsv")
+
+    result = CliRunner().invoke(cli, [
+        "diff", "-f", filename, "-o", other_filename, "-c", config_filename,
+        "--stream", "--sorted"])
+
+    assert result.exit_code == 1
+    assert "not sorted" in result.output
+    assert "without --sorted" in result.output
+    assert "Traceback" not in result.output
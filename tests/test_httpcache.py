@@ -0,0 +1,123 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from kaomojitool.httpcache import HTTPCache
+from kaomojitool.httpcache import content_digest
+from kaomojitool.scrape import Scraper
+from kaomojitool.scrape import XPathExtractor
+
+PAGE = b"<html><body><p>(^_^)</p><p>(T_T)</p></body></html>"
+ETAG = '"v1"'
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    """Serves PAGE with an ETag, and 304 to requests already having it."""
+
+    def do_GET(self):
+        self.server.conditional_requests.append(
+            self.headers.get("If-None-Match"))
+
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ETagHandler)
+    server.conditional_requests = list()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+class CountingExtractor(XPathExtractor):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parsed = 0
+
+    def extract(self, content):
+        self.parsed += 1
+        return super().extract(content)
+
+
+def test_not_modified_pages_reuse_the_cache(server, tmp_path):
+    url = "http://127.0.0.1:{}/page".format(server.server_port)
+    extractor = CountingExtractor(kaomoji_xpath="//p")
+
+    with HTTPCache(directory=str(tmp_path)) as cache,\
+            Scraper(cache=cache) as scraper:
+        page = scraper.fetch(url)
+        assert not page.unchanged
+        assert scraper.extract(page, extractor) == [("(^_^)", []),
+                                                     ("(T_T)", [])]
+
+        page = scraper.fetch(url)
+        assert page.unchanged and page.content is None
+        assert scraper.extract(page, extractor) == [("(^_^)", []),
+                                                     ("(T_T)", [])]
+
+    assert server.conditional_requests == [None, ETAG]
+    assert extractor.parsed == 1
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path):
+    pages = {url: os.urandom(1000) for url in ("a", "b", "c", "d")}
+
+    with HTTPCache(directory=str(tmp_path), max_size=3500) as cache:
+        for url in ("a", "b", "c"):
+            cache.put_response(url, pages[url])
+            cache.put_extraction(cache.get_response(url).digest, "key",
+                                 [url])
+
+        cache.touch("a")
+        cache.put_response("d", pages["d"])
+
+        assert cache.get_response("b") is None
+        assert cache.get_extraction(content_digest(pages["b"]),
+                                    "key") is None
+
+        for url in ("a", "c", "d"):
+            assert cache.get_body(url) == pages[url]
+
+        assert cache.size <= cache.max_size
+
+
+def test_eviction_keeps_the_extractions_of_local_files(tmp_path):
+    filename = tmp_path / "page.html"
+    filename.write_bytes(PAGE)
+    extractor = CountingExtractor(kaomoji_xpath="//p")
+
+    with HTTPCache(directory=str(tmp_path / "cache"), max_size=1500) as cache,\
+            Scraper(cache=cache) as scraper:
+        page = scraper.fetch(str(filename))
+        scraper.extract(page, extractor)
+
+        # evicts a page, with the local file's extraction in the cache
+        cache.put_response("a", os.urandom(1000))
+        cache.put_response("b", os.urandom(1000))
+
+        scraper.extract(scraper.fetch(str(filename)), extractor)
+
+    assert extractor.parsed == 1
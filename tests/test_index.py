@@ -0,0 +1,208 @@
+import random
+from array import array
+
+import pytest
+
+from kaomojitool.index import POSTING_TYPECODE
+from kaomojitool.index import KeywordDictionary
+from kaomojitool.index import KeywordIndex
+from kaomojitool.index import TrigramIndex
+from kaomojitool.index import edit_distance
+from kaomojitool.kaomoji import Kaomoji
+
+ENTRIES = {
+    0: ("happy", "smile", "cat"),
+    1: ("sad", "cry"),
+    2: ("happy", "dance"),
+    3: ("hap", "cat", "unhappy"),
+    4: ("a", "ha", "sa"),
+}
+
+
+def levenshtein(text, other):
+    previous = list(range(len(other) + 1))
+
+    for i, character in enumerate(text, start=1):
+        current = [i]
+
+        for j, other_character in enumerate(other, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] +
+                               (character != other_character)))
+
+        previous = current
+
+    return previous[-1]
+
+
+def build_index(entries=ENTRIES):
+    index = KeywordIndex()
+
+    for entry_id, keywords in entries.items():
+        index.add(entry_id, keywords)
+
+    return index
+
+
+def all_keywords(entries=ENTRIES):
+    return {keyword for keywords in entries.values() for keyword in keywords}
+
+
+def test_query_prefix():
+    index = build_index()
+
+    assert list(index.keywords_with_prefix("ha")) == ["ha", "hap", "happy"]
+    assert list(index.query("ha")) == [4, 3, 0, 2]
+    assert list(index.query("x")) == []
+
+
+def test_query_all():
+    index = build_index()
+
+    assert index.query_all(["happy", "cat"]) == [0]
+    assert index.query_all(["cat"]) == [0, 3]
+    assert index.query_all(["cat", "missing"]) == []
+    assert index.query_all([]) == []
+
+
+def test_remove_drops_the_keywords_left_without_entries():
+    index = build_index()
+    index.remove(3, ENTRIES[3])
+
+    assert list(index.keywords_with_prefix("ha")) == ["ha", "happy"]
+    assert index.query_all(["cat"]) == [0]
+    assert list(index.query("un")) == []
+
+
+def test_keyword_dictionary_ids():
+    dictionary = KeywordDictionary()
+
+    assert [dictionary.encode(keyword)
+            for keyword in ("happy", "sad", "happy")] == [0, 1, 0]
+    assert dictionary.lookup("sad") == 1
+    assert dictionary.lookup("missing") is None
+    assert dictionary.decode(1) == "sad"
+    assert len(KeywordDictionary(["a", "b"])) == 2
+
+
+def test_postings_are_ascending_arrays_of_entry_ids():
+    index = KeywordIndex()
+
+    for entry_id in (5, 1, 9, 3, 5):
+        index.add(entry_id, ("cat",))
+
+    assert index.posting("cat") == array(POSTING_TYPECODE, [1, 3, 5, 9])
+    assert index.keyword_count("cat") == 4
+    assert index.posting("missing") == array(POSTING_TYPECODE)
+
+    index.remove(3, ("cat", "missing"))
+
+    assert index.posting("cat") == array(POSTING_TYPECODE, [1, 5, 9])
+
+
+def test_renumber_keeps_the_queries(load_db):
+    database = load_db("(^_^)\thappy\n(T_T)\tsad\n(^o^)\thappy, cat\n")
+    database.remove_kaomoji(database.get_kaomoji_by_code("(^_^)"))
+    database.renumber_entries()
+
+    assert database.keyword_index.posting("happy") ==\
+        array(POSTING_TYPECODE, [1])
+    assert list(database.query("ha")) == ["(^o^)"]
+    assert list(database.query_all("happy, cat")) == ["(^o^)"]
+
+
+def test_database_queries_follow_edits(load_db):
+    database = load_db("(^_^)\thappy, smile\n(T_T)\tsad\n(^o^)\thappy\n")
+
+    assert list(database.query("hap")) == ["(^_^)", "(^o^)"]
+    assert list(database.query_all("happy, smile")) == ["(^_^)"]
+
+    database.remove_kaomoji(database.get_kaomoji_by_code("(^_^)"))
+    database.get_kaomoji_by_code("(T_T)").add_keywords("happy")
+    database.add_kaomoji(Kaomoji(code="(o_o)", keywords="smile"))
+
+    assert list(database.query("hap")) == ["(T_T)", "(^o^)"]
+    assert list(database.query_all("smile")) == ["(o_o)"]
+
+
+@pytest.mark.parametrize("substring", ["a", "ha", "app", "happy", "nha",
+                                       "zzz", "ppy"])
+def test_keywords_containing_matches_brute_force(substring):
+    index = build_index()
+
+    assert set(index.keywords_containing(substring, limit=100)) ==\
+        {keyword for keyword in all_keywords() if substring in keyword}
+
+
+def test_keywords_containing_ranks_prefixes_first():
+    index = build_index()
+
+    assert index.keywords_containing("hap", limit=2) == ["hap", "happy"]
+
+
+@pytest.mark.parametrize("keyword,max_distance", [
+    ("hapy", 1), ("happy", 1), ("sda", 2), ("dnace", 2), ("ct", 1),
+    ("x", 1), ("unhappy", 0)])
+def test_keywords_near_matches_brute_force(keyword, max_distance):
+    index = build_index()
+
+    assert set(index.keywords_near(keyword, max_distance, limit=100)) ==\
+        {other for other in all_keywords()
+         if levenshtein(keyword, other) <= max_distance}
+
+
+def test_keywords_near_ranks_closest_first():
+    index = build_index()
+
+    # "happy" and "hap" are one edit away; "happy" is used more
+    assert index.keywords_near("hapy", max_distance=2) ==\
+        ["happy", "hap", "ha"]
+
+
+def test_edit_distance_stops_past_max_distance():
+    assert edit_distance("kitten", "sitting", 3) == 3
+    assert edit_distance("kitten", "sitting", 1) > 1
+    assert edit_distance("same", "same", 0) == 0
+
+
+def test_trigram_index_kept_up_to_date_matches_a_fresh_one():
+    generator = random.Random(0)
+    words = ["".join(generator.choice("abc")
+                     for _ in range(generator.randint(1, 6)))
+             for _ in range(60)]
+    entries = {entry_id: tuple(words[entry_id::20]) for entry_id in range(20)}
+    index = build_index(entries)
+    index.trigram_index()  # built before the edits, then kept up to date
+
+    for entry_id in range(0, 20, 3):
+        index.remove(entry_id, entries.pop(entry_id))
+
+    entries[20] = ("abcabc", "ccc")
+    index.add(20, entries[20])
+
+    fresh = TrigramIndex()
+
+    for keyword_id in index.postings:
+        fresh.add(keyword_id, index.dictionary.decode(keyword_id))
+
+    assert index.trigram_index().postings == fresh.postings
+
+    for keyword in ("ab", "bca", "c", "abcab"):
+        assert set(index.keywords_containing(keyword, limit=100)) ==\
+            {other for other in all_keywords(entries) if keyword in other}
+        assert set(index.keywords_near(keyword, 1, limit=100)) ==\
+            {other for other in all_keywords(entries)
+             if levenshtein(keyword, other) <= 1}
+
+
+def test_database_substring_and_fuzzy_queries_follow_edits(load_db):
+    database = load_db("(^_^)\thappy, smile\n(T_T)\tsad\n")
+
+    assert list(database.query_substring("ppy")) == ["(^_^)"]
+    assert list(database.query_fuzzy("sda", max_distance=2)) == ["(T_T)"]
+
+    database.remove_kaomoji(database.get_kaomoji_by_code("(^_^)"))
+    database.add_kaomoji(Kaomoji(code="(o_o)", keywords="unhappy"))
+
+    assert list(database.query_substring("ppy")) == ["(o_o)"]
+    assert list(database.query_fuzzy("smile")) == []
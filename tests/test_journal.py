@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from kaomojitool.journal import JOURNAL_KEYWORDS_ADD
+from kaomojitool.journal import format_record
+from kaomojitool.journal import journal_filename
+from kaomojitool.kaomoji import Kaomoji
+from kaomojitool.kaomoji import KaomojiDB
+from kaomojitool.snapshot import read_snapshot
+
+DATABASE_TEXT = "(^_^)\thappy\n(T_T)\tsad\n(o_o)\tsurprised\n"
+
+
+@pytest.fixture
+def filename(write_db):
+    return write_db(DATABASE_TEXT)
+
+
+def edit(database):
+    database.get_kaomoji_by_code("(^_^)").add_keywords("smile, cat")
+    database.get_kaomoji_by_code("(T_T)").remove_keywords("sad")
+    database.remove_kaomoji(database.get_kaomoji_by_code("(o_o)"))
+    database.add_kaomoji(Kaomoji(code="(>_<)", keywords="angry"))
+
+
+def test_write_appends_the_edits_to_the_journal(filename, db_contents):
+    database = KaomojiDB(filename=filename, use_journal=True)
+    edit(database)
+    database.write()
+
+    with open(filename, encoding="utf-8") as db_file:
+        assert db_file.read() == DATABASE_TEXT
+
+    assert os.path.exists(journal_filename(filename))
+    assert db_contents(KaomojiDB(filename=filename)) ==\
+        db_contents(database)
+    assert list(KaomojiDB(filename=filename).query_all("cat")) == ["(^_^)"]
+
+
+def test_replay_ignores_an_interrupted_record(filename, db_contents):
+    database = KaomojiDB(filename=filename, use_journal=True)
+    database.get_kaomoji_by_code("(^_^)").add_keywords("smile")
+    database.write()
+
+    with open(journal_filename(filename), "a", encoding="utf-8") as journal:
+        journal.write(format_record(JOURNAL_KEYWORDS_ADD, "(T_T)",
+                                    ["cry"]).rstrip("\n"))
+
+    assert db_contents(KaomojiDB(filename=filename)) ==\
+        db_contents(database)
+
+
+def test_compact_folds_the_journal_into_the_file(filename, db_contents):
+    database = KaomojiDB(filename=filename, use_journal=True)
+    edit(database)
+    database.write()
+
+    database = KaomojiDB(filename=filename, use_journal=True)
+    database.compact()
+
+    assert not os.path.exists(journal_filename(filename))
+    assert db_contents(KaomojiDB(filename=filename)) == {
+        "(^_^)": ("happy", "smile", "cat"), "(T_T)": (),
+        "(>_<)": ("angry",)}
+    # the removed entry's id is gone from the index
+    assert database.entries == list(database.kaomojis.values())
+
+
+def test_replaying_a_journal_already_compacted_changes_nothing(
+        filename, db_contents):
+    database = KaomojiDB(filename=filename, use_journal=True)
+    edit(database)
+    database.write()
+
+    with open(journal_filename(filename), encoding="utf-8") as journal:
+        records = journal.read()
+
+    database.compact()
+    expected = db_contents(database)
+
+    # as if compact was interrupted after rewriting the file
+    with open(journal_filename(filename), "w", encoding="utf-8") as journal:
+        journal.write(records)
+
+    assert db_contents(KaomojiDB(filename=filename)) == expected
+
+
+def test_journal_is_replayed_on_top_of_the_snapshot(filename):
+    database = KaomojiDB(filename=filename, use_snapshot=True,
+                         use_journal=True)
+    database.get_kaomoji_by_code("(^_^)").add_keywords("smile")
+    database.write()
+
+    assert read_snapshot(filename) is not None
+    assert KaomojiDB(filename=filename, use_snapshot=True)\
+        .get_kaomoji_by_code("(^_^)").keywords == ("happy", "smile")
@@ -0,0 +1,114 @@
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from kaomojitool.kaomoji import KaomojiDB
+from kaomojitool.lock import DatabaseLock
+from kaomojitool.lock import KaomojiDBLockTimeout
+
+CODES = ["(^_^)", "(T_T)", "(>_<)"]
+WORKERS = 4
+EDITS = 5
+
+
+@pytest.fixture
+def database(tmp_path):
+    filename = str(tmp_path / "db.tsv")
+    config_filename = str(tmp_path / "config.toml")
+
+    with open(filename, "w", encoding="utf-8") as db_file:
+        db_file.writelines("{}\tface\n".format(code) for code in CODES)
+
+    with open(config_filename, "w", encoding="utf-8") as config_file:
+        config_file.write("database_filename = {!r}\n".format(filename))
+
+    return filename, config_filename
+
+
+def kaomojitool(*arguments, **kwargs) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-m", "kaomojitool", *arguments],
+                          capture_output=True, text=True, **kwargs)
+
+
+def run_worker(worker, filename, config_filename, group_commit):
+    """Adds keywords of its own to the kaomojis, one command per edit."""
+
+    expected = {code: set() for code in CODES}
+
+    for edit in range(EDITS):
+        code = CODES[(worker + edit) % len(CODES)]
+        keyword = "worker{}edit{}".format(worker, edit)
+        expected[code].add(keyword)
+
+        result = kaomojitool(
+            "kwadd", "-f", filename, "-c", config_filename,
+            "--kaomoji=" + code, "-w", keyword,
+            *(["--group-commit"] if group_commit else []))
+        assert result.returncode == 0, result.stderr
+
+    return expected
+
+
+@pytest.mark.parametrize("group_commit", [False, True])
+def test_concurrent_writers_lose_no_edit(database, group_commit):
+    filename, config_filename = database
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        expected = list(executor.map(
+            run_worker, range(WORKERS), [filename] * WORKERS,
+            [config_filename] * WORKERS, [group_commit] * WORKERS))
+
+    kaomojis = KaomojiDB(filename=filename).kaomojis
+
+    for code in CODES:
+        keywords = set(kaomojis[code].keywords) - {"face"}
+        assert keywords == set().union(*(worker_expected[code]
+                                         for worker_expected in expected))
+
+
+def test_lock_timeout(database):
+    filename, _ = database
+
+    with DatabaseLock(filename):
+        assert not DatabaseLock(filename).acquire(blocking=False)
+
+        with pytest.raises(KaomojiDBLockTimeout):
+            DatabaseLock(filename, timeout=0.1).acquire()
+
+    lock = DatabaseLock(filename)
+    assert lock.acquire(blocking=False)
+    lock.release()
+
+
+def test_server_holds_the_lock(database):
+    filename, config_filename = database
+    server = subprocess.Popen(
+        [sys.executable, "-m", "kaomojitool", "serve", "-f", filename,
+         "-c", config_filename],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        deadline = time.monotonic() + 10
+
+        while not os.path.exists(filename + ".sock"):
+            assert time.monotonic() < deadline and server.poll() is None
+            time.sleep(0.05)
+
+        assert not DatabaseLock(filename).acquire(blocking=False)
+
+        # refused instead of waiting for the server to stop
+        result = kaomojitool("edit", "-f", filename, "-c", config_filename,
+                             "-k", "(^_^)", "-a", "smile", timeout=10)
+        assert result.returncode != 0
+        assert "KaomojiToolServerRunning" in result.stderr
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    lock = DatabaseLock(filename)
+    assert lock.acquire(blocking=False)
+    lock.release()
@@ -0,0 +1,57 @@
+import pytest
+from click.testing import CliRunner
+
+from kaomojitool.__main__ import cli
+from kaomojitool.kaomoji import Kaomoji
+from kaomojitool.kaomoji import KaomojiDB
+from kaomojitool.kaomoji import lookup_kaomoji
+from kaomojitool.sqlite import KaomojiSQLiteDB
+
+SMILE = Kaomoji(code="(^_^)", keywords="happy")
+
+
+@pytest.fixture(params=["tsv", "sqlite"])
+def database(request, tmp_path):
+    if request.param == "tsv":
+        database = KaomojiDB()
+    else:
+        database = KaomojiSQLiteDB(filename=str(tmp_path / "db.sqlite"))
+
+    database.add_kaomoji(Kaomoji(code=SMILE.code, keywords=SMILE.keywords))
+
+    yield database
+
+    if request.param == "sqlite":
+        database.close()
+
+
+def test_get_kaomoji_matches_str_as_code_only(database):
+    assert database.get_kaomoji(SMILE.code).code == SMILE.code
+    assert database.get_kaomoji(SMILE.hash) is None
+    assert database.get_kaomoji(SMILE.shortcode) is None
+    assert database.get_kaomoji(int(SMILE.hash, 16)).code == SMILE.code
+
+
+def test_lookup_kaomoji_by_code_hash_or_shortcode(database):
+    for entity in (SMILE.code, SMILE.hash, SMILE.hash.upper(),
+                   SMILE.shortcode):
+        assert lookup_kaomoji(database, entity).code == SMILE.code
+
+    assert lookup_kaomoji(database, "(T_T)") is None
+
+
+@pytest.mark.parametrize("code", [SMILE.hash, SMILE.shortcode])
+def test_kwadd_of_a_code_like_a_hash_or_shortcode_adds_it(tmp_path, code):
+    filename = tmp_path / "db.tsv"
+    filename.write_text(SMILE.to_line_entry(), encoding="utf-8")
+    config_filename = tmp_path / "config.toml"
+    config_filename.write_text("")
+
+    result = CliRunner().invoke(cli, [
+        "kwadd", "-f", str(filename), "-c", str(config_filename),
+        "--kaomoji=" + code, "-w", "new"])
+    assert result.exit_code == 0, result.output
+
+    kaomojis = KaomojiDB(filename=str(filename)).kaomojis
+    assert kaomojis[SMILE.code].keywords == ("happy",)
+    assert kaomojis[code].keywords == ("new",)
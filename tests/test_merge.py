@@ -0,0 +1,71 @@
+import pytest
+
+from kaomojitool.kaomoji import CONFLICT_DELETE_EDIT
+from kaomojitool.kaomoji import CONFLICT_EDIT_DELETE
+from kaomojitool.kaomoji import merge_keywords
+
+
+@pytest.mark.parametrize("base,ours,theirs,merged", [
+    (("a",), ("a",), ("a", "b"), ("a", "b")),
+    (("a",), ("a", "b"), ("a",), ("a", "b")),
+    (("a", "b"), ("a", "b", "c"), ("b", "d"), ("b", "c", "d")),
+    (None, ("a", "b"), ("b", "c"), ("a", "b", "c")),
+    (("a",), None, ("a",), None),
+    (("a",), ("a",), None, None),
+    (("a",), None, None, None),
+])
+def test_merge_keywords(base, ours, theirs, merged):
+    assert merge_keywords(base, ours, theirs) == (merged, None)
+
+
+@pytest.mark.parametrize("base,ours,theirs,merged,conflict", [
+    (("a",), None, ("a", "b"), ("a", "b"), CONFLICT_DELETE_EDIT),
+    (("a",), ("b",), None, ("b",), CONFLICT_EDIT_DELETE),
+])
+def test_merge_keywords_conflicts(base, ours, theirs, merged, conflict):
+    assert merge_keywords(base, ours, theirs) == (merged, conflict)
+
+
+def test_merge_databases(load_db, db_contents):
+    base = load_db("(^_^)\thappy\n(T_T)\tsad\n(o_o)\tsurprised\n"
+                   "(-_-)\tbored\n", name="base.tsv")
+    ours = load_db("(^_^)\thappy, smile\n(o_o)\tsurprised, wow\n"
+                   "(-_-)\tbored\n(>_<)\tangry\n", name="ours.tsv")
+    theirs = load_db("(^_^)\thappy, joy\n(T_T)\tsad, cry\n(-_-)\tbored\n",
+                     name="theirs.tsv")
+
+    report, conflicts = ours.merge(base=base, other=theirs)
+
+    assert db_contents(ours) == {
+        "(^_^)": ("happy", "smile", "joy"),
+        "(T_T)": ("sad", "cry"),
+        "(o_o)": ("surprised", "wow"),
+        "(-_-)": ("bored",),
+        "(>_<)": ("angry",)}
+    assert report == dict(added=1, updated=1, removed=0)
+    assert sorted((conflict.code, conflict.conflict, conflict.base,
+                   conflict.ours, conflict.theirs)
+                  for conflict in conflicts) == [
+        ("(T_T)", CONFLICT_DELETE_EDIT, ("sad",), None, ("sad", "cry")),
+        ("(o_o)", CONFLICT_EDIT_DELETE, ("surprised",),
+         ("surprised", "wow"), None)]
+    assert list(ours.query("cr")) == ["(T_T)"]
+
+
+def test_merge_removes_the_entries_deleted_by_theirs(load_db):
+    base = load_db(name="base.tsv")
+    ours = load_db(name="ours.tsv")
+    theirs = load_db("(^_^)\thappy\n", name="theirs.tsv")
+
+    report, conflicts = ours.merge(base=base, other=theirs)
+
+    assert list(ours.kaomojis) == ["(^_^)"]
+    assert report == dict(added=0, updated=0, removed=1)
+    assert conflicts == []
+
+
+def test_merge_refuses_a_non_database(load_db):
+    ours = load_db()
+
+    with pytest.raises(TypeError):
+        ours.merge(base=ours, other=dict())
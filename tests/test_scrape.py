@@ -0,0 +1,192 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+from click.testing import CliRunner
+
+from kaomojitool import scrape
+from kaomojitool.__main__ import cli
+from kaomojitool.kaomoji import KaomojiDB
+from kaomojitool.scrape import Scraper
+from kaomojitool.scrape import split_keywords
+from kaomojitool.scrape import text_of
+
+PAGE = b"<html><body><p>(^_^)</p></body></html>"
+SLOW_SECONDS = 0.3
+
+
+class PageServer(ThreadingHTTPServer):
+    """Serves PAGE at any path; /slow/... takes SLOW_SECONDS, and
+        /flaky<n>/... fails with 503 the first n times it is requested.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), PageHandler)
+        self.lock = threading.Lock()
+        self.times = list()  # of each request
+        self.counts = dict()  # requests of each path
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.retry_after = None
+
+    def url(self, path: str) -> str:
+        return "http://127.0.0.1:{}{}".format(self.server_port, path)
+
+
+class PageHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+
+        with server.lock:
+            server.times.append(time.monotonic())
+            count = server.counts[self.path] =\
+                server.counts.get(self.path, 0) + 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight,
+                                       server.in_flight)
+
+        try:
+            if self.path.startswith("/slow/"):
+                time.sleep(SLOW_SECONDS)
+
+            failures = int(self.path[6:].split("/")[0])\
+                if self.path.startswith("/flaky") else 0
+
+            if count <= failures:
+                self.send_response(503)
+
+                if server.retry_after is not None:
+                    self.send_header("Retry-After", server.retry_after)
+
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(scrape, "RETRY_BACKOFF", 0.01)
+
+    server = PageServer()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def fetch_all(scraper, urls):
+    results = dict()
+
+    with scraper:
+        for url, page, error in scraper.iter_fetch(urls):
+            results[url] = page if error is None else error
+
+    return results
+
+
+def test_pages_are_fetched_concurrently(server):
+    urls = [server.url("/slow/{}".format(number)) for number in range(8)]
+
+    start = time.monotonic()
+    results = fetch_all(Scraper(workers=8), urls)
+    seconds = time.monotonic() - start
+
+    assert all(results[url].content == PAGE for url in urls)
+    assert server.max_in_flight > 1
+    assert seconds < SLOW_SECONDS * len(urls) / 2
+
+
+def test_failed_requests_are_retried(server):
+    url = server.url("/flaky2/page")
+
+    results = fetch_all(Scraper(retries=3), [url])
+
+    assert results[url].content == PAGE
+    assert server.counts["/flaky2/page"] == 3
+
+
+def test_retries_give_up(server):
+    url = server.url("/flaky5/page")
+
+    results = fetch_all(Scraper(retries=2), [url])
+
+    assert isinstance(results[url], requests.HTTPError)
+    assert server.counts["/flaky5/page"] == 3
+
+
+def test_retry_after_is_followed(server):
+    server.retry_after = "1"
+    url = server.url("/flaky1/page")
+
+    results = fetch_all(Scraper(retries=1), [url])
+
+    assert results[url].content == PAGE
+    assert server.times[1] - server.times[0] >= 0.9
+
+
+def test_rate_limit_covers_the_retries(server):
+    rate = 10
+    urls = [server.url("/flaky2/{}".format(number)) for number in range(4)]
+
+    results = fetch_all(Scraper(workers=4, retries=2, rate_limit=rate),
+                        urls)
+
+    assert all(results[url].content == PAGE for url in urls)
+    assert len(server.times) == 12
+
+    times = sorted(server.times)
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert min(gaps) >= 1 / rate * 0.9
+
+
+def test_text_of_collapses_whitespace():
+    assert text_of(" happy\n\t face ") == "happy face"
+    # no-break spaces are part of some kaomojis
+    assert text_of("(\xa0\xa0^_^)") == "(\xa0\xa0^_^)"
+
+
+def test_split_keywords():
+    assert split_keywords(["happy", "joy, glee", " ", "bad\tone", "x,"]) ==\
+        ["happy", "joy", "glee", "x"]
+
+
+def test_scrape_into_db_round_trip(tmp_path, write_db, config_filename):
+    filename = write_db("(T_T)\tsad\n")
+    page = tmp_path / "page.html"
+    page.write_text("<table><tr><td>(^_^)</td><td><a>happy\nface</a>"
+                    "<a>joy, glee</a></td></tr></table>", encoding="utf-8")
+
+    result = CliRunner().invoke(cli, [
+        "scrape", "-u", str(page), "-C", "//tr", "-x", "./td[1]",
+        "-X", "./td[2]//a", "--no-cache", "--into-db",
+        "-f", filename, "-c", config_filename])
+
+    assert result.exit_code == 0, result.output
+
+    database = KaomojiDB(filename=filename)
+
+    assert list(database.kaomojis) == ["(T_T)", "(^_^)"]
+    assert database.get_kaomoji_by_code("(^_^)").keywords ==\
+        ("happy face", "joy", "glee")
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from kaomojitool import server as server_module
+from kaomojitool.client import KaomojiClient
+from kaomojitool.kaomoji import Kaomoji
+from kaomojitool.kaomoji import KaomojiDB
+from kaomojitool.server import KaomojiServer
+from kaomojitool.sqlite import KaomojiSQLiteDB
+
+CLIENTS = 8
+EDITS = 10
+
+
+@pytest.fixture
+def serve(tmp_path):
+    """serve(database) starts a KaomojiServer of it in a thread."""
+
+    started = list()
+
+    def start(database):
+        server = KaomojiServer(database=database,
+                               socket_filename=str(tmp_path / "db.sock"),
+                               flush_interval=0.1)
+        thread = threading.Thread(target=server.serve_forever,
+                                  kwargs={"poll_interval": 0.05})
+        thread.start()
+        started.append((server, thread))
+
+        return server
+
+    yield start
+
+    for server, thread in started:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+
+
+@pytest.fixture
+def server(serve, load_db):
+    return serve(load_db("(^_^)\thappy\n"))
+
+
+def test_idle_connection_doesnt_hold_up_the_others(server):
+    idle = KaomojiClient.connect(server.server_address)
+    assert idle.query("hap")
+
+    client = KaomojiClient.connect(server.server_address)
+
+    for _ in range(10):
+        start = time.monotonic()
+        assert list(client.query("hap")) == ["(^_^)"]
+        assert time.monotonic() - start < 0.1
+
+    idle.close()
+    client.close()
+
+
+def test_idle_connection_is_closed_and_reconnects(server, monkeypatch):
+    monkeypatch.setattr(server_module.KaomojiRequestHandler, "timeout", 0.1)
+
+    idle = KaomojiClient.connect(server.server_address)
+    assert idle.query("hap")
+
+    time.sleep(0.3)
+
+    # closed by the server meanwhile, the idle client reconnects
+    assert list(idle.query("hap")) == ["(^_^)"]
+
+    idle.close()
+
+
+def test_idle_connection_doesnt_block_the_flush(server):
+    idle = KaomojiClient.connect(server.server_address)
+    client = KaomojiClient.connect(server.server_address)
+    client.add_keywords(code="(^_^)", keywords="smile")
+    client.close()
+
+    deadline = time.monotonic() + 5
+
+    while server.pending_edits and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert not server.pending_edits
+    assert KaomojiDB(filename=server.database.filename)\
+        .get_kaomoji_by_code("(^_^)").keywords == ("happy", "smile")
+
+    idle.close()
+
+
+def test_concurrent_clients_edits_are_all_applied(server):
+    def edit(number):
+        client = KaomojiClient.connect(server.server_address)
+
+        for edit_number in range(EDITS):
+            client.add_keywords(code="(^_^)", keywords="client{}-{}".format(
+                number, edit_number))
+
+        client.close()
+
+    threads = [threading.Thread(target=edit, args=(number,))
+               for number in range(CLIENTS)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    server.flush()
+
+    keywords = KaomojiDB(filename=server.database.filename)\
+        .get_kaomoji_by_code("(^_^)").keywords
+
+    assert len(keywords) == 1 + CLIENTS * EDITS
+
+
+def test_sqlite_database_is_served_from_the_connection_threads(serve,
+                                                              tmp_path):
+    database = KaomojiSQLiteDB(filename=str(tmp_path / "db.sqlite"))
+    database.add_kaomoji(Kaomoji(code="(^_^)", keywords="happy"))
+    server = serve(database)
+
+    client = KaomojiClient.connect(server.server_address)
+    client.add_keywords(code="(^_^)", keywords="smile")
+
+    assert client.lookup_kaomoji("(^_^)").keywords == ("happy", "smile")
+
+    client.close()
@@ -0,0 +1,73 @@
+import pytest
+
+from kaomojitool import kaomoji
+from kaomojitool.kaomoji import KaomojiDB
+from kaomojitool.shards import parse_lines
+from kaomojitool.shards import shard_offsets
+
+
+def database_text():
+    lines = list()
+
+    for number in range(300):
+        lines.append("({})\tkw{}, shared\r\n".format(number, number % 7))
+
+        if number % 10 == 0:
+            lines.append("\r\n")
+
+        # repeats of earlier codes, landing in later shards
+        if number % 50 == 49:
+            lines.append("({})\trepeated, kw{}\r\n".format(number - 40,
+                                                           number))
+
+    return "".join(lines)
+
+
+def postings(database):
+    index = database.keyword_index
+
+    return {index.dictionary.decode(keyword_id): list(posting)
+            for keyword_id, posting in index.postings.items()}
+
+
+def test_shard_offsets_cover_the_file_on_line_boundaries(write_db):
+    filename = write_db(database_text())
+
+    with open(filename, "rb") as db_file:
+        content = db_file.read()
+
+    offsets = shard_offsets(filename, 16)
+
+    assert offsets[0][0] == 0 and offsets[-1][1] == len(content)
+    assert all(end == next_start for (_, end), (next_start, _)
+               in zip(offsets, offsets[1:]))
+    assert all(content[end - 1:end] == b"\n" for _, end in offsets[:-1])
+
+
+def test_parse_lines_reads_like_iter_file():
+    assert parse_lines("a\tx, y\r\n\r\n  \nb\ty\rc\t\na\tz") ==\
+        (["a", "b", "c", "a"], [("x", "y"), ("y",), (), ("z",)])
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_parallel_load_matches_the_sequential_one(write_db, monkeypatch,
+                                                  workers):
+    filename = write_db(database_text())
+
+    with open(filename, "rb") as db_file:
+        assert b"\r\n\r\n" in db_file.read()
+
+    sequential = KaomojiDB(filename=filename)
+    monkeypatch.setattr(kaomoji, "MIN_PARALLEL_SIZE", 0)
+    parallel = KaomojiDB(filename=filename, workers=workers)
+
+    assert [(entry.code, entry.keywords, entry._entry_id)
+            for entry in parallel.entries] ==\
+        [(entry.code, entry.keywords, entry._entry_id)
+         for entry in sequential.entries]
+    assert list(parallel.kaomojis) == list(sequential.kaomojis)
+    assert postings(parallel) == postings(sequential)
+    assert parallel.get_kaomoji_by_code("(9)").keywords ==\
+        ("repeated", "kw49")
+    assert list(parallel.query_all("repeated")) ==\
+        ["(9)", "(59)", "(109)", "(159)", "(209)", "(259)"]
@@ -0,0 +1,61 @@
+import os
+
+from kaomojitool.kaomoji import KaomojiDB
+from kaomojitool.snapshot import read_snapshot
+from kaomojitool.snapshot import snapshot_filename
+
+
+def test_snapshot_loads_the_same_database(write_db, db_contents):
+    filename = write_db()
+    parsed = KaomojiDB(filename=filename, use_snapshot=True)
+
+    assert read_snapshot(filename) is not None
+
+    loaded = KaomojiDB(filename=filename, use_snapshot=True)
+
+    assert db_contents(loaded) == db_contents(parsed)
+    assert list(loaded.query("ha")) == ["(^_^)"]
+    assert list(loaded.query_all("sad")) == ["(T_T)"]
+
+
+def test_snapshot_is_rebuilt_when_the_file_changes(write_db):
+    filename = write_db()
+    KaomojiDB(filename=filename, use_snapshot=True)
+
+    with open(filename, "a", encoding="utf-8") as db_file:
+        db_file.write("(o_o)\tsurprised\n")
+
+    assert read_snapshot(filename) is None
+
+    database = KaomojiDB(filename=filename, use_snapshot=True)
+
+    assert "(o_o)" in database.kaomojis
+    assert read_snapshot(filename) is not None
+
+
+def test_snapshot_is_ignored_for_an_edit_keeping_size_and_mtime(write_db):
+    filename = write_db()
+    KaomojiDB(filename=filename, use_snapshot=True)
+    stat = os.stat(filename)
+
+    with open(filename, "w", encoding="utf-8") as db_file:
+        db_file.write("(^_^)\thappY\n(T_T)\tsad\n")
+
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert read_snapshot(filename) is None
+    assert KaomojiDB(filename=filename, use_snapshot=True)\
+        .get_kaomoji_by_code("(^_^)").keywords == ("happY",)
+
+
+def test_damaged_snapshot_is_ignored(write_db, db_contents):
+    filename = write_db()
+    KaomojiDB(filename=filename, use_snapshot=True)
+
+    with open(snapshot_filename(filename), "r+b") as snapshot_file:
+        snapshot_file.truncate(os.path.getsize(snapshot_filename(filename))
+                               // 2)
+
+    assert read_snapshot(filename) is None
+    assert db_contents(KaomojiDB(filename=filename, use_snapshot=True)) ==\
+        {"(^_^)": ("happy",), "(T_T)": ("sad",)}
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from kaomojitool.__main__ import KaomojiToolNoDatabase
+from kaomojitool.__main__ import cli
+from kaomojitool.sqlite import KaomojiSQLiteDB
+
+
+def backend_config(tmp_path, backend):
+    config_filename = tmp_path / "config.toml"
+    config_filename.write_text('database_backend = "{}"\n'.format(backend))
+
+    return str(config_filename)
+
+
+@pytest.mark.parametrize("backend", ["tsv", "sqlite"])
+def test_missing_database_is_refused(tmp_path, backend):
+    filename = str(tmp_path / "missing.db")
+
+    result = CliRunner().invoke(cli, [
+        "query", "-f", filename, "-c", backend_config(tmp_path, backend),
+        "-q", "happy"])
+
+    assert isinstance(result.exception, KaomojiToolNoDatabase)
+    assert not os.path.exists(filename)
+
+
+def test_import_creates_a_sqlite_database(tmp_path, write_db):
+    input_filename = write_db(name="input.tsv")
+    filename = str(tmp_path / "db.sqlite")
+
+    result = CliRunner().invoke(cli, [
+        "import", "-f", filename, "-c", backend_config(tmp_path, "sqlite"),
+        "-i", input_filename])
+
+    assert result.exit_code == 0, result.output
+
+    database = KaomojiSQLiteDB(filename=filename)
+    assert set(database.kaomojis) == {"(^_^)", "(T_T)"}
+    database.close()
@@ -0,0 +1,77 @@
+import pytest
+from click.testing import CliRunner
+
+from kaomojitool.__main__ import cli
+from kaomojitool.stats import DatabaseStats
+from kaomojitool.stats import read_stats
+from kaomojitool.stats import stats_key
+from kaomojitool.stats import write_stats
+
+DATABASE_TEXT = "(^_^)\thappy, smile\n(T_T)\tsad\n(^o^)\thappy\n"
+
+
+def dbstatus(filename, config_filename, *arguments):
+    result = CliRunner().invoke(cli, ["dbstatus", "-f", filename,
+                                      "-c", config_filename, *arguments])
+
+    assert result.exit_code == 0, result.output
+
+    return result.output
+
+
+def test_stats_are_cached_until_the_file_changes(write_db):
+    filename = write_db(DATABASE_TEXT)
+    stats = DatabaseStats.from_file(filename)
+
+    assert stats.entries == 3
+    assert stats.top_keywords(1) == [("happy", 2)]
+
+    write_stats(filename, stats, key=stats_key(filename))
+    assert read_stats(filename, streamed=True).to_dict() == stats.to_dict()
+
+    with open(filename, "a", encoding="utf-8") as db_file:
+        db_file.write("(-_-)\tbored\n")
+
+    assert read_stats(filename, streamed=True) is None
+
+
+@pytest.mark.parametrize("streamed", [True, False])
+def test_stats_are_cached_per_mode(write_db, streamed):
+    filename = write_db(DATABASE_TEXT)
+    stats = DatabaseStats(streamed=streamed)
+    write_stats(filename, stats, key=stats_key(filename))
+
+    assert read_stats(filename, streamed=streamed) is not None
+    assert read_stats(filename, streamed=not streamed) is None
+
+
+def test_dbstatus_doesnt_mix_streamed_and_loaded_stats(write_db,
+                                                       config_filename):
+    # streaming counts both lines of the repeated code
+    filename = write_db("(^_^)\thappy\n(^_^)\tsmile\n")
+
+    output = dbstatus(filename, config_filename, "--stream")
+    assert "number of kaomojis: 2" in output
+
+    output = dbstatus(filename, config_filename)
+    assert "number of kaomojis: 1" in output
+    assert "statistics: loaded\n" in output
+
+    output = dbstatus(filename, config_filename)
+    assert "statistics: loaded, cached" in output
+
+    output = dbstatus(filename, config_filename, "--stream")
+    assert "number of kaomojis: 2" in output
+    assert "statistics: streamed\n" in output
+
+
+def test_dbstatus_with_an_unwritable_cache(tmp_path, write_db,
+                                           config_filename):
+    filename = write_db(DATABASE_TEXT)
+    # the sidecar can't be written over a directory
+    (tmp_path / "db.tsv.stats").mkdir()
+
+    output = dbstatus(filename, config_filename)
+
+    assert "number of kaomojis: 3" in output
+    assert read_stats(filename) is None
@@ -0,0 +1,58 @@
+import json
+import os
+import tracemalloc
+
+import pytest
+
+from kaomojitool.timings import Timings
+from kaomojitool.timings import current_rss
+
+
+def test_phases_nest_and_merge():
+    timings = Timings()
+
+    with timings.phase("load"):
+        with timings.phase("load") as merged:
+            assert merged is None
+
+        with timings.phase("parse"):
+            pass
+
+    assert [timing.name for timing in timings.phases] ==\
+        ["load", "load.parse"]
+    assert all(timing.wall >= 0 and timing.cpu >= 0
+               for timing in timings.phases)
+
+
+@pytest.mark.skipif(current_rss() is None, reason="no /proc/self/statm")
+def test_rss_delta_is_of_the_phase():
+    timings = Timings()
+    size = 64 << 20
+
+    with timings.phase("allocate"):
+        data = bytearray(os.urandom(1)) * size
+
+    with timings.phase("idle"):
+        pass
+
+    allocate, idle = timings.phases
+    assert allocate.rss_delta >= size // 2
+    assert abs(idle.rss_delta) < size // 2
+    # the peak of the process doesn't go down with the phases
+    assert idle.process_peak_rss >= allocate.process_peak_rss
+    del data
+
+
+def test_report_columns():
+    timings = Timings()
+
+    with timings.phase("load"):
+        pass
+
+    header = timings.report().splitlines()[0].split()
+    assert "delta" in header and "process" in header
+    assert ("traced" in header) == tracemalloc.is_tracing()
+
+    phase = json.loads(timings.to_json())["phases"][0]
+    assert set(phase) == {"name", "wall", "cpu", "rss_delta",
+                          "process_peak_rss", "peak_traced"}
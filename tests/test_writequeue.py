@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+from kaomojitool.journal import JOURNAL_KEYWORDS_ADD
+from kaomojitool.journal import format_record
+from kaomojitool.journal import journal_filename
+from kaomojitool.kaomoji import KaomojiDB
+from kaomojitool.lock import DatabaseLock
+from kaomojitool.writequeue import group_commit
+from kaomojitool.writequeue import queue_directory
+from kaomojitool.writequeue import queued_filenames
+
+CALLERS = 4
+
+
+class CountingOpener:
+    """An `open_database` for group_commit, counting the databases it
+    opens.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+
+        return KaomojiDB(filename=self.filename, use_journal=True)
+
+
+def records_of(caller):
+    return [format_record(JOURNAL_KEYWORDS_ADD, "(^_^)",
+                          ["caller{}".format(caller)])]
+
+
+def journal_lines(filename):
+    with open(journal_filename(filename), encoding="utf-8") as journal:
+        return journal.readlines()
+
+
+def test_group_commit_applies_the_records_of_every_caller_once(write_db):
+    filename = write_db()
+    opener = CountingOpener(filename)
+    results = dict()
+
+    def commit(caller):
+        results[caller] = group_commit(filename, records_of(caller),
+                                       open_database=opener)
+
+    with DatabaseLock(filename):
+        threads = [threading.Thread(target=commit, args=(caller,))
+                   for caller in range(CALLERS)]
+
+        for thread in threads:
+            thread.start()
+
+        # every caller queues its records, then waits for the lock
+        while len(queued_filenames(filename)) < CALLERS:
+            time.sleep(0.01)
+
+    for thread in threads:
+        thread.join()
+
+    # one caller wrote them all; the others found theirs applied
+    assert sorted(results.values()) == [0] * (CALLERS - 1) + [CALLERS]
+    assert opener.opened == 1
+    assert sorted(journal_lines(filename)) ==\
+        sorted(line for caller in range(CALLERS)
+               for line in records_of(caller))
+    assert set(KaomojiDB(filename=filename).get_kaomoji_by_code("(^_^)")
+               .keywords) == {"happy"} | {"caller{}".format(caller)
+                                          for caller in range(CALLERS)}
+    assert not os.path.exists(queue_directory(filename))
+
+
+def test_group_commit_cleans_up_the_queue(write_db):
+    filename = write_db()
+    opener = CountingOpener(filename)
+
+    assert group_commit(filename, records_of(0), open_database=opener) == 1
+    assert group_commit(filename, records_of(1), open_database=opener) == 1
+    assert opener.opened == 2
+    assert len(journal_lines(filename)) == 2
+    assert not os.path.exists(queue_directory(filename))